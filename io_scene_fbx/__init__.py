@@ -74,6 +74,13 @@ class ImportFBX(bpy.types.Operator, ImportHelper):
             default=True,
             )
 
+    use_mesh_dedup = BoolProperty(
+            name="Share Identical Meshes",
+            description="Create identical geometry only once, "
+                        "and share the mesh between all objects using it",
+            default=False,
+            )
+
     use_alpha_decals = BoolProperty(
             name="Alpha Decals",
             description="Treat materials with alpha as decals "
@@ -117,6 +124,45 @@ class ImportFBX(bpy.types.Operator, ImportHelper):
             default=1.0,
             )
 
+    object_names = StringProperty(
+            name="Object Names",
+            description="Only import objects matching one of these names, "
+                        "wildcards patterns separated by ';' (all objects when empty)",
+            )
+    object_types = EnumProperty(
+            name="Object Types",
+            options={'ENUM_FLAG'},
+            items=(('EMPTY', "Empty", ""),
+                   ('CAMERA', "Camera", ""),
+                   ('LAMP', "Lamp", ""),
+                   ('ARMATURE', "Armature", ""),
+                   ('MESH', "Mesh", ""),
+                   ),
+            default={'EMPTY', 'CAMERA', 'LAMP', 'ARMATURE', 'MESH'},
+            )
+    object_uids = StringProperty(
+            name="Object UIDs",
+            description="Only import objects with one of these FBX UIDs, "
+                        "separated by spaces or commas (all objects when empty)",
+            )
+
+    use_profile = BoolProperty(
+            name="Profile",
+            description="Report time spent in each import step",
+            default=False,
+            )
+    use_profile_memory = BoolProperty(
+            name="Profile Memory",
+            description="Also report the memory peak of each import step "
+                        "(Warning, slow)",
+            default=False,
+            )
+    profile_filepath = StringProperty(
+            name="Profile File",
+            description="Write the profile to this JSON file (not written when empty)",
+            subtype='FILE_PATH',
+            )
+
     def execute(self, context):
         from mathutils import Matrix
 
@@ -127,6 +173,15 @@ class ImportFBX(bpy.types.Operator, ImportHelper):
                                             "directory",
                                             ))
 
+        # Objects filter, selected objects are imported with their children, data and materials.
+        keywords["object_names"] = tuple(pattern.strip() for pattern in self.object_names.split(";")
+                                         if pattern.strip())
+        try:
+            keywords["object_uids"] = {int(uid) for uid in self.object_uids.replace(",", " ").split()}
+        except ValueError:
+            self.report({'ERROR'}, "Invalid object UIDs %r" % self.object_uids)
+            return {'CANCELLED'}
+
         global_matrix = (Matrix.Scale(self.global_scale, 4) *
                          axis_conversion(from_forward=self.axis_forward,
                                          from_up=self.axis_up,
@@ -152,6 +207,7 @@ class ExportFBX(bpy.types.Operator, ExportHelper):
 
     version = EnumProperty(
             items=(('BIN7400', "FBX 7.4 binary", "Newer 7.4 binary version, still in development (no animation yet)"),
+                   ('ASCII7400', "FBX 7.4 ASCII", "Same data as 7.4 binary version, written as text"),
                    ('ASCII6100', "FBX 6.1 ASCII", "Legacy 6.1 ascii version"),
                   ),
             name="Exporter Version",
@@ -290,6 +346,22 @@ class ExportFBX(bpy.types.Operator, ExportHelper):
             description="Create a dir for each exported file",
             default=True,
             )
+    use_array_cache = BoolProperty(
+            name="Cache Compressed Arrays",
+            description="Keep compressed mesh data on disk, so that re-exporting unchanged meshes is faster",
+            default=False,
+            )
+    use_incremental = BoolProperty(
+            name="Incremental Write",
+            description="Copy unchanged data from the previously exported file (stores a '.hashes' file next to it)",
+            default=False,
+            )
+    use_parallel_write = BoolProperty(
+            name="Parallel Write",
+            description="Write mesh, deformer and video data with several threads, "
+                        "into a file mapped in memory (binary only, ignored with Incremental Write)",
+            default=False,
+            )
     use_metadata = BoolProperty(
             name="Use Metadata",
             default=True,
@@ -318,8 +390,9 @@ class ExportFBX(bpy.types.Operator, ExportHelper):
 
         keywords["global_matrix"] = global_matrix
 
-        if self.version == 'BIN7400':
+        if self.version in {'BIN7400', 'ASCII7400'}:
             from . import export_fbx_bin
+            keywords["use_ascii"] = (self.version == 'ASCII7400')
             return export_fbx_bin.save(self, context, **keywords)
         else:
             from . import export_fbx
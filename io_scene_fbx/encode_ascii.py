@@ -0,0 +1,159 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+# Script copyright (C) 2014 Blender Foundation
+
+# Write the same FBXElem trees as encode_bin, as ASCII FBX 7.x files.
+
+try:
+    from . import data_types, encode_bin
+except:
+    import data_types
+    import encode_bin
+
+from struct import unpack
+import array
+import base64
+import zlib
+
+_IS_BIG_ENDIAN = (__import__("sys").byteorder != 'little')
+
+# Number of array items formatted at once.
+_ARRAY_CHUNK_SIZE = 4096
+
+_props_scalar_unpack = {
+    data_types.BOOL: '<?',
+    data_types.INT16: '<h',
+    data_types.INT32: '<i',
+    data_types.INT64: '<q',
+    data_types.FLOAT32: '<f',
+    data_types.FLOAT64: '<d',
+    }
+
+# prop_type -> (array_type, array_byteswap).
+_props_array_types = {
+    data_types.FLOAT32_ARRAY: (data_types.ARRAY_FLOAT32, False),
+    data_types.INT32_ARRAY: (data_types.ARRAY_INT32, True),
+    data_types.FLOAT64_ARRAY: (data_types.ARRAY_FLOAT64, False),
+    data_types.INT64_ARRAY: (data_types.ARRAY_INT64, True),
+    data_types.BOOL_ARRAY: (data_types.ARRAY_BOOL, False),
+    data_types.BYTE_ARRAY: (data_types.ARRAY_BYTE, False),
+    }
+
+
+def _format_string(data):
+    data = data.decode('utf-8', 'replace')
+    # Binary 'Name\x00\x01Class' are written as 'Class::Name' in ASCII files.
+    if "\x00\x01" in data:
+        name, cls = data.split("\x00\x01", 1)
+        data = cls + "::" + name
+    return '"%s"' % data.replace('"', "&quot;")
+
+
+def _unpack_array(prop_type, data):
+    length, encoding, comp_len = unpack('<3I', data[:12])
+    data = data[12:]
+    if encoding == 1:
+        data = zlib.decompress(data)
+    array_type, array_byteswap = _props_array_types[prop_type]
+    data_array = array.array(array_type, data)
+    if array_byteswap and _IS_BIG_ENDIAN:
+        data_array.byteswap()
+    assert(len(data_array) == length)
+    return data_array
+
+
+def _write_array(write, indent, data_array):
+    write("*%d {\n%s\ta: " % (len(data_array), indent))
+    for i in range(0, len(data_array), _ARRAY_CHUNK_SIZE):
+        if i:
+            write(",")
+        write(",".join(map(repr, data_array[i:i + _ARRAY_CHUNK_SIZE])))
+    write("\n%s} " % indent)
+
+
+def _write_elem(write, elem, indent):
+    write("%s%s: " % (indent, elem.id.decode('utf-8', 'replace')))
+
+    props = []
+    is_sep = False  # a separator is needed before the next written prop.
+    for prop_type, data in zip(elem.props_type, elem.props):
+        fmt = _props_scalar_unpack.get(prop_type)
+        if fmt is not None:
+            value = unpack(fmt, data)[0]
+            if prop_type == data_types.BOOL:
+                props.append("T" if value else "F")
+            else:
+                props.append(repr(value))
+        elif prop_type == data_types.STRING:
+            props.append(_format_string(data[4:]))
+        elif prop_type == data_types.BYTES:
+            props.append('"%s"' % base64.b64encode(data[4:]).decode())
+        else:
+            # Arrays are written separately, as a block.
+            if props:
+                if is_sep:
+                    write(", ")
+                write(", ".join(props))
+                props.clear()
+                is_sep = True
+            if is_sep:
+                write(", ")
+            _write_array(write, indent, _unpack_array(prop_type, data))
+            is_sep = True
+    if props:
+        if is_sep:
+            write(", ")
+        write(", ".join(props))
+
+    if elem.elems:
+        write(" {\n")
+        sub_indent = indent + "\t"
+        for sub_elem in elem.elems:
+            _write_elem(write, sub_elem, sub_indent)
+        write("%s}\n" % indent)
+    elif not elem.props:
+        write(" {\n%s}\n" % indent)
+    else:
+        write("\n")
+
+
+def write_fileobj(f, elem_root, version):
+    """
+    Write the FBX data as ASCII to a text file-like object.
+    """
+    assert(elem_root.id == b'')
+
+    write = f.write
+
+    write("; FBX %d.%d.%d project file\n" % (version // 1000, (version % 1000) // 100, version % 100))
+    write("; ----------------------------------------------------\n\n")
+
+    # Same hack as encode_bin, so that both back-ends write the same data.
+    encode_bin._write_timedate_hack(elem_root)
+
+    for elem in elem_root.elems:
+        _write_elem(write, elem, "")
+        write("\n")
+
+
+def write(fn, elem_root, version):
+    with open(fn, 'w', encoding="utf-8") as f:
+        write_fileobj(f, elem_root, version)
@@ -25,8 +25,11 @@ try:
 except:
     import data_types
 
-from struct import pack
+from struct import pack, unpack, Struct
 import array
+import binascii
+import hashlib
+import os
 import zlib
 
 _BLOCK_SENTINEL_LENGTH = 13
@@ -42,6 +45,174 @@ _TIME_ID = b'1970-01-01 10:00:00:000'
 _FILE_ID = b'\x28\xb3\x2a\xeb\xb6\x24\xcc\xc2\xbf\xc8\xb0\x2a\xa9\x2b\xfc\xf1'
 _FOOT_ID = b'\xfa\xbc\xab\x09\xd0\xc8\xd4\x66\xb1\x76\xfb\x83\x1c\xf7\x26\x7e'
 
+# Arrays up to this size (in bytes) are stored uncompressed (mimic behavior of fbxconverter).
+_ARRAY_COMPRESS_MIN = 128
+_ARRAY_COMPRESS_LEVEL = 1
+_ARRAY_CACHE_DISK_SIZE_MAX = 512 * 1024 * 1024
+
+
+# ----------------------------------------------------------------------------
+# Array Cache
+#
+# Exports often contain many byte-identical arrays (zero'ed normals, shared UV's, bind-pose matrices...),
+# while an export is running we only compress each distinct array once.
+#
+# Optionally, payloads are also stored on disk so re-exporting mostly unchanged scenes can skip zlib entirely.
+# Several Blender instances may share the same cache directory:
+# files are written under a temp name and atomically renamed, readers validate what they read,
+# and eviction tolerates files removed by someone else.
+
+class ArrayCache:
+    __slots__ = (
+        "payloads",  # (prop_type, length, compress_level, digest) -> packed array payload.
+        "hits",
+        "misses",
+        "disk_dir",  # None when only caching in memory.
+        "disk_size_max",
+        "disk_hits",
+        )
+
+    def __init__(self, disk_dir=None, disk_size_max=_ARRAY_CACHE_DISK_SIZE_MAX):
+        self.payloads = {}
+        self.hits = 0
+        self.misses = 0
+        self.disk_dir = disk_dir
+        self.disk_size_max = disk_size_max
+        self.disk_hits = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.payloads), "disk_hits": self.disk_hits}
+
+    def _disk_path(self, key):
+        prop_type, length, level, digest = key
+        name = "%s_%c%d_%d" % (binascii.hexlify(digest).decode(), prop_type, level, length)
+        return os.path.join(self.disk_dir, name[:2], name)
+
+    def disk_get(self, key):
+        fn = self._disk_path(key)
+        try:
+            with open(fn, 'rb') as f:
+                payload = f.read()
+            # Mark as recently used, for eviction.
+            os.utime(fn, None)
+        except OSError:
+            return None
+
+        # Never trust a truncated, corrupted or foreign file.
+        if len(payload) < 16:
+            return None
+        crc, = unpack('<I', payload[:4])
+        payload = payload[4:]
+        if crc != zlib.crc32(payload) & 0xffffffff:
+            return None
+        length, encoding, comp_len = unpack('<3I', payload[:12])
+        if length != key[1] or encoding != 1 or comp_len != len(payload) - 12:
+            return None
+        return payload
+
+    def disk_set(self, key, payload):
+        fn = self._disk_path(key)
+        dn = os.path.dirname(fn)
+        fn_tmp = "%s.%d.%d.tmp" % (fn, os.getpid(), id(payload))
+        try:
+            os.makedirs(dn, exist_ok=True)
+            with open(fn_tmp, 'wb') as f:
+                # crc32 of the payload, checked on read.
+                f.write(pack('<I', zlib.crc32(payload) & 0xffffffff))
+                f.write(payload)
+            os.replace(fn_tmp, fn)
+        except OSError as e:
+            print("WARNING: failed to write array cache file %r (%s)" % (fn, e))
+            try:
+                os.remove(fn_tmp)
+            except OSError:
+                pass
+
+    def disk_evict(self):
+        """
+        Remove least recently used files until the cache fits in disk_size_max.
+        """
+        files = []
+        size_tot = 0
+        for dn, _dirs, fns in os.walk(self.disk_dir):
+            for fn in fns:
+                fn = os.path.join(dn, fn)
+                try:
+                    st = os.stat(fn)
+                except OSError:
+                    continue  # removed by another instance meanwhile.
+                files.append((st.st_mtime, st.st_size, fn))
+                size_tot += st.st_size
+
+        if size_tot <= self.disk_size_max:
+            return
+
+        files.sort()
+        for _mtime, size, fn in files:
+            try:
+                os.remove(fn)
+            except OSError:
+                pass
+            size_tot -= size
+            if size_tot <= self.disk_size_max:
+                break
+
+
+# global singleton, only set while an export is running (see array_cache_begin/end).
+_array_cache = None
+
+
+def array_cache_begin(disk_dir=None, disk_size_max=_ARRAY_CACHE_DISK_SIZE_MAX):
+    """
+    Start caching packed array payloads, until array_cache_end() is called.
+    When disk_dir is given, payloads are also stored in (and reused from) that directory across exports.
+    """
+    global _array_cache
+    _array_cache = ArrayCache(disk_dir, disk_size_max)
+    return _array_cache
+
+
+def array_cache_end():
+    """
+    Stop caching array payloads, return the hit/miss stats of the cache.
+    """
+    global _array_cache
+    if _array_cache is None:
+        return None
+    if _array_cache.disk_dir is not None:
+        _array_cache.disk_evict()
+    stats = _array_cache.stats()
+    _array_cache = None
+    return stats
+
+
+# global singleton, cleared while writing data which is never compressed (see array_compress_set).
+_array_compress_use = True
+
+
+def array_compress_set(use_compress):
+    """
+    Enable or disable compression of the arrays added from now on
+    (ASCII files store arrays as text, compressing them would only be undone by encode_ascii).
+    """
+    global _array_compress_use
+    _array_compress_use = use_compress
+
+
+def _array_pack(data, length):
+    """
+    Return the (length, encoding, comp_len) header followed by the (maybe compressed) array bytes.
+    """
+    encoding = 0 if (not _array_compress_use or len(data) <= _ARRAY_COMPRESS_MIN) else 1
+    if encoding == 0:
+        pass
+    elif encoding == 1:
+        data = zlib.compress(data, _ARRAY_COMPRESS_LEVEL)
+
+    comp_len = len(data)
+
+    return pack('<3I', length, encoding, comp_len) + data
+
 
 class FBXElem:
     __slots__ = (
@@ -51,6 +222,7 @@ class FBXElem:
         "elems",
 
         "_props_length",  # combine length of props
+        "_start_offset",  # byte offset from the start of the file.
         "_end_offset",  # byte offset from the start of the file.
         )
 
@@ -60,6 +232,7 @@ class FBXElem:
         self.props = []
         self.props_type = bytearray()
         self.elems = []
+        self._start_offset = -1
         self._end_offset = -1
         self._props_length = -1
 
@@ -138,17 +311,26 @@ class FBXElem:
             data.byteswap()
         data = data.tobytes()
 
-        # mimic behavior of fbxconverter (also common sense)
-        # we could make this configurable.
-        encoding = 0 if len(data) <= 128 else 1
-        if encoding == 0:
-            pass
-        elif encoding == 1:
-            data = zlib.compress(data, 1)
-
-        comp_len = len(data)
-
-        data = pack('<3I', length, encoding, comp_len) + data
+        cache = _array_cache
+        if cache is None or not _array_compress_use or len(data) <= _ARRAY_COMPRESS_MIN:
+            data = _array_pack(data, length)
+        else:
+            key = (prop_type, length, _ARRAY_COMPRESS_LEVEL, hashlib.sha1(data).digest())
+            payload = cache.payloads.get(key)
+            if payload is not None:
+                cache.hits += 1
+            else:
+                if cache.disk_dir is not None:
+                    payload = cache.disk_get(key)
+                if payload is not None:
+                    cache.disk_hits += 1
+                else:
+                    payload = _array_pack(data, length)
+                    cache.misses += 1
+                    if cache.disk_dir is not None:
+                        cache.disk_set(key, payload)
+                cache.payloads[key] = payload
+            data = payload
 
         self.props_type.append(prop_type)
         self.props.append(data)
@@ -183,6 +365,21 @@ class FBXElem:
             data = array.array(data_types.ARRAY_BYTE, data)
         self._add_array_helper(data, data_types.ARRAY_BYTE, data_types.BYTE_ARRAY)
 
+    def add_array_raw(self, data):
+        """
+        Add an array read by parse_fbx with use_raw_arrays,
+        its payload is written verbatim unless the array was modified.
+        """
+        if data.is_modified():
+            getattr(self, _array_add_funcs[data.prop_type])(data.decode())
+            return
+
+        prop_type = data.prop_type
+        data = pack('<3I', data.length, data.encoding, len(data.payload)) + data.payload
+
+        self.props_type.append(prop_type)
+        self.props.append(data)
+
     # -------------------------
     # internal helper functions
 
@@ -194,6 +391,7 @@ class FBXElem:
         assert(self._props_length == -1)
 
         # print("Offset", offset)
+        self._start_offset = offset
         offset += 12  # 3 uints
         offset += 1 + len(self.id)  # len + idname
 
@@ -222,6 +420,15 @@ class FBXElem:
         return offset
 
     def _write(self, write, tell, is_last):
+        self._write_head(write)
+
+        self._write_children(write, tell, is_last)
+
+        if tell() != self._end_offset:
+            raise IOError("scope length not reached, "
+                          "something is wrong (%d)" % (self._end_offset - tell()))
+
+    def _write_head(self, write):
         assert(self._end_offset != -1)
         assert(self._props_length != -1)
 
@@ -235,12 +442,6 @@ class FBXElem:
             write(bytes((self.props_type[i],)))
             write(data)
 
-        self._write_children(write, tell, is_last)
-
-        if tell() != self._end_offset:
-            raise IOError("scope length not reached, "
-                          "something is wrong (%d)" % (end_offset - tell()))
-
     def _write_children(self, write, tell, is_last):
         if self.elems:
             elem_last = self.elems[-1]
@@ -252,6 +453,164 @@ class FBXElem:
             if not is_last:
                 write(_BLOCK_SENTINEL_DATA)
 
+    def _calc_hash(self, hashes, depth):
+        """
+        Merkle-like hash of this subtree (must be called after _calc_offsets),
+        hashes of elements down to given depth are also stored in hashes ({elem: digest}).
+        """
+        h = hashlib.sha1()
+        h.update(pack('<2I', self._end_offset - self._start_offset, len(self.props)))
+        h.update(self.id)
+        h.update(self.props_type)
+        for data in self.props:
+            h.update(data)
+        for elem in self.elems:
+            h.update(elem._calc_hash(hashes, depth - 1))
+        digest = h.digest()
+        if depth > 0:
+            hashes[self] = digest
+        return digest
+
+
+# ----------------------------------------------------------------------------
+# Properties70 Records
+#
+# Templates and objects generate tens of thousands of 'P' elements, many of them identical
+# (default Visibility, Lcl Scaling...), so we pack them through a specialized encoder and cache the results.
+
+def _pack_string(data):
+    return pack('<I', len(data)) + data
+
+
+def _pack_string_unicode(data):
+    data = data.encode('utf8')
+    return pack('<I', len(data)) + data
+
+
+# FBXElem method name -> (prop_type, packing function, expected value type, as asserted by that method).
+_props_record_packers = {
+    "add_bool": (data_types.BOOL, Struct('?').pack, bool),
+    "add_int16": (data_types.INT16, Struct('<h').pack, int),
+    "add_int32": (data_types.INT32, Struct('<i').pack, int),
+    "add_int64": (data_types.INT64, Struct('<q').pack, int),
+    "add_float32": (data_types.FLOAT32, Struct('<f').pack, float),
+    "add_float64": (data_types.FLOAT64, Struct('<d').pack, float),
+    "add_bytes": (data_types.BYTES, _pack_string, bytes),
+    "add_string": (data_types.STRING, _pack_string, bytes),
+    "add_string_unicode": (data_types.STRING, _pack_string_unicode, str),
+    }
+
+# ptype -> (props_type, packed ptype strings, value packers, value types).
+_props_record_types = {}
+
+# global singleton, only set while an export is running (see props_record_cache_begin/end).
+# (name, ptype, ((type, repr) of values)) -> (props_type, props).
+# repr() keeps values that compare equal but pack differently apart (0.0 and -0.0, 1 and 1.0...).
+_props_record_cache = None
+_PROPS_RECORD_CACHE_SIZE_MAX = 16384
+
+
+def props_record_cache_begin():
+    """
+    Start caching packed 'P' elements, until props_record_cache_end() is called.
+    """
+    global _props_record_cache
+    _props_record_cache = {}
+
+
+def props_record_cache_end():
+    global _props_record_cache
+    _props_record_cache = None
+
+
+def _props_record_type_get(ptype):
+    record_type = _props_record_types.get(ptype)
+    if record_type is None:
+        packers = tuple(_props_record_packers[func_name] for func_name in ptype[3:])
+        props_type = bytes((data_types.STRING,) * 4 + tuple(packer[0] for packer in packers))
+        head = [_pack_string(t) for t in ptype[:3]]
+        record_type = _props_record_types[ptype] = (props_type, head,
+                                                    tuple(packer[1] for packer in packers),
+                                                    tuple(packer[2] for packer in packers))
+    return record_type
+
+
+def elem_props_record(elem, name, ptype, value=None):
+    """
+    Add a Properties70 'P' element to elem, ptype being a definition tuple
+    (b"type_1", b"type_2", b"type_3", "add_func_value_1", "add_func_value_2", ...).
+    When ptype has several values, value must be an iterable.
+    """
+    props_type, head, packers, types = _props_record_type_get(ptype)
+    if len(packers) == 1:
+        values = (value,)
+    elif packers:
+        values = tuple(value)
+    else:
+        values = ()
+    assert(len(values) == len(types))
+    for v, t in zip(values, types):
+        assert(isinstance(v, t))
+
+    cache = _props_record_cache
+    if cache is not None:
+        key = (name, ptype, tuple((type(v), repr(v)) for v in values))
+        record = cache.get(key)
+    else:
+        key = record = None
+
+    if record is None:
+        props = [_pack_string(name)] + head
+        props += [_pack(v) for _pack, v in zip(packers, values)]
+        record = (props_type, props)
+
+        if key is not None:
+            if len(cache) >= _PROPS_RECORD_CACHE_SIZE_MAX:
+                cache.clear()
+            cache[key] = record
+
+    sub_elem = FBXElem(b"P")
+    sub_elem.props_type[:] = record[0]
+    sub_elem.props[:] = record[1]
+    if elem is not None:
+        elem.elems.append(sub_elem)
+    return sub_elem
+
+
+# prop_type -> FBXElem method adding such a property.
+_prop_add_funcs = {
+    data_types.BOOL: "add_bool",
+    data_types.INT16: "add_int16",
+    data_types.INT32: "add_int32",
+    data_types.INT64: "add_int64",
+    data_types.FLOAT32: "add_float32",
+    data_types.FLOAT64: "add_float64",
+    data_types.BYTES: "add_bytes",
+    data_types.STRING: "add_string",
+    data_types.INT32_ARRAY: "add_int32_array",
+    data_types.INT64_ARRAY: "add_int64_array",
+    data_types.FLOAT32_ARRAY: "add_float32_array",
+    data_types.FLOAT64_ARRAY: "add_float64_array",
+    data_types.BOOL_ARRAY: "add_bool_array",
+    data_types.BYTE_ARRAY: "add_byte_array",
+    }
+_array_add_funcs = {prop_type: func for prop_type, func in _prop_add_funcs.items() if func.endswith("_array")}
+
+
+def elem_from_parsed(elem_parsed):
+    """
+    Convert an element tree read by parse_fbx (root included) into FBXElem's, ready to be written again.
+    Arrays read with use_raw_arrays are not re-compressed, unless modified.
+    """
+    elem = FBXElem(elem_parsed[0])
+    for data, prop_type in zip(elem_parsed[1], elem_parsed[2]):
+        if prop_type in _array_add_funcs and not isinstance(data, array.array):
+            elem.add_array_raw(data)
+        else:
+            getattr(elem, _prop_add_funcs[prop_type])(data)
+    elem.elems[:] = [elem_from_parsed(e) for e in elem_parsed[3]]
+    return elem
+
 
 def _write_timedate_hack(elem_root):
     # perform 2 changes
@@ -260,21 +619,7 @@ def _write_timedate_hack(elem_root):
 
     ok = 0
     for elem in elem_root.elems:
-        if elem.id == b'FileId':
-            assert(elem.props_type[0] == b'R'[0])
-            assert(len(elem.props_type) == 1)
-            elem.props.clear()
-            elem.props_type.clear()
-
-            elem.add_bytes(_FILE_ID)
-            ok += 1
-        elif elem.id == b'CreationTime':
-            assert(elem.props_type[0] == b'S'[0])
-            assert(len(elem.props_type) == 1)
-            elem.props.clear()
-            elem.props_type.clear()
-
-            elem.add_string(_TIME_ID)
+        if _write_timedate_hack_elem(elem):
             ok += 1
 
         if ok == 2:
@@ -284,9 +629,423 @@ def _write_timedate_hack(elem_root):
         print("Missing fields!")
 
 
+def _write_timedate_hack_elem(elem):
+    if elem.id == b'FileId':
+        assert(elem.props_type[0] == b'R'[0])
+        assert(len(elem.props_type) == 1)
+        elem.props.clear()
+        elem.props_type.clear()
+
+        elem.add_bytes(_FILE_ID)
+        return True
+    elif elem.id == b'CreationTime':
+        assert(elem.props_type[0] == b'S'[0])
+        assert(len(elem.props_type) == 1)
+        elem.props.clear()
+        elem.props_type.clear()
+
+        elem.add_string(_TIME_ID)
+        return True
+    return False
+
+
+def _write_footer(write, tell, version):
+    write(_FOOT_ID)
+    write(b'\x00' * 4)
+
+    # padding for alignment (values between 1 & 16 observed)
+    # if already aligned to 16, add a full 16 bytes padding.
+    ofs = tell()
+    pad = ((ofs + 15) & ~15) - ofs
+    if pad == 0:
+        pad = 16
+
+    write(b'\0' * pad)
+
+    write(pack('<I', version))
+
+    # unknown magic (always the same)
+    write(b'\0' * 120)
+    write(b'\xf8\x5a\x8c\x6a\xde\xf5\xd9\x7e\xec\xe9\x0c\xe3\x75\x8f\x29\x0b')
+
+
+def write_fileobj(f, elem_root, version):
+    """
+    Write the FBX data to a file-like object, which only needs a 'write' method
+    (pipes, sockets, compressors... do not have to be seekable).
+    """
+    assert(elem_root.id == b'')
+
+    # All offsets are computed beforehand, we only need to track our position to check them.
+    pos = 0
+    f_write = f.write
+
+    def write(data):
+        nonlocal pos
+        f_write(data)
+        pos += len(data)
+
+    def tell():
+        return pos
+
+    write(_HEAD_MAGIC)
+    write(pack('<I', version))
+
+    # hack since we don't decode time.
+    # ideally we would _not_ modify this data.
+    _write_timedate_hack(elem_root)
+
+    elem_root._calc_offsets_children(tell(), False)
+    elem_root._write_children(write, tell, False)
+
+    _write_footer(write, tell, version)
+
+
 def write(fn, elem_root, version):
+    with open(fn, 'wb') as f:
+        write_fileobj(f, elem_root, version)
+
+
+# ----------------------------------------------------------------------------
+# Incremental Write
+#
+# Along with the file, we store the hashes & byte ranges of its top-level elements and of their children
+# (e.g. each object under 'Objects') in a small sidecar file.
+# When writing that file again, subtrees with unchanged hashes are copied from the previous file,
+# only their (absolute) end offsets have to be adjusted.
+
+_SPLICE_DEPTH = 2
+_SPLICE_EXT = ".hashes"
+_SPLICE_VERSION = 1
+
+
+def _splice_patch_offsets(data, delta):
+    """
+    Shift all end offsets of the records in data (a bytearray of whole records) by delta.
+    """
+    ofs = 0
+    ofs_end = len(data)
+    while ofs < ofs_end:
+        end_offset, _props_count, props_length = unpack('<3I', data[ofs:ofs + 12])
+        if end_offset == 0:
+            # Nested block sentinel.
+            ofs += _BLOCK_SENTINEL_LENGTH
+            continue
+        data[ofs:ofs + 4] = pack('<I', end_offset + delta)
+        # Children (if any) follow directly, walk into them.
+        ofs += 13 + data[ofs + 12] + props_length
+
+
+def _splice_read_prev(fn, elem_root, hashes):
+    """
+    Return {elem: bytes} for all elements that can be copied from previous file fn.
+    """
+    import json
+
+    try:
+        with open(fn + _SPLICE_EXT, 'r') as f:
+            sidecar = json.load(f)
+        st = os.stat(fn)
+    except (OSError, ValueError):
+        return {}
+    if (sidecar.get("version") != _SPLICE_VERSION or
+        sidecar.get("size") != st.st_size or sidecar.get("mtime") != st.st_mtime):
+        return {}
+
+    prev_ranges = sidecar["elems"]
+
+    def _elems_find(elem, depth, found):
+        for sub_elem in elem.elems:
+            digest = hashes.get(sub_elem)
+            if digest is None:
+                continue
+            rng = prev_ranges.get(binascii.hexlify(digest).decode())
+            if rng is not None:
+                found[sub_elem] = rng
+            elif depth > 1:
+                _elems_find(sub_elem, depth - 1, found)
+        return found
+
+    splices = {}
+    with open(fn, 'rb') as f:
+        for elem, (start, end) in sorted(_elems_find(elem_root, _SPLICE_DEPTH, {}).items(),
+                                         key=lambda item: item[1][0]):
+            f.seek(start)
+            data = bytearray(f.read(end - start))
+            if len(data) != end - start or unpack('<I', data[:4])[0] != end:
+                continue  # should never happen, sidecar is out of sync.
+            _splice_patch_offsets(data, elem._start_offset - start)
+            splices[elem] = data
+    return splices
+
+
+# Objects written by the pool of threads of write_mmap (the ones holding big arrays),
+# others are small enough to be written right away.
+_MMAP_JOB_IDS = {b'Geometry', b'Deformer', b'Video'}
+
+
+def write_mmap(fn, elem_root, version, jobs=None):
+    """
+    Same as write(), but the file is presized and filled through mmap,
+    big independent subtrees (see _MMAP_JOB_IDS, under 'Objects') being written into their own region
+    by a pool of threads.
+    """
+    import mmap
+    from concurrent.futures import ThreadPoolExecutor
+
+    assert(elem_root.id == b'')
+
+    _write_timedate_hack(elem_root)
+
+    offset_foot = elem_root._calc_offsets_children(len(_HEAD_MAGIC) + 4, False)
+
+    # The footer only depends on its own offset.
+    footer = []
+    footer_ofs = offset_foot
+
+    def write(data):
+        nonlocal footer_ofs
+        footer.append(data)
+        footer_ofs += len(data)
+
+    _write_footer(write, lambda: footer_ofs, version)
+    footer = b''.join(footer)
+
+    size = offset_foot + len(footer)
+
+    def region_writer(mm, pos):
+        def write(data):
+            nonlocal pos
+            end = pos + len(data)
+            mm[pos:end] = data
+            pos = end
+
+        def tell():
+            return pos
+
+        return write, tell
+
+    def region_write(mm, elem, is_last):
+        write, tell = region_writer(mm, elem._start_offset)
+        elem._write(write, tell, is_last)
+
+    with open(fn, 'wb+') as f:
+        f.truncate(size)
+        with mmap.mmap(f.fileno(), size) as mm, ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = []
+
+            write, tell = region_writer(mm, 0)
+            write(_HEAD_MAGIC)
+            write(pack('<I', version))
+
+            # Same as elem_root._write_children(), but leaving big objects to the threads.
+            elem_last = elem_root.elems[-1] if elem_root.elems else None
+            for elem in elem_root.elems:
+                if elem.id != b'Objects' or not elem.elems:
+                    elem._write(write, tell, (elem is elem_last))
+                    continue
+
+                elem._write_head(write)
+                sub_elem_last = elem.elems[-1]
+                for sub_elem in elem.elems:
+                    if sub_elem.id in _MMAP_JOB_IDS:
+                        futures.append(executor.submit(region_write, mm, sub_elem, (sub_elem is sub_elem_last)))
+                    else:
+                        region_write(mm, sub_elem, (sub_elem is sub_elem_last))
+                write, tell = region_writer(mm, sub_elem_last._end_offset)
+                write(_BLOCK_SENTINEL_DATA)
+                assert(tell() == elem._end_offset)
+            # (empty root included, see _write_children)
+            write(_BLOCK_SENTINEL_DATA)
+
+            assert(tell() == offset_foot)
+            write(footer)
+
+            # Raise errors from the threads, if any.
+            for future in futures:
+                future.result()
+
+
+# ----------------------------------------------------------------------------
+# Stream Write
+#
+# For data too big to be held in memory as a whole tree: elements are written as they come,
+# and their end offsets are patched once their scope is closed (output must be seekable).
+
+_STREAM_BUFFER_SIZE = 1024 * 1024
+
+
+class StreamWriter:
+    __slots__ = (
+        "_file",
+        "_buf",  # pending output.
+        "_buf_ofs",  # file offset of _buf start.
+        "_stack",  # [header_offset, has_children, has_props] of each open element.
+        "_leaf_pending",  # header offset of previous element if it was empty (unknown end yet).
+        "_timedate_hack",
+        "_version",
+        )
+
+    def __init__(self, f, version=0):
+        """
+        Start writing into f (a seekable binary file-like object),
+        version may be zero when unknown yet, it must then be given to finish().
+        """
+        self._file = f
+        self._buf = bytearray()
+        self._buf_ofs = 0
+        self._stack = []
+        self._leaf_pending = None
+        self._timedate_hack = 0
+        self._version = version
+
+        self._write(_HEAD_MAGIC)
+        self._write(pack('<I', version))
+
+    def _tell(self):
+        return self._buf_ofs + len(self._buf)
+
+    def _write(self, data):
+        self._buf += data
+        if len(self._buf) > _STREAM_BUFFER_SIZE:
+            self._flush()
+
+    def _flush(self):
+        self._file.write(self._buf)
+        self._buf_ofs += len(self._buf)
+        self._buf.clear()
+
+    def _patch(self, ofs, data):
+        if ofs >= self._buf_ofs:
+            ofs -= self._buf_ofs
+            self._buf[ofs:ofs + len(data)] = data
+        else:
+            f = self._file
+            f.seek(ofs)
+            f.write(data)
+            f.seek(self._buf_ofs)
+
+    def _leaf_pending_end(self, is_last):
+        if not is_last:
+            self._write(_BLOCK_SENTINEL_DATA)
+        self._patch(self._leaf_pending, pack('<I', self._tell()))
+        self._leaf_pending = None
+
+    def elem_begin(self, elem):
+        """
+        Write the header & properties of elem (its sub-elements, if any, are ignored).
+        Following elements are its children, until elem_end() is called.
+        """
+        assert(elem.id != b'')
+        if self._leaf_pending is not None:
+            self._leaf_pending_end(False)
+
+        if self._stack:
+            self._stack[-1][1] = True
+        elif self._timedate_hack < 2 and _write_timedate_hack_elem(elem):
+            self._timedate_hack += 1
+
+        self._stack.append([self._tell(), False, bool(elem.props)])
+
+        props_length = 0
+        for data in elem.props:
+            props_length += 1 + len(data)
+        # end offset is patched later.
+        self._write(pack('<3I', 0, len(elem.props), props_length))
+
+        self._write(bytes((len(elem.id),)))
+        self._write(elem.id)
+
+        for i, data in enumerate(elem.props):
+            self._write(bytes((elem.props_type[i],)))
+            self._write(data)
+
+    def elem_end(self):
+        """
+        Close the scope of the last element given to elem_begin().
+        """
+        ofs, has_children, has_props = self._stack.pop()
+        if has_children:
+            if self._leaf_pending is not None:
+                self._leaf_pending_end(True)
+            self._write(_BLOCK_SENTINEL_DATA)
+        elif not has_props:
+            # Written as for elem._write_children(), but we do not know yet whether it is the last child.
+            self._leaf_pending = ofs
+            return
+        self._patch(ofs, pack('<I', self._tell()))
+
+    def finish(self, version=0):
+        """
+        Write the footer, once all elements have been written.
+        """
+        assert(not self._stack)
+        if self._leaf_pending is not None:
+            self._leaf_pending_end(True)
+        self._write(_BLOCK_SENTINEL_DATA)
+
+        if self._timedate_hack != 2:
+            print("Missing fields!")
+
+        if version:
+            self._patch(len(_HEAD_MAGIC), pack('<I', version))
+        else:
+            version = self._version
+
+        _write_footer(self._write, self._tell, version)
+        self._flush()
+
+
+def to_bytes(elem_root, version):
+    """
+    Return the whole FBX file as bytes.
+    """
+    import io
+    f = io.BytesIO()
+    write_fileobj(f, elem_root, version)
+    return f.getvalue()
+
+
+def _write_children_spliced(elem, write, tell, is_last, splices):
+    if not elem.elems:
+        elem._write_children(write, tell, is_last)
+        return
+
+    elem_last = elem.elems[-1]
+    for sub_elem in elem.elems:
+        data = splices.get(sub_elem)
+        if data is not None:
+            write(data)
+        else:
+            sub_elem._write_head(write)
+            _write_children_spliced(sub_elem, write, tell, (sub_elem is elem_last), splices)
+
+        if tell() != sub_elem._end_offset:
+            raise IOError("scope length not reached, "
+                          "something is wrong (%d)" % (sub_elem._end_offset - tell()))
+    write(_BLOCK_SENTINEL_DATA)
+
+
+def write_incremental(fn, elem_root, version):
+    """
+    Same as write(), but copy subtrees which did not change from the previous version of the file (if any).
+    Returns the number of copied subtrees.
+    """
+    import json
+
     assert(elem_root.id == b'')
 
+    _write_timedate_hack(elem_root)
+
+    elem_root._calc_offsets_children(len(_HEAD_MAGIC) + 4, False)
+
+    hashes = {}
+    for elem in elem_root.elems:
+        elem._calc_hash(hashes, _SPLICE_DEPTH)
+
+    # Must be read before we overwrite the file!
+    splices = _splice_read_prev(fn, elem_root, hashes)
+
     with open(fn, 'wb') as f:
         write = f.write
         tell = f.tell
@@ -294,27 +1053,19 @@ def write(fn, elem_root, version):
         write(_HEAD_MAGIC)
         write(pack('<I', version))
 
-        # hack since we don't decode time.
-        # ideally we would _not_ modify this data.
-        _write_timedate_hack(elem_root)
-
-        elem_root._calc_offsets_children(tell(), False)
-        elem_root._write_children(write, tell, False)
+        _write_children_spliced(elem_root, write, tell, False, splices)
 
-        write(_FOOT_ID)
-        write(b'\x00' * 4)
+        _write_footer(write, tell, version)
 
-        # padding for alignment (values between 1 & 16 observed)
-        # if already aligned to 16, add a full 16 bytes padding.
-        ofs = tell()
-        pad = ((ofs + 15) & ~15) - ofs
-        if pad == 0:
-            pad = 16
-
-        write(b'\0' * pad)
-
-        write(pack('<I', version))
+    st = os.stat(fn)
+    sidecar = {
+        "version": _SPLICE_VERSION,
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+        "elems": {binascii.hexlify(digest).decode(): (elem._start_offset, elem._end_offset)
+                  for elem, digest in hashes.items()},
+        }
+    with open(fn + _SPLICE_EXT, 'w') as f:
+        json.dump(sidecar, f)
 
-        # unknown magic (always the same)
-        write(b'\0' * 120)
-        write(b'\xf8\x5a\x8c\x6a\xde\xf5\xd9\x7e\xec\xe9\x0c\xe3\x75\x8f\x29\x0b')
+    return len(splices)
@@ -355,15 +355,8 @@ FBX_PROPERTIES_DEFINITIONS = {
 
 
 def _elem_props_set(elem, ptype, name, value):
-    p = elem_data_single_string(elem, b"P", name)
-    for t in ptype[:3]:
-        p.add_string(t)
-    if len(ptype) == 4:
-        getattr(p, ptype[3])(value)
-    elif len(ptype) > 4:
-        # We assume value is iterable, else it's a bug!
-        for callback, val in zip(ptype[3:], value):
-            getattr(p, callback)(val)
+    # We assume value is iterable when ptype has several values, else it's a bug!
+    encode_bin.elem_props_record(elem, name, ptype, value)
 
 
 def elem_props_set(elem, ptype, name, value=None):
@@ -2074,6 +2067,10 @@ def save_single(operator, scene, filepath="",
                 use_default_take=True,
                 embed_textures=False,
                 use_custom_properties=False,
+                use_array_cache=False,
+                use_incremental=False,
+                use_parallel_write=False,
+                use_ascii=False,
                 **kwargs
                 ):
 
@@ -2110,32 +2107,61 @@ def save_single(operator, scene, filepath="",
     print('\nFBX export starting... %r' % filepath)
     start_time = time.process_time()
 
-    # Generate some data about exported scene...
-    scene_data = fbx_data_from_scene(scene, settings)
+    # Identical arrays are only compressed once (and even only once across exports, with the disk cache).
+    if use_array_cache:
+        array_cache_dir = bpy.utils.user_resource('DATAFILES', path=os.path.join("io_scene_fbx", "array_cache"),
+                                                  create=True)
+    else:
+        array_cache_dir = None
+    # 'P' elements are packed once per distinct value, for this export only.
+    # Caches must always be released, later encode_bin users would reuse them otherwise.
+    encode_bin.array_cache_begin(array_cache_dir)
+    encode_bin.props_record_cache_begin()
+    encode_bin.array_compress_set(not use_ascii)
+    try:
+        # Generate some data about exported scene...
+        scene_data = fbx_data_from_scene(scene, settings)
 
-    root = elem_empty(None, b"")  # Root element has no id, as it is not saved per se!
+        root = elem_empty(None, b"")  # Root element has no id, as it is not saved per se!
 
-    # Mostly FBXHeaderExtension and GlobalSettings.
-    fbx_header_elements(root, scene_data)
+        # Mostly FBXHeaderExtension and GlobalSettings.
+        fbx_header_elements(root, scene_data)
 
-    # Documents and References are pretty much void currently.
-    fbx_documents_elements(root, scene_data)
-    fbx_references_elements(root, scene_data)
+        # Documents and References are pretty much void currently.
+        fbx_documents_elements(root, scene_data)
+        fbx_references_elements(root, scene_data)
 
-    # Templates definitions.
-    fbx_definitions_elements(root, scene_data)
+        # Templates definitions.
+        fbx_definitions_elements(root, scene_data)
 
-    # Actual data.
-    fbx_objects_elements(root, scene_data)
+        # Actual data.
+        fbx_objects_elements(root, scene_data)
 
-    # How data are inter-connected.
-    fbx_connections_elements(root, scene_data)
+        # How data are inter-connected.
+        fbx_connections_elements(root, scene_data)
 
-    # Animation.
-    fbx_takes_elements(root, scene_data)
+        # Animation.
+        fbx_takes_elements(root, scene_data)
+    finally:
+        encode_bin.array_compress_set(True)
+        encode_bin.props_record_cache_end()
+        array_cache_stats = encode_bin.array_cache_end()
+
+    if use_array_cache:
+        print("arrays compressed: %d, reused: %d, from disk cache: %d" %
+              (array_cache_stats["misses"], array_cache_stats["hits"], array_cache_stats["disk_hits"]))
 
     # And we are down, we can write the whole thing!
-    encode_bin.write(filepath, root, FBX_VERSION)
+    if use_ascii:
+        from . import encode_ascii
+        encode_ascii.write(filepath, root, FBX_VERSION)
+    elif use_incremental:
+        nbr_spliced = encode_bin.write_incremental(filepath, root, FBX_VERSION)
+        print("%d unchanged elements copied from previous file" % nbr_spliced)
+    elif use_parallel_write:
+        encode_bin.write_mmap(filepath, root, FBX_VERSION)
+    else:
+        encode_bin.write(filepath, root, FBX_VERSION)
 
     # copy all collected files, if we did not embed them.
     if not media_settings.embed_textures:
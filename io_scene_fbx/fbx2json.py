@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+# Script copyright (C) 2014 Blender Foundation
+
+"""
+Usage
+=====
+
+   fbx2json [--array-limit N] [--array-mode MODE] [FILES]...
+
+This script will write a JSON file for each binary FBX argument given,
+the inverse of json2fbx.
+
+The file is read and written incrementally, so the whole scene is never held in memory.
+
+
+Output
+======
+
+The JSON data is formatted the same way as json2fbx input,
+a list of nested lists of 4 items:
+
+   ``[id, [data, ...], "data_types", [subtree, ...]]``
+
+Arrays with more than N items (``--array-limit``) are written according to ``--array-mode``:
+
+* 'truncate': only the first N items are written (default).
+* 'elide': the array is replaced by ``{"length": L}``.
+* 'base64': the array is written as ``{"dtype": "d", "base64": "..."}``,
+  where dtype is the array data_type, and the buffer holds its little-endian items
+  (without ``--array-limit``, all arrays are written this way).
+  Bytes ('R') data are written the same way, and the output uses json2fbx schema version 2.
+
+Ids and strings which are not valid UTF-8 keep their invalid bytes as lone surrogates
+(Python's 'surrogateescape' error handler), json2fbx encodes them back the same way.
+
+Truncated and elided arrays are meant for reviews and bug reports, they cannot be converted back to FBX.
+"""
+
+
+try:
+    from . import parse_fbx
+except:
+    import parse_fbx
+
+data_types = parse_fbx.data_types
+
+import base64
+import json
+
+_IS_BIG_ENDIAN = (__import__("sys").byteorder != 'little')
+
+# json2fbx schema version of base64 buffers.
+JSON_SCHEMA_VERSION = 2
+
+# Number of array items formatted at once.
+_ARRAY_CHUNK_SIZE = 4096
+
+
+def bytes_to_json(data):
+    """
+    Same escaping as a Python bytes literal body, as expected by json2fbx.
+    """
+    return "".join(chr(c) if (32 <= c < 127 and c not in b'"\'\\') else "\\x%02x" % c for c in data)
+
+
+def array_to_json(write, data, prop_type, array_limit, array_mode):
+    length = len(data)
+    is_over_limit = (array_limit is not None and length > array_limit)
+    if array_mode == 'base64':
+        # Unlike other modes, this one is lossless, so it applies to all arrays when there is no limit.
+        if array_limit is None or is_over_limit:
+            if isinstance(data, parse_fbx.FBXArrayRaw):
+                data = data.decode()
+            if _IS_BIG_ENDIAN and data.itemsize > 1:
+                data = data[:]
+                data.byteswap()
+            write('{"dtype": "%c", "base64": "%s"}' % (prop_type, base64.b64encode(data.tobytes()).decode()))
+            return
+    elif is_over_limit:
+        if array_mode == 'elide':
+            write('{"length": %d}' % length)
+            return
+        else:  # 'truncate'
+            length = array_limit
+
+    if isinstance(data, parse_fbx.FBXArrayRaw):
+        data = data.decode()
+
+    write("[")
+    for i in range(0, length, _ARRAY_CHUNK_SIZE):
+        if i:
+            write(",")
+        chunk = data[i:min(i + _ARRAY_CHUNK_SIZE, length)]
+        if prop_type == data_types.BOOL_ARRAY:
+            chunk = ",".join("true" if v else "false" for v in chunk)
+        else:
+            chunk = ",".join(map(repr, chunk))
+            if "n" in chunk:
+                # inf/nan (float repr never has an 'n' otherwise).
+                chunk = ",".join(json.dumps(v) for v in data[i:min(i + _ARRAY_CHUNK_SIZE, length)])
+        write(chunk)
+    write("]")
+
+
+def props_to_json(write, elem, array_limit, array_mode):
+    write("[")
+    for i, (data, prop_type) in enumerate(zip(elem.props, elem.props_type)):
+        if i:
+            write(", ")
+        if prop_type == data_types.STRING:
+            write(json.dumps(data.decode('utf-8', 'surrogateescape')))
+        elif prop_type == data_types.BYTES:
+            if array_mode == 'base64':
+                write('{"dtype": "R", "base64": "%s"}' % base64.b64encode(data).decode())
+            else:
+                write(json.dumps(bytes_to_json(data)))
+        elif isinstance(data, (bool, int, float)):
+            write(json.dumps(data))
+        else:
+            array_to_json(write, data, prop_type, array_limit, array_mode)
+    write("]")
+
+
+def fbx2json_fileobj(fn, f, array_limit=None, array_mode='truncate'):
+    write = f.write
+
+    # Track whether we need a comma before the next item, per depth.
+    is_first = [True]
+
+    if array_mode == 'base64':
+        write('{"schema": %d, "elems": ' % JSON_SCHEMA_VERSION)
+    write("[")
+    for elem in parse_fbx.parse_iter(fn, use_raw_arrays=True):
+        if elem is None:
+            is_first.pop()
+            write("]]")
+            continue
+
+        if not is_first[-1]:
+            write(",")
+        is_first[-1] = False
+
+        write("\n%s[%s, " % (" " * len(is_first), json.dumps(elem.id.decode('utf-8', 'surrogateescape'))))
+        props_to_json(write, elem, array_limit, array_mode)
+        write(", %s, [" % json.dumps(bytes(elem.props_type).decode()))
+        is_first.append(True)
+    write("\n]")
+    if array_mode == 'base64':
+        write("}")
+    write("\n")
+
+
+def fbx2json(fn, array_limit=None, array_mode='truncate'):
+    import os
+
+    fn_json = "%s.json" % os.path.splitext(fn)[0]
+    print("Writing: %r " % fn_json, end="")
+    version = parse_fbx.parse_version(fn)
+    print("(Version %d) ..." % version)
+    with open(fn_json, 'w', encoding="utf-8") as f:
+        fbx2json_fileobj(fn, f, array_limit, array_mode)
+
+
+# ----------------------------------------------------------------------------
+# Command Line
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--array-limit", type=int, default=None,
+                        help="Arrays with more items are written according to --array-mode")
+    parser.add_argument("--array-mode", choices=('truncate', 'elide', 'base64'), default='truncate')
+    parser.add_argument("files", nargs="*")
+    args = parser.parse_args()
+
+    for arg in args.files:
+        try:
+            fbx2json(arg, args.array_limit, args.array_mode)
+        except:
+            print("Failed to convert %r, error:" % arg)
+
+            import traceback
+            traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+# Script copyright (C) 2014 Blender Foundation
+
+"""
+Usage
+=====
+
+   fbx2npz [--jobs N] [--raw] [--output-dir DIR] [FILES]...
+
+This script extracts mesh data from binary FBX files, without Blender,
+writing NumPy arrays for each mesh (requires NumPy).
+
+
+Output
+======
+
+For each FBX file, a directory named after it (``name_npz``, or ``--output-dir``) is written, holding:
+
+* ``UID.npz``: the arrays of the Geometry with this UID.
+  With ``--raw``, each array is written instead as ``UID.ARRAY.bin``, holding its little-endian items.
+* ``meshes.json``: the list of meshes, with their name, the names of the models using them,
+  the names of their skin bones, and the dtype and shape of each of their arrays.
+
+Arrays (L is the number of polygon corners - loops, P the number of polygons):
+
+* ``vertices``: (V, 3) coordinates.
+* ``loops``: (L,) vertex index of each loop.
+* ``loop_start``, ``loop_total``: (P,) first loop and number of loops of each polygon.
+* ``edges``: (E, 2) vertex indices, only when the Geometry defines its edges.
+* ``material_index``: (P,) material index of each polygon.
+* ``normals``: (L, 3), ``uv_N``: (L, 2), ``color_N``: (L, 4), one value per loop,
+  whatever the mapping used in the file.
+* ``skin_indexes``, ``skin_weights``, ``skin_cluster``: (W,) vertex index, weight and cluster (bone) index
+  of each skin weight.
+* ``skin_transform``, ``skin_transform_link``: (C, 4, 4) matrices of each cluster.
+"""
+
+
+try:
+    from . import parse_fbx
+    from .fbx_utils import (
+        elem_find_first,
+        elem_find_iter,
+        elem_find_first_string,
+        elem_find_first_bytes,
+        elem_split_name_class,
+        elem_uuid,
+        elem_prop_first,
+        )
+    from .fbx_jobs import jobs_run
+except:
+    import parse_fbx
+    from fbx_utils import (
+        elem_find_first,
+        elem_find_iter,
+        elem_find_first_string,
+        elem_find_first_bytes,
+        elem_split_name_class,
+        elem_uuid,
+        elem_prop_first,
+        )
+    from fbx_jobs import jobs_run
+
+data_types = parse_fbx.data_types
+
+import numpy as np
+import zlib
+
+_array_dtypes = {
+    data_types.FLOAT32_ARRAY: np.dtype('<f4'),
+    data_types.FLOAT64_ARRAY: np.dtype('<f8'),
+    data_types.INT32_ARRAY: np.dtype('<i4'),
+    data_types.INT64_ARRAY: np.dtype('<i8'),
+    data_types.BOOL_ARRAY: np.dtype('<i1'),
+    data_types.BYTE_ARRAY: np.dtype('<u1'),
+    }
+
+
+def array_as_numpy(data):
+    """
+    Return a NumPy array from an FBX array property,
+    raw arrays are inflated straight into the NumPy buffer (no intermediate Python array).
+    """
+    if isinstance(data, parse_fbx.FBXArrayRaw):
+        payload = data.payload
+        if data.encoding == 1:
+            payload = zlib.decompress(payload)
+        return np.frombuffer(payload, dtype=_array_dtypes[data.prop_type])
+    return np.asarray(data)
+
+
+def elem_array_first(elem, id_search):
+    data = elem_prop_first(elem_find_first(elem, id_search))
+    return None if data is None else array_as_numpy(data)
+
+
+# ----------------------------------------------------------------------------
+# Geometry
+
+class MeshLoops:
+    """
+    Polygon layout decoded from 'PolygonVertexIndex', used to map layers to loops.
+    """
+    __slots__ = (
+        "loops",
+        "loop_start",
+        "loop_total",
+        "loop_poly",  # polygon index of each loop.
+        "poly_ends",  # last loop of each polygon.
+        )
+
+    def __init__(self, fbx_polys):
+        # The last index of each polygon is stored negated (bitwise not).
+        poly_ends = np.flatnonzero(fbx_polys < 0)
+        # Ignore trailing indices without polygon (invalid, but seen in the wild).
+        fbx_polys = fbx_polys[:(poly_ends[-1] + 1) if len(poly_ends) else 0]
+
+        self.loops = np.where(fbx_polys < 0, ~fbx_polys, fbx_polys).astype(np.int32)
+        self.loop_total = np.diff(np.concatenate(((-1,), poly_ends))).astype(np.int32)
+        self.loop_start = (poly_ends + 1 - self.loop_total).astype(np.int32)
+        self.loop_poly = np.repeat(np.arange(len(poly_ends), dtype=np.int32), self.loop_total)
+        self.poly_ends = poly_ends
+
+    def edges_from_fbx(self, fbx_edges):
+        """
+        'Edges' index the polygon loops (NOT the vertices), each edge goes from a loop to the next one in its polygon.
+        """
+        loop_next = np.arange(1, len(self.loops) + 1)
+        # Last loop of a polygon wraps back to its start.
+        loop_next[self.poly_ends] = self.loop_start
+        return np.stack((self.loops[fbx_edges], self.loops[loop_next[fbx_edges]]), axis=1)
+
+
+def layer_index_apply(fbx_layer_data, fbx_layer_index):
+    """
+    Resolve 'IndexToDirect' references, -1 indices give zeroed items.
+    """
+    items = fbx_layer_data[np.maximum(fbx_layer_index, 0)]
+    items[fbx_layer_index < 0] = 0
+    return items
+
+
+def layer_to_loops(fbx_layer, layer_id, layer_index_id, stride, mesh_loops):
+    """
+    Return the layer data as an (L, stride) array, one item per loop, or None when unsupported.
+    """
+    (fbx_layer_name,
+     fbx_layer_mapping,
+     fbx_layer_ref,
+     ) = (elem_find_first_string(fbx_layer, b'Name'),
+          elem_find_first_bytes(fbx_layer, b'MappingInformationType'),
+          elem_find_first_bytes(fbx_layer, b'ReferenceInformationType'))
+
+    fbx_layer_data = elem_array_first(fbx_layer, layer_id)
+    # some valid files omit this data
+    if fbx_layer_data is None:
+        print("%r %r missing data" % (layer_id, fbx_layer_name))
+        return None
+    fbx_layer_data = fbx_layer_data.reshape(-1, stride)
+
+    # 'Index' is the pre-7.x name of 'IndexToDirect'.
+    if fbx_layer_ref in {b'IndexToDirect', b'Index'}:
+        fbx_layer_index = elem_array_first(fbx_layer, layer_index_id)
+        if fbx_layer_index is None:
+            print("%r %r missing index" % (layer_id, fbx_layer_name))
+            return None
+        fbx_layer_data = layer_index_apply(fbx_layer_data, fbx_layer_index)
+    elif fbx_layer_ref != b'Direct':
+        print("warning layer %r ref type unsupported: %r" % (layer_id, fbx_layer_ref))
+        return None
+
+    tot_loops = len(mesh_loops.loops)
+    if fbx_layer_mapping == b'ByPolygonVertex':
+        return fbx_layer_data[:tot_loops]
+    elif fbx_layer_mapping in {b'ByVertice', b'ByVertex'}:
+        return fbx_layer_data[mesh_loops.loops]
+    elif fbx_layer_mapping == b'ByPolygon':
+        return fbx_layer_data[mesh_loops.loop_poly]
+    elif fbx_layer_mapping == b'AllSame':
+        return np.repeat(fbx_layer_data[:1], tot_loops, axis=0)
+    else:
+        print("warning layer %r mapping type unsupported: %r" % (layer_id, fbx_layer_mapping))
+        return None
+
+
+def layer_material_to_polygons(fbx_obj, mesh_loops):
+    fbx_layer = elem_find_first(fbx_obj, b'LayerElementMaterial')
+    if fbx_layer is None:
+        return None
+
+    fbx_layer_mapping = elem_find_first_bytes(fbx_layer, b'MappingInformationType')
+    fbx_layer_data = elem_array_first(fbx_layer, b'Materials')
+    if fbx_layer_data is None:
+        return None
+
+    tot_polys = len(mesh_loops.loop_start)
+    if fbx_layer_mapping == b'AllSame':
+        return np.full(tot_polys, fbx_layer_data[0], dtype=np.int32)
+    elif fbx_layer_mapping == b'ByPolygon':
+        return fbx_layer_data[:tot_polys].astype(np.int32)
+    print("warning layer %r mapping type unsupported: %r" % (b'Materials', fbx_layer_mapping))
+    return None
+
+
+def geom_to_arrays(fbx_obj):
+    """
+    Return a dict of NumPy arrays for a Geometry Mesh.
+    """
+    arrays = {}
+
+    fbx_verts = elem_array_first(fbx_obj, b'Vertices')
+    fbx_polys = elem_array_first(fbx_obj, b'PolygonVertexIndex')
+    fbx_edges = elem_array_first(fbx_obj, b'Edges')
+
+    arrays["vertices"] = (np.empty(0) if fbx_verts is None else fbx_verts).reshape(-1, 3)
+    if fbx_polys is None:
+        return arrays
+
+    mesh_loops = MeshLoops(fbx_polys)
+    arrays["loops"] = mesh_loops.loops
+    arrays["loop_start"] = mesh_loops.loop_start
+    arrays["loop_total"] = mesh_loops.loop_total
+
+    if fbx_edges is not None:
+        arrays["edges"] = mesh_loops.edges_from_fbx(fbx_edges)
+
+    material_index = layer_material_to_polygons(fbx_obj, mesh_loops)
+    if material_index is not None:
+        arrays["material_index"] = material_index
+
+    fbx_layer = elem_find_first(fbx_obj, b'LayerElementNormal')
+    if fbx_layer is not None:
+        data = layer_to_loops(fbx_layer, b'Normals', b'NormalsIndex', 3, mesh_loops)
+        if data is not None:
+            arrays["normals"] = data
+
+    for layer_name, layer_elem_id, layer_id, layer_index_id, stride in (
+            ("uv", b'LayerElementUV', b'UV', b'UVIndex', 2),
+            ("color", b'LayerElementColor', b'Colors', b'ColorIndex', 4),
+            ):
+        for i, fbx_layer in enumerate(elem_find_iter(fbx_obj, layer_elem_id)):
+            data = layer_to_loops(fbx_layer, layer_id, layer_index_id, stride, mesh_loops)
+            if data is not None:
+                arrays["%s_%d" % (layer_name, i)] = data
+
+    return arrays
+
+
+# ----------------------------------------------------------------------------
+# Skinning
+
+def skin_to_arrays(fbx_skin, fbx_table_nodes, fbx_connection_map_reverse):
+    """
+    Return a dict of NumPy arrays for a Skin Deformer, and the list of its bone names.
+    """
+    skin_indexes = []
+    skin_weights = []
+    skin_cluster = []
+    transforms = []
+    transforms_link = []
+    bones = []
+
+    identity = np.identity(4).ravel()
+
+    for c_src in fbx_connection_map_reverse.get(elem_uuid(fbx_skin), ()):
+        fbx_cluster = fbx_table_nodes.get(c_src)
+        if fbx_cluster is None or fbx_cluster.id != b'Deformer' or fbx_cluster.props[-1] != b'Cluster':
+            continue
+
+        cluster_index = len(bones)
+        fbx_bone = None
+        for c_bone_src in fbx_connection_map_reverse.get(c_src, ()):
+            fbx_bone = fbx_table_nodes.get(c_bone_src)
+            if fbx_bone is not None and fbx_bone.id == b'Model':
+                break
+            fbx_bone = None
+        bones.append(None if fbx_bone is None else elem_split_name_class(fbx_bone)[0].decode('utf-8'))
+
+        for matrices, matrix_id in ((transforms, b'Transform'), (transforms_link, b'TransformLink')):
+            matrix = elem_array_first(fbx_cluster, matrix_id)
+            matrices.append(identity if matrix is None else matrix)
+
+        indexes = elem_array_first(fbx_cluster, b'Indexes')
+        weights = elem_array_first(fbx_cluster, b'Weights')
+        # Clusters without weights are valid (bone influencing nothing).
+        if indexes is None or weights is None:
+            continue
+        assert(len(indexes) == len(weights))
+        skin_indexes.append(indexes)
+        skin_weights.append(weights)
+        skin_cluster.append(np.full(len(indexes), cluster_index, dtype=np.int32))
+
+    if not bones:
+        return {}, bones
+
+    # FBX matrices are column-major, transpose so rows can be indexed as in Blender.
+    arrays = {
+        "skin_indexes": np.concatenate(skin_indexes or [np.empty(0, np.int32)]).astype(np.int32),
+        "skin_weights": np.concatenate(skin_weights or [np.empty(0)]),
+        "skin_cluster": np.concatenate(skin_cluster or [np.empty(0, np.int32)]),
+        "skin_transform": np.stack(transforms).reshape(-1, 4, 4).transpose(0, 2, 1),
+        "skin_transform_link": np.stack(transforms_link).reshape(-1, 4, 4).transpose(0, 2, 1),
+        }
+    return arrays, bones
+
+
+# ----------------------------------------------------------------------------
+# Files
+
+def fbx_output_dir(fn):
+    import os
+    return "%s_npz" % os.path.splitext(fn)[0]
+
+
+def arrays_write(output_dir, uid, arrays, use_raw):
+    import os
+
+    if use_raw:
+        for name, data in arrays.items():
+            data.astype(data.dtype.newbyteorder('<')).tofile(os.path.join(output_dir, "%d.%s.bin" % (uid, name)))
+    else:
+        np.savez(os.path.join(output_dir, "%d.npz" % uid), **arrays)
+
+
+def fbx2npz(fn, output_dir=None, use_raw=False):
+    import os
+    import json
+
+    if output_dir is None:
+        output_dir = fbx_output_dir(fn)
+    print("Writing: %r " % output_dir, end="")
+
+    elem_root, version = parse_fbx.parse(fn, use_raw_arrays=True)
+    print("(Version %d) ..." % version)
+
+    fbx_nodes = elem_find_first(elem_root, b'Objects')
+    fbx_connections = elem_find_first(elem_root, b'Connections')
+    if fbx_nodes is None:
+        raise Exception("No 'Objects' found in file %r" % fn)
+
+    fbx_table_nodes = {elem_uuid(fbx_obj): fbx_obj for fbx_obj in fbx_nodes.elems}
+
+    # Destination -> sources ('OO' links only, property links are not needed here).
+    fbx_connection_map_reverse = {}
+    if fbx_connections is not None:
+        for fbx_link in fbx_connections.elems:
+            if fbx_link.props[0] == b'OO' and fbx_link.props_type[1:3] == b'LL':
+                c_src, c_dst = fbx_link.props[1:3]
+                fbx_connection_map_reverse.setdefault(c_dst, []).append(c_src)
+
+    # Geometry -> Models using it.
+    geom_models = {}
+    for c_dst, c_srcs in fbx_connection_map_reverse.items():
+        fbx_model = fbx_table_nodes.get(c_dst)
+        if fbx_model is not None and fbx_model.id == b'Model':
+            for c_src in c_srcs:
+                geom_models.setdefault(c_src, []).append(elem_split_name_class(fbx_model)[0].decode('utf-8'))
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    meshes = []
+    for fbx_uuid, fbx_obj in fbx_table_nodes.items():
+        if fbx_obj.id != b'Geometry' or fbx_obj.props[-1] != b'Mesh':
+            continue
+
+        arrays = geom_to_arrays(fbx_obj)
+
+        bones = []
+        for c_src in fbx_connection_map_reverse.get(fbx_uuid, ()):
+            fbx_skin = fbx_table_nodes.get(c_src)
+            if fbx_skin is not None and fbx_skin.id == b'Deformer' and fbx_skin.props[-1] == b'Skin':
+                skin_arrays, bones = skin_to_arrays(fbx_skin, fbx_table_nodes, fbx_connection_map_reverse)
+                arrays.update(skin_arrays)
+                break
+
+        arrays_write(output_dir, fbx_uuid, arrays, use_raw)
+        meshes.append({
+            "uid": fbx_uuid,
+            "name": elem_split_name_class(fbx_obj)[0].decode('utf-8'),
+            "models": geom_models.get(fbx_uuid, []),
+            "skin_bones": bones,
+            "arrays": {name: {"dtype": data.dtype.newbyteorder('<').str, "shape": data.shape}
+                       for name, data in arrays.items()},
+            })
+
+    with open(os.path.join(output_dir, "meshes.json"), 'w', encoding="utf-8") as f:
+        json.dump({"file": os.path.basename(fn), "version": version, "meshes": meshes}, f, indent=1)
+
+    return len(meshes)
+
+
+def fbx2npz_job(fn, output_dir=None, use_raw=False):
+    """
+    Extract a single file, never raising.
+    Return (fn, status, time, error), status being one of 'DONE', 'FAILED'.
+    """
+    import time
+
+    start_time = time.time()
+    try:
+        fbx2npz(fn, output_dir, use_raw)
+        return fn, 'DONE', time.time() - start_time, None
+    except:
+        import traceback
+        return fn, 'FAILED', time.time() - start_time, traceback.format_exc()
+
+
+# ----------------------------------------------------------------------------
+# Command Line
+
+def main():
+    import argparse
+    import os
+    import time
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="Number of files extracted in parallel")
+    parser.add_argument("--raw", action="store_true", help="Write raw little-endian arrays instead of .npz archives")
+    parser.add_argument("--output-dir", default=None,
+                        help="Directory written into (one sub-directory per file when several files are given)")
+    parser.add_argument("files", nargs="*")
+    args = parser.parse_args()
+
+    def output_dir_get(fn):
+        if args.output_dir is None:
+            return None
+        if len(args.files) == 1:
+            return args.output_dir
+        return os.path.join(args.output_dir, os.path.basename(fbx_output_dir(fn)))
+
+    start_time = time.time()
+    results = jobs_run(fbx2npz_job, [(fn, (output_dir_get(fn), args.raw)) for fn in args.files], args.jobs)
+
+    failed = [(fn, error) for fn, status, _time, error in results if status == 'FAILED']
+    for fn, error in failed:
+        print("Failed to extract %r, error:" % fn)
+        print(error)
+
+    print("%d extracted, %d failed, in %.3f sec." % (
+          len(results) - len(failed), len(failed), time.time() - start_time))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,68 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+# Script copyright (C) Blender Foundation
+
+# Batch processing of files for the command line tools (json2fbx, fbx2npz...), no bpy dependency.
+
+
+def jobs_run(job, jobs_args, jobs=1):
+    """
+    Call job(fn, *args) for each (fn, args) of jobs_args, using up to jobs processes,
+    return the results in the same order.
+
+    job must never raise, and return a tuple (fn, status, time, error),
+    a (fn, 'FAILED', 0.0, error) result is also returned for files whose process died (out of memory...).
+    """
+    import traceback
+
+    if jobs <= 1 or len(jobs_args) <= 1:
+        return [job(fn, *args) for fn, args in jobs_args]
+
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+
+    results = [None] * len(jobs_args)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(job, fn, *args) for fn, args in jobs_args]
+        for i, future in enumerate(futures):
+            try:
+                results[i] = future.result()
+            except BrokenProcessPool:
+                pass  # retried below.
+            except:
+                results[i] = (jobs_args[i][0], 'FAILED', 0.0, traceback.format_exc())
+
+    # A dead process breaks the whole pool, failing all jobs not finished yet:
+    # run those again, each in its own process, so that only the culprit fails.
+    retry = [i for i, result in enumerate(results) if result is None]
+    for chunk in range(0, len(retry), jobs):
+        executors = []
+        for i in retry[chunk:chunk + jobs]:
+            fn, args = jobs_args[i]
+            executor = ProcessPoolExecutor(max_workers=1)
+            executors.append((i, executor, executor.submit(job, fn, *args)))
+        for i, executor, future in executors:
+            try:
+                results[i] = future.result()
+            except:
+                results[i] = (jobs_args[i][0], 'FAILED', 0.0, traceback.format_exc())
+            executor.shutdown()
+    return results
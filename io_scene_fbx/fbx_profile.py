@@ -0,0 +1,138 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+# Script copyright (C) Blender Foundation
+
+# Per phase timing of the importer (no bpy dependency).
+
+import time
+from contextlib import contextmanager
+
+
+class ProfilePhase:
+    __slots__ = (
+        "name",
+        "time_wall",
+        "time_cpu",
+        "count",  # number of items handled by the phase, None when unknown.
+        "memory_peak",  # peak of memory allocated during the phase (bytes), None when not traced.
+        )
+
+    def __init__(self, name):
+        self.name = name
+        self.time_wall = 0.0
+        self.time_cpu = 0.0
+        self.count = None
+        self.memory_peak = None
+
+    def as_dict(self):
+        return {"name": self.name,
+                "time_wall": self.time_wall,
+                "time_cpu": self.time_cpu,
+                "count": self.count,
+                "memory_peak": self.memory_peak,
+                }
+
+
+class Profiler:
+    """
+    Record wall and CPU time, item count and optionally memory peak (using tracemalloc) of named phases.
+    """
+    __slots__ = (
+        "phases",
+        "use_memory",
+        )
+
+    def __init__(self, use_memory=False):
+        self.phases = []
+        self.use_memory = use_memory
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time the body of the with statement, the yielded ProfilePhase count may be set there.
+        """
+        phase = ProfilePhase(name)
+        self.phases.append(phase)
+
+        if self.use_memory:
+            import tracemalloc
+            is_tracing = tracemalloc.is_tracing()
+            if is_tracing:
+                if hasattr(tracemalloc, "reset_peak"):
+                    tracemalloc.reset_peak()
+                memory_start = tracemalloc.get_traced_memory()[0]
+            else:
+                # Only trace allocations of the phase, tracing slows everything down.
+                tracemalloc.start()
+                memory_start = 0
+
+        time_wall = time.perf_counter()
+        time_cpu = time.process_time()
+        try:
+            yield phase
+        finally:
+            phase.time_wall = time.perf_counter() - time_wall
+            phase.time_cpu = time.process_time() - time_cpu
+
+            if self.use_memory:
+                phase.memory_peak = max(0, tracemalloc.get_traced_memory()[1] - memory_start)
+                if not is_tracing:
+                    tracemalloc.stop()
+
+    def run(self, name, fn):
+        """
+        Call fn as a phase, its return value is used as the item count.
+        """
+        with self.phase(name) as phase:
+            phase.count = fn()
+
+    def report(self):
+        """
+        Return the phases as a printable table.
+        """
+        lines = ["%-20s %10s %10s %8s %10s" % ("Phase", "Wall (s)", "CPU (s)", "Count", "Peak (KiB)")]
+        for phase in self.phases + [self.total()]:
+            lines.append("%-20s %10.4f %10.4f %8s %10s" % (
+                         phase.name, phase.time_wall, phase.time_cpu,
+                         "-" if phase.count is None else phase.count,
+                         "-" if phase.memory_peak is None else phase.memory_peak // 1024))
+        return "\n".join(lines)
+
+    def total(self):
+        phase = ProfilePhase("total")
+        phase.time_wall = sum(p.time_wall for p in self.phases)
+        phase.time_cpu = sum(p.time_cpu for p in self.phases)
+        if self.use_memory:
+            phase.memory_peak = max((p.memory_peak for p in self.phases), default=0)
+        return phase
+
+    def write_json(self, fn, **extra):
+        """
+        Write the phases (and extra items) as a JSON object.
+        """
+        import json
+
+        data = dict(extra)
+        data["phases"] = [phase.as_dict() for phase in self.phases]
+        data["total"] = self.total().as_dict()
+        with open(fn, 'w', encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+            f.write("\n")
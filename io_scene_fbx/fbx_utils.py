@@ -0,0 +1,242 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+# Script copyright (C) Blender Foundation
+
+# FBX element helpers, shared by the importer and command line tools (no bpy dependency).
+
+try:
+    from .parse_fbx import data_types, FBXElem, FBXArrayRaw
+except:
+    from parse_fbx import data_types, FBXElem, FBXArrayRaw
+
+
+def tuple_deg_to_rad(eul):
+    return (eul[0] / 57.295779513,
+            eul[1] / 57.295779513,
+            eul[2] / 57.295779513)
+
+
+def elem_find_first(elem, id_search, default=None):
+    for fbx_item in elem.elems:
+        if fbx_item.id == id_search:
+            return fbx_item
+    return default
+
+
+def elem_find_iter(elem, id_search):
+    for fbx_item in elem.elems:
+        if fbx_item.id == id_search:
+            yield fbx_item
+
+
+def elem_find_first_string(elem, id_search):
+    fbx_item = elem_find_first(elem, id_search)
+    if fbx_item is not None:
+        assert(len(fbx_item.props) == 1)
+        assert(fbx_item.props_type[0] == data_types.STRING)
+        return fbx_item.props[0].decode('utf-8')
+    return None
+
+
+def elem_find_first_bytes(elem, id_search, decode=True):
+    fbx_item = elem_find_first(elem, id_search)
+    if fbx_item is not None:
+        assert(len(fbx_item.props) == 1)
+        assert(fbx_item.props_type[0] == data_types.STRING)
+        return fbx_item.props[0]
+    return None
+
+
+def elem_repr(elem):
+    return "%s: props[%d=%r], elems=(%r)" % (
+        elem.id,
+        len(elem.props),
+        ", ".join([repr(p) for p in elem.props]),
+        # elem.props_type,
+        b", ".join([e.id for e in elem.elems]),
+        )
+
+
+def elem_split_name_class(elem):
+    assert(elem.props_type[-2] == data_types.STRING)
+    elem_name, elem_class = elem.props[-2].split(b'\x00\x01')
+    return elem_name, elem_class
+
+
+def elem_split_name_class_nodeattr(elem):
+    assert(elem.props_type[-2] == data_types.STRING)
+    elem_name, elem_class = elem.props[-2].split(b'\x00\x01')
+    assert(elem_class == b'NodeAttribute')
+    assert(elem.props_type[-1] == data_types.STRING)
+    elem_class = elem.props[-1]
+    return elem_name, elem_class
+
+
+def elem_uuid(elem):
+    assert(elem.props_type[0] == data_types.INT64)
+    return elem.props[0]
+
+
+def elem_prop_first(elem):
+    return elem.props[0] if (elem is not None) and elem.props else None
+
+
+def elem_prop_first_array(elem):
+    """
+    Same as elem_prop_first, for array properties: raw arrays (see parse(use_raw_arrays=True))
+    are decoded here, so only the arrays actually read are ever decompressed.
+    """
+    data = elem_prop_first(elem)
+    if isinstance(data, FBXArrayRaw):
+        data = data.decode()
+    return data
+
+
+# ----
+# Support for
+# Properties70: { ... P:
+def elem_props_index(elem):
+    """
+    Return a dict (property name -> P element) of a Properties70 element (None gives an empty dict).
+    """
+    props = {}
+    if elem is not None:
+        for subelem in elem.elems:
+            assert(subelem.id == b'P')
+            # first one wins, as in elem_props_find_first
+            props.setdefault(subelem.props[0], subelem)
+    return props
+
+
+def elem_props_resolve(elem, props_tmpl=None):
+    """
+    Return the properties of an object as a dict (property name -> P element):
+    its own Properties70 element, merged over the template properties (a dict from elem_props_index).
+    """
+    props = elem_props_index(elem)
+    if props_tmpl:
+        props_all = props_tmpl.copy()
+        props_all.update(props)
+        return props_all
+    return props
+
+
+def elem_props_find_first(elem, elem_prop_id):
+
+    # resolved properties (see elem_props_resolve), the common case
+    if type(elem) is dict:
+        return elem.get(elem_prop_id)
+
+    # support for templates (tuple of elems)
+    if type(elem) is not FBXElem:
+        assert(type(elem) is tuple)
+        for e in elem:
+            result = elem_props_find_first(e, elem_prop_id)
+            if result is not None:
+                '''
+                if e is elem[1]:
+                    print("Using templ!!!", elem_prop_id)
+                '''
+                return result
+        assert(len(elem) > 0)
+        return None
+
+    for subelem in elem.elems:
+        assert(subelem.id == b'P')
+        if subelem.props[0] == elem_prop_id:
+            return subelem
+    return None
+
+
+def elem_props_get_color_rgb(elem, elem_prop_id, default=None):
+    elem_prop = elem_props_find_first(elem, elem_prop_id)
+    if elem_prop is not None:
+        assert(elem_prop.props[0] == elem_prop_id)
+        if elem_prop.props[1] == b'Color':
+            # FBX version 7300
+            assert(elem_prop.props[1] == b'Color')
+            assert(elem_prop.props[2] == b'')
+            assert(elem_prop.props[3] in {b'A', b'A+', b'AU'})
+        else:
+            assert(elem_prop.props[1] == b'ColorRGB')
+            assert(elem_prop.props[2] == b'Color')
+            #print(elem_prop.props_type[4:7])
+        assert(elem_prop.props_type[4:7] == bytes((data_types.FLOAT64,)) * 3)
+        return elem_prop.props[4:7]
+    return default
+
+
+def elem_props_get_vector_3d(elem, elem_prop_id, default=None):
+    elem_prop = elem_props_find_first(elem, elem_prop_id)
+    if elem_prop is not None:
+        assert(elem_prop.props_type[4:7] == bytes((data_types.FLOAT64,)) * 3)
+        return elem_prop.props[4:7]
+    return default
+
+
+def elem_props_get_number(elem, elem_prop_id, default=None):
+    elem_prop = elem_props_find_first(elem, elem_prop_id)
+    if elem_prop is not None:
+        assert(elem_prop.props[0] == elem_prop_id)
+        if elem_prop.props[1] == b'double':
+            assert(elem_prop.props[1] == b'double')
+            assert(elem_prop.props[2] == b'Number')
+        else:
+            assert(elem_prop.props[1] == b'Number')
+            assert(elem_prop.props[2] == b'')
+            assert(elem_prop.props[3] in {b'A', b'A+', b'AU'})
+
+        # we could allow other number types
+        assert(elem_prop.props_type[4] == data_types.FLOAT64)
+
+        return elem_prop.props[4]
+    return default
+
+
+def elem_props_get_bool(elem, elem_prop_id, default=None):
+    elem_prop = elem_props_find_first(elem, elem_prop_id)
+    if elem_prop is not None:
+        assert(elem_prop.props[0] == elem_prop_id)
+        assert(elem_prop.props[1] == b'bool')
+        assert(elem_prop.props[2] == b'')
+        assert(elem_prop.props[3] == b'')
+
+        # we could allow other number types
+        assert(elem_prop.props_type[4] == data_types.INT32)
+        assert(elem_prop.props[4] in {0, 1})
+
+        return bool(elem_prop.props[4])
+    return default
+
+
+def elem_props_get_enum(elem, elem_prop_id, default=None):
+    elem_prop = elem_props_find_first(elem, elem_prop_id)
+    if elem_prop is not None:
+        assert(elem_prop.props[0] == elem_prop_id)
+        assert(elem_prop.props[1] == b'enum')
+        assert(elem_prop.props[2] == b'')
+        assert(elem_prop.props[3] == b'')
+
+        # we could allow other number types
+        assert(elem_prop.props_type[4] == data_types.INT32)
+
+        return elem_prop.props[4]
+    return default
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+# Script copyright (C) 2014 Blender Foundation
+
+"""
+Usage
+=====
+
+   fbxdiff [--decode] FILE_A FILE_B
+
+This script compares two binary FBX files structurally,
+and reports elements added, removed or changed in FILE_B compared to FILE_A.
+
+
+Output
+======
+
+One line per difference:
+
+* ``+ path``: element only in FILE_B.
+* ``- path``: element only in FILE_A.
+* ``~ path: details``: element in both files, with different properties.
+
+Paths are made of element ids, objects are identified by their UID and name,
+properties (``P`` elements) by their name.
+
+Subtrees are compared by hash first, so identical regions are skipped entirely.
+By default arrays are hashed as stored in the file (compressed), and only decoded when their payloads differ,
+use ``--decode`` to hash decoded arrays instead (slower, but arrays compressed differently are not visited).
+
+Exit status is 0 when files are identical, 1 otherwise.
+"""
+
+
+try:
+    from . import parse_fbx
+except:
+    import parse_fbx
+
+data_types = parse_fbx.data_types
+
+import hashlib
+from struct import pack
+
+_props_scalar_pack = {
+    data_types.BOOL: '<?',
+    data_types.INT16: '<h',
+    data_types.INT32: '<i',
+    data_types.INT64: '<q',
+    data_types.FLOAT32: '<f',
+    data_types.FLOAT64: '<d',
+    }
+
+
+def prop_array_get(data):
+    if isinstance(data, parse_fbx.FBXArrayRaw):
+        return data.decode()
+    return data
+
+
+def elem_hash(elem, hashes):
+    """
+    Merkle-like hash of elem's subtree, also stores hashes of all sub-elements in hashes ({id(elem): digest}).
+    """
+    h = hashlib.sha1()
+    h.update(elem.id)
+    h.update(elem.props_type)
+    for data, prop_type in zip(elem.props, elem.props_type):
+        fmt = _props_scalar_pack.get(prop_type)
+        if fmt is not None:
+            h.update(pack(fmt, data))
+        elif isinstance(data, bytes):
+            h.update(pack('<I', len(data)))
+            h.update(data)
+        elif isinstance(data, parse_fbx.FBXArrayRaw):
+            h.update(pack('<2I', data.length, data.encoding))
+            h.update(data.payload)
+        else:
+            h.update(pack('<I', len(data)))
+            h.update(data.tobytes())
+    for sub_elem in elem.elems:
+        h.update(elem_hash(sub_elem, hashes))
+    digest = h.digest()
+    hashes[id(elem)] = digest
+    return digest
+
+
+def elem_key(elem):
+    """
+    Key used to match elements between both files.
+    """
+    if elem.props:
+        if elem.props_type[0] == data_types.INT64:
+            return (elem.id, elem.props[0])  # UID.
+        elif elem.id == b'P':
+            return (elem.id, elem.props[0])  # Property name.
+        elif elem.id == b'C':
+            return (elem.id, tuple(elem.props))  # Connection.
+    return (elem.id,)
+
+
+def elem_path_item(elem, index):
+    name = elem.id.decode('utf-8', 'replace')
+    if elem.props:
+        if elem.props_type[0] == data_types.INT64:
+            name += "[%d" % elem.props[0]
+            if len(elem.props) > 1 and elem.props_type[1] == data_types.STRING:
+                name += " %r" % elem.props[1].replace(b'\x00\x01', b'::').decode('utf-8', 'replace')
+            name += "]"
+        elif elem.id == b'P':
+            name += "[%r]" % elem.props[0].decode('utf-8', 'replace')
+        elif elem.id == b'C':
+            name += "[%s]" % ", ".join(repr(p) for p in elem.props)
+    if index:
+        name += "#%d" % index
+    return name
+
+
+def elem_props_diff(elem_a, elem_b):
+    """
+    Return a description of the differences between properties of both elements, or None.
+    """
+    if elem_a.props_type != elem_b.props_type:
+        return "types %r -> %r" % (bytes(elem_a.props_type).decode(), bytes(elem_b.props_type).decode())
+
+    details = []
+    for i, (data_a, data_b) in enumerate(zip(elem_a.props, elem_b.props)):
+        if isinstance(data_a, (bytes, int, float)):
+            if data_a != data_b:
+                details.append("[%d] %r -> %r" % (i, data_a, data_b))
+            continue
+
+        if (isinstance(data_a, parse_fbx.FBXArrayRaw) and isinstance(data_b, parse_fbx.FBXArrayRaw) and
+            data_a.payload == data_b.payload):
+            continue
+        data_a = prop_array_get(data_a)
+        data_b = prop_array_get(data_b)
+        if len(data_a) != len(data_b):
+            details.append("[%d] array length %d -> %d" % (i, len(data_a), len(data_b)))
+        elif data_a != data_b:
+            nbr = sum(1 for a, b in zip(data_a, data_b) if a != b)
+            details.append("[%d] array %d/%d values differ" % (i, nbr, len(data_a)))
+
+    return ", ".join(details) if details else None
+
+
+def elems_diff(elem_a, elem_b, hashes_a, hashes_b, path, report):
+    if hashes_a[id(elem_a)] == hashes_b[id(elem_b)]:
+        return
+
+    details = elem_props_diff(elem_a, elem_b)
+    if details is not None:
+        report.append(('~', path, details))
+
+    def _elems_keyed(elem):
+        keyed = {}
+        counts = {}
+        for sub_elem in elem.elems:
+            key = elem_key(sub_elem)
+            index = counts[key] = counts.get(key, -1) + 1
+            keyed[key + (index,)] = sub_elem
+        return keyed
+
+    keyed_a = _elems_keyed(elem_a)
+    keyed_b = _elems_keyed(elem_b)
+
+    for key, sub_elem_a in keyed_a.items():
+        sub_path = path + "/" + elem_path_item(sub_elem_a, key[-1])
+        sub_elem_b = keyed_b.get(key)
+        if sub_elem_b is None:
+            report.append(('-', sub_path, None))
+        else:
+            elems_diff(sub_elem_a, sub_elem_b, hashes_a, hashes_b, sub_path, report)
+    for key, sub_elem_b in keyed_b.items():
+        if key not in keyed_a:
+            report.append(('+', path + "/" + elem_path_item(sub_elem_b, key[-1]), None))
+
+
+def diff(fn_a, fn_b, use_decode=False):
+    """
+    Return a list of differences between both FBX files,
+    as (kind, path, details) tuples, kind being one of '+', '-', '~'.
+    """
+    root_a, version_a = parse_fbx.parse(fn_a, use_raw_arrays=not use_decode)
+    root_b, version_b = parse_fbx.parse(fn_b, use_raw_arrays=not use_decode)
+
+    report = []
+    if version_a != version_b:
+        report.append(('~', "", "version %d -> %d" % (version_a, version_b)))
+
+    hashes_a = {}
+    hashes_b = {}
+    elem_hash(root_a, hashes_a)
+    elem_hash(root_b, hashes_b)
+
+    elems_diff(root_a, root_b, hashes_a, hashes_b, "", report)
+    return report
+
+
+# ----------------------------------------------------------------------------
+# Command Line
+
+def main():
+    import sys
+
+    args = sys.argv[1:]
+    if "--help" in args or len([arg for arg in args if not arg.startswith("--")]) != 2:
+        print(__doc__)
+        return
+
+    use_decode = "--decode" in args
+    fn_a, fn_b = [arg for arg in args if not arg.startswith("--")]
+
+    report = diff(fn_a, fn_b, use_decode)
+    for kind, path, details in report:
+        if details is None:
+            print(kind, path)
+        else:
+            print("%s %s: %s" % (kind, path, details))
+
+    sys.exit(1 if report else 0)
+
+
+if __name__ == "__main__":
+    main()
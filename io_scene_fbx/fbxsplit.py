@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+# Script copyright (C) 2014 Blender Foundation
+
+"""
+Usage
+=====
+
+   fbxsplit split [--select PATTERN]... [--each | --output FILE] FILE
+   fbxsplit merge --output FILE FILES...
+
+This script splits and merges binary FBX files, without Blender.
+Array data is copied as stored in the files (never decompressed nor re-compressed).
+
+
+Split
+=====
+
+Writes the selected Models (``--select``, shell-style patterns matched against Model names,
+all root Models by default) with everything they depend on:
+their child Models, geometry, node attributes, materials, textures, deformers (and bones), animation curves...
+i.e. all objects connected to them, recursively, along with the bind poses of those Models.
+
+With ``--each``, one file is written per selected Model (``FILE_NAME.fbx``), Models whose parent is selected too
+are written along with their parent. Otherwise all selected Models are written in a single file
+(``--output``, ``FILE_split.fbx`` by default).
+
+Models whose parent is not written become root Models.
+
+
+Merge
+=====
+
+Writes all objects of all files into a single one. Objects whose UID is already used by a previous file
+get a new UID. Header, global settings and property templates are taken from the first file
+defining them, object counts are updated.
+"""
+
+
+try:
+    from . import parse_fbx
+    from . import encode_bin
+    from .fbx_utils import (
+        elem_find_first,
+        elem_find_iter,
+        elem_split_name_class,
+        elem_uuid,
+        )
+except:
+    import parse_fbx
+    import encode_bin
+    from fbx_utils import (
+        elem_find_first,
+        elem_find_iter,
+        elem_split_name_class,
+        elem_uuid,
+        )
+
+data_types = parse_fbx.data_types
+FBXElem = parse_fbx.FBXElem
+
+# Objects added to a split file when any object connected to them is, without their own dependencies.
+_OBJECT_OWNER_IDS = {b'AnimationLayer', b'AnimationStack'}
+
+
+def elem_new(elem_id, props, props_type, elems=None):
+    return FBXElem(elem_id, list(props), bytearray(props_type), [] if elems is None else elems)
+
+
+def connection_uuids(fbx_link):
+    """
+    Return (source, destination) UIDs of a connection, or None for links not between objects.
+    """
+    if fbx_link.props_type[1:3] == b'LL':
+        return fbx_link.props[1], fbx_link.props[2]
+    return None
+
+
+def connection_maps(fbx_connections):
+    """
+    Return dicts of destination -> sources and source -> destinations UIDs.
+    """
+    connection_map = {}
+    connection_map_reverse = {}
+    for fbx_link in fbx_connections.elems:
+        c_uuids = connection_uuids(fbx_link)
+        if c_uuids is not None:
+            c_src, c_dst = c_uuids
+            connection_map.setdefault(c_src, []).append(c_dst)
+            connection_map_reverse.setdefault(c_dst, []).append(c_src)
+    return connection_map, connection_map_reverse
+
+
+def definitions_update(fbx_defs, fbx_nodes):
+    """
+    Update object counts from the objects actually written, removing unused object types.
+    """
+    counts = {}
+    for fbx_obj in fbx_nodes.elems:
+        counts[fbx_obj.id] = counts.get(fbx_obj.id, 0) + 1
+    # Always a single one, not in 'Objects'.
+    counts[b'GlobalSettings'] = 1
+
+    elems = []
+    total = 0
+    for fbx_def in fbx_defs.elems:
+        if fbx_def.id == b'ObjectType':
+            count = counts.get(fbx_def.props[0], 0)
+            if not count:
+                continue
+            total += count
+            fbx_def.elems[:] = [elem_new(b'Count', (count,), b'I') if e.id == b'Count' else e for e in fbx_def.elems]
+        elems.append(fbx_def)
+    fbx_defs.elems[:] = [elem_new(b'Count', (total,), b'I') if e.id == b'Count' else e for e in elems]
+
+
+def file_write(fn, elem_root, version):
+    print("Writing: %r (Version %d) ..." % (fn, version))
+    encode_bin.write(fn, encode_bin.elem_from_parsed(elem_root), version)
+
+
+# ----------------------------------------------------------------------------
+# Split
+
+def pose_filter(fbx_pose, uuids):
+    """
+    Return a copy of a bind pose keeping only nodes of given objects, or None when none are left.
+    """
+    elems = []
+    count = 0
+    for e in fbx_pose.elems:
+        if e.id == b'PoseNode':
+            if elem_find_first(e, b'Node').props[0] not in uuids:
+                continue
+            count += 1
+        elems.append(e)
+    if not count:
+        return None
+    elems = [elem_new(b'NbPoseNodes', (count,), b'I') if e.id == b'NbPoseNodes' else e for e in elems]
+    return fbx_pose._replace(elems=elems)
+
+
+def split_closure(fbx_table_nodes, connection_map, connection_map_reverse, seeds):
+    """
+    Return the set of UIDs of seeds and all objects they depend on (connected to them as sources, recursively).
+    """
+    uuids = set()
+    stack = list(seeds)
+    while stack:
+        fbx_uuid = stack.pop()
+        if fbx_uuid in uuids or fbx_uuid not in fbx_table_nodes:
+            continue
+        uuids.add(fbx_uuid)
+        stack.extend(connection_map_reverse.get(fbx_uuid, ()))
+
+    # Animation curve nodes need their layer and stack, but not the other curves of those.
+    owners = set()
+    stack = list(uuids)
+    while stack:
+        for c_dst in connection_map.get(stack.pop(), ()):
+            fbx_obj = fbx_table_nodes.get(c_dst)
+            if fbx_obj is not None and fbx_obj.id in _OBJECT_OWNER_IDS and c_dst not in owners:
+                owners.add(c_dst)
+                stack.append(c_dst)
+    return uuids | owners
+
+
+def split_root(elem_root, fbx_table_nodes, uuids):
+    """
+    Return a new root element with only objects in uuids (other elements are shared with elem_root).
+    """
+    elem_root_new = elem_root._replace(elems=[])
+    for elem in elem_root.elems:
+        if elem.id == b'Objects':
+            elems = []
+            for fbx_obj in elem.elems:
+                if fbx_obj.id == b'Pose':
+                    fbx_obj = pose_filter(fbx_obj, uuids)
+                    if fbx_obj is not None:
+                        elems.append(fbx_obj)
+                elif elem_uuid(fbx_obj) in uuids:
+                    elems.append(fbx_obj)
+            elem = elem._replace(elems=elems)
+        elif elem.id == b'Connections':
+            elems = []
+            for fbx_link in elem.elems:
+                c_uuids = connection_uuids(fbx_link)
+                if c_uuids is None or c_uuids[0] not in uuids:
+                    continue
+                c_src, c_dst = c_uuids
+                if c_dst != 0 and c_dst not in uuids:
+                    # Parent not written, make this Model a root one.
+                    fbx_parent = fbx_table_nodes.get(c_dst)
+                    if fbx_table_nodes[c_src].id != b'Model' or fbx_parent is None or fbx_parent.id != b'Model':
+                        continue
+                    fbx_link = fbx_link._replace(props=[fbx_link.props[0], c_src, 0] + fbx_link.props[3:])
+                elems.append(fbx_link)
+            elem = elem._replace(elems=elems)
+        elif elem.id == b'Definitions':
+            elem = elem._replace(elems=[e._replace(elems=e.elems[:]) for e in elem.elems])
+        elem_root_new.elems.append(elem)
+
+    fbx_defs = elem_find_first(elem_root_new, b'Definitions')
+    if fbx_defs is not None:
+        definitions_update(fbx_defs, elem_find_first(elem_root_new, b'Objects'))
+    return elem_root_new
+
+
+def split(fn, patterns=(), use_each=False, fn_output=None):
+    """
+    Write selected Models of fn and their dependencies in new file(s), return the list of written files.
+    """
+    import os
+    import fnmatch
+
+    elem_root, version = parse_fbx.parse(fn, use_raw_arrays=True)
+    fbx_nodes = elem_find_first(elem_root, b'Objects')
+    fbx_connections = elem_find_first(elem_root, b'Connections')
+    if fbx_nodes is None or fbx_connections is None:
+        raise Exception("No 'Objects' or 'Connections' found in file %r" % fn)
+
+    fbx_table_nodes = {elem_uuid(fbx_obj): fbx_obj for fbx_obj in fbx_nodes.elems if fbx_obj.id != b'Pose'}
+    connection_map, connection_map_reverse = connection_maps(fbx_connections)
+
+    models = {fbx_uuid: elem_split_name_class(fbx_obj)[0].decode('utf-8')
+              for fbx_uuid, fbx_obj in fbx_table_nodes.items() if fbx_obj.id == b'Model'}
+    if patterns:
+        selected = {fbx_uuid for fbx_uuid, name in models.items()
+                    if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)}
+    else:
+        selected = {fbx_uuid for fbx_uuid in models if 0 in connection_map.get(fbx_uuid, ())}
+
+    if not selected:
+        print("No Model selected in %r" % fn)
+        return []
+
+    fn_base = os.path.splitext(fn)[0]
+    if use_each:
+        # Models written with their selected parent.
+        def model_parent_selected(fbx_uuid):
+            for c_dst in connection_map.get(fbx_uuid, ()):
+                if c_dst in models:
+                    return c_dst in selected or model_parent_selected(c_dst)
+            return False
+
+        jobs = []
+        for fbx_uuid in sorted(selected, key=models.get):
+            if not model_parent_selected(fbx_uuid):
+                name = "".join(c if (c.isalnum() or c in "-_.") else "_" for c in models[fbx_uuid])
+                jobs.append(("%s_%s.fbx" % (fn_base, name), (fbx_uuid,)))
+    else:
+        jobs = [(fn_output or ("%s_split.fbx" % fn_base), selected)]
+
+    for fn_split, seeds in jobs:
+        uuids = split_closure(fbx_table_nodes, connection_map, connection_map_reverse, seeds)
+        file_write(fn_split, split_root(elem_root, fbx_table_nodes, uuids), version)
+    return [fn_split for fn_split, _seeds in jobs]
+
+
+# ----------------------------------------------------------------------------
+# Merge
+
+def merge_uuids_remap(elem_root, uuids_used, uuid_next):
+    """
+    Give new UIDs to objects of elem_root already in uuids_used (updating it), return the next free UID.
+    """
+    fbx_nodes = elem_find_first(elem_root, b'Objects')
+    fbx_connections = elem_find_first(elem_root, b'Connections')
+
+    uuids_remap = {}
+    for fbx_obj in fbx_nodes.elems:
+        fbx_uuid = elem_uuid(fbx_obj)
+        if fbx_uuid in uuids_used or fbx_uuid in uuids_remap:
+            while uuid_next in uuids_used:
+                uuid_next += 1
+            uuids_remap[fbx_uuid] = uuid_next
+            uuids_used.add(uuid_next)
+        else:
+            uuids_used.add(fbx_uuid)
+
+    if uuids_remap:
+        for fbx_obj in fbx_nodes.elems:
+            fbx_obj.props[0] = uuids_remap.get(fbx_obj.props[0], fbx_obj.props[0])
+            if fbx_obj.id == b'Pose':
+                for fbx_pose_node in elem_find_iter(fbx_obj, b'PoseNode'):
+                    e = elem_find_first(fbx_pose_node, b'Node')
+                    e.props[0] = uuids_remap.get(e.props[0], e.props[0])
+        if fbx_connections is not None:
+            for fbx_link in fbx_connections.elems:
+                if connection_uuids(fbx_link) is not None:
+                    fbx_link.props[1] = uuids_remap.get(fbx_link.props[1], fbx_link.props[1])
+                    fbx_link.props[2] = uuids_remap.get(fbx_link.props[2], fbx_link.props[2])
+
+    return uuid_next
+
+
+def merge_definitions(fbx_defs, fbx_defs_other):
+    """
+    Add object types of fbx_defs_other missing in fbx_defs (counts are updated afterwards).
+    """
+    types = {fbx_def.props[0] for fbx_def in fbx_defs.elems if fbx_def.id == b'ObjectType'}
+    for fbx_def in fbx_defs_other.elems:
+        if fbx_def.id == b'ObjectType' and fbx_def.props[0] not in types:
+            fbx_defs.elems.append(fbx_def)
+            types.add(fbx_def.props[0])
+
+
+def merge_takes(fbx_takes, fbx_takes_other):
+    names = {fbx_take.props[0] for fbx_take in elem_find_iter(fbx_takes, b'Take')}
+    for fbx_take in elem_find_iter(fbx_takes_other, b'Take'):
+        if fbx_take.props[0] not in names:
+            fbx_takes.elems.append(fbx_take)
+            names.add(fbx_take.props[0])
+
+
+def merge(fns, fn_output):
+    elem_root = None
+    version = 0
+    uuids_used = {0}
+    uuid_next = 1
+
+    for fn in fns:
+        elem_root_other, version_other = parse_fbx.parse(fn, use_raw_arrays=True)
+        if elem_find_first(elem_root_other, b'Objects') is None:
+            raise Exception("No 'Objects' found in file %r" % fn)
+
+        uuid_next = merge_uuids_remap(elem_root_other, uuids_used, uuid_next)
+
+        if elem_root is None:
+            elem_root, version = elem_root_other, version_other
+            continue
+
+        if version_other != version:
+            print("Warning: %r version %d differs from %d" % (fn, version_other, version))
+
+        for elem_other in elem_root_other.elems:
+            elem = elem_find_first(elem_root, elem_other.id)
+            if elem is None:
+                elem_root.elems.append(elem_other)
+            elif elem.id in {b'Objects', b'Connections'}:
+                elem.elems.extend(elem_other.elems)
+            elif elem.id == b'Definitions':
+                merge_definitions(elem, elem_other)
+            elif elem.id == b'Takes':
+                merge_takes(elem, elem_other)
+            # Other elements (header, settings, documents...) are kept from the first file.
+
+    fbx_defs = elem_find_first(elem_root, b'Definitions')
+    if fbx_defs is not None:
+        definitions_update(fbx_defs, elem_find_first(elem_root, b'Objects'))
+
+    file_write(fn_output, elem_root, version)
+
+
+# ----------------------------------------------------------------------------
+# Command Line
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command")
+
+    parser_split = subparsers.add_parser("split", help="Write selected Models and their dependencies")
+    parser_split.add_argument("--select", action="append", default=[], metavar="PATTERN",
+                              help="Model name pattern (may be given several times)")
+    group = parser_split.add_mutually_exclusive_group()
+    group.add_argument("--each", action="store_true", help="Write one file per selected Model")
+    group.add_argument("--output", default=None, help="File to write")
+    parser_split.add_argument("file")
+
+    parser_merge = subparsers.add_parser("merge", help="Write all objects of several files into one")
+    parser_merge.add_argument("--output", required=True, help="File to write")
+    parser_merge.add_argument("files", nargs="+")
+
+    args = parser.parse_args()
+
+    if args.command == "split":
+        return 0 if split(args.file, args.select, args.each, args.output) else 1
+    elif args.command == "merge":
+        merge(args.files, args.output)
+        return 0
+
+    parser.print_help()
+    return 1
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -28,185 +28,21 @@
 
 import bpy
 
-# global singleton, assign on execution
-fbx_elem_nil = None
-
 # -----
 # Utils
-from .parse_fbx import data_types, FBXElem
-
-
-def tuple_deg_to_rad(eul):
-    return (eul[0] / 57.295779513,
-            eul[1] / 57.295779513,
-            eul[2] / 57.295779513)
-
-
-def elem_find_first(elem, id_search, default=None):
-    for fbx_item in elem.elems:
-        if fbx_item.id == id_search:
-            return fbx_item
-    return default
-
-
-def elem_find_iter(elem, id_search):
-    for fbx_item in elem.elems:
-        if fbx_item.id == id_search:
-            yield fbx_item
-
-
-def elem_find_first_string(elem, id_search):
-    fbx_item = elem_find_first(elem, id_search)
-    if fbx_item is not None:
-        assert(len(fbx_item.props) == 1)
-        assert(fbx_item.props_type[0] == data_types.STRING)
-        return fbx_item.props[0].decode('utf-8')
-    return None
-
-
-def elem_find_first_bytes(elem, id_search, decode=True):
-    fbx_item = elem_find_first(elem, id_search)
-    if fbx_item is not None:
-        assert(len(fbx_item.props) == 1)
-        assert(fbx_item.props_type[0] == data_types.STRING)
-        return fbx_item.props[0]
-    return None
-
-
-def elem_repr(elem):
-    return "%s: props[%d=%r], elems=(%r)" % (
-        elem.id,
-        len(elem.props),
-        ", ".join([repr(p) for p in elem.props]),
-        # elem.props_type,
-        b", ".join([e.id for e in elem.elems]),
-        )
-
-
-def elem_split_name_class(elem):
-    assert(elem.props_type[-2] == data_types.STRING)
-    elem_name, elem_class = elem.props[-2].split(b'\x00\x01')
-    return elem_name, elem_class
-
-
-def elem_split_name_class_nodeattr(elem):
-    assert(elem.props_type[-2] == data_types.STRING)
-    elem_name, elem_class = elem.props[-2].split(b'\x00\x01')
-    assert(elem_class == b'NodeAttribute')
-    assert(elem.props_type[-1] == data_types.STRING)
-    elem_class = elem.props[-1]
-    return elem_name, elem_class
-
-
-def elem_uuid(elem):
-    assert(elem.props_type[0] == data_types.INT64)
-    return elem.props[0]
-
-
-def elem_prop_first(elem):
-    return elem.props[0] if (elem is not None) and elem.props else None
-
-
-# ----
-# Support for
-# Properties70: { ... P:
-def elem_props_find_first(elem, elem_prop_id):
-
-    # support for templates (tuple of elems)
-    if type(elem) is not FBXElem:
-        assert(type(elem) is tuple)
-        for e in elem:
-            result = elem_props_find_first(e, elem_prop_id)
-            if result is not None:
-                '''
-                if e is elem[1]:
-                    print("Using templ!!!", elem_prop_id)
-                '''
-                return result
-        assert(len(elem) > 0)
-        return None
-
-    for subelem in elem.elems:
-        assert(subelem.id == b'P')
-        if subelem.props[0] == elem_prop_id:
-            return subelem
-    return None
-
-
-def elem_props_get_color_rgb(elem, elem_prop_id, default=None):
-    elem_prop = elem_props_find_first(elem, elem_prop_id)
-    if elem_prop is not None:
-        assert(elem_prop.props[0] == elem_prop_id)
-        if elem_prop.props[1] == b'Color':
-            # FBX version 7300
-            assert(elem_prop.props[1] == b'Color')
-            assert(elem_prop.props[2] == b'')
-            assert(elem_prop.props[3] in {b'A', b'A+', b'AU'})
-        else:
-            assert(elem_prop.props[1] == b'ColorRGB')
-            assert(elem_prop.props[2] == b'Color')
-            #print(elem_prop.props_type[4:7])
-        assert(elem_prop.props_type[4:7] == bytes((data_types.FLOAT64,)) * 3)
-        return elem_prop.props[4:7]
-    return default
-
-
-def elem_props_get_vector_3d(elem, elem_prop_id, default=None):
-    elem_prop = elem_props_find_first(elem, elem_prop_id)
-    if elem_prop is not None:
-        assert(elem_prop.props_type[4:7] == bytes((data_types.FLOAT64,)) * 3)
-        return elem_prop.props[4:7]
-    return default
-
-
-def elem_props_get_number(elem, elem_prop_id, default=None):
-    elem_prop = elem_props_find_first(elem, elem_prop_id)
-    if elem_prop is not None:
-        assert(elem_prop.props[0] == elem_prop_id)
-        if elem_prop.props[1] == b'double':
-            assert(elem_prop.props[1] == b'double')
-            assert(elem_prop.props[2] == b'Number')
-        else:
-            assert(elem_prop.props[1] == b'Number')
-            assert(elem_prop.props[2] == b'')
-            assert(elem_prop.props[3] in {b'A', b'A+', b'AU'})
-
-        # we could allow other number types
-        assert(elem_prop.props_type[4] == data_types.FLOAT64)
-
-        return elem_prop.props[4]
-    return default
-
-
-def elem_props_get_bool(elem, elem_prop_id, default=None):
-    elem_prop = elem_props_find_first(elem, elem_prop_id)
-    if elem_prop is not None:
-        assert(elem_prop.props[0] == elem_prop_id)
-        assert(elem_prop.props[1] == b'bool')
-        assert(elem_prop.props[2] == b'')
-        assert(elem_prop.props[3] == b'')
-
-        # we could allow other number types
-        assert(elem_prop.props_type[4] == data_types.INT32)
-        assert(elem_prop.props[4] in {0, 1})
-
-        return bool(elem_prop.props[4])
-    return default
-
-
-def elem_props_get_enum(elem, elem_prop_id, default=None):
-    elem_prop = elem_props_find_first(elem, elem_prop_id)
-    if elem_prop is not None:
-        assert(elem_prop.props[0] == elem_prop_id)
-        assert(elem_prop.props[1] == b'enum')
-        assert(elem_prop.props[2] == b'')
-        assert(elem_prop.props[3] == b'')
-
-        # we could allow other number types
-        assert(elem_prop.props_type[4] == data_types.INT32)
-
-        return elem_prop.props[4]
-    return default
+from .fbx_utils import (
+    tuple_deg_to_rad,
+    elem_find_first,
+    elem_find_first_string,
+    elem_split_name_class,
+    elem_uuid,
+    elem_prop_first,
+    elem_props_index,
+    elem_props_resolve,
+    elem_props_get_vector_3d,
+    elem_props_get_number,
+    elem_props_get_enum,
+    )
 
 
 # ----------------------------------------------------------------------------
@@ -215,87 +51,41 @@ def elem_props_get_enum(elem, elem_prop_id, default=None):
 # ------
 # Object
 
-def blen_read_object(fbx_tmpl, fbx_obj, object_data):
-    elem_name, elem_class = elem_split_name_class(fbx_obj)
-    elem_name_utf8 = elem_name.decode('utf-8')
-
-    const_vector_zero_3d = 0.0, 0.0, 0.0
-    const_vector_one_3d = 1.0, 1.0, 1.0
-
-    # Object data must be created already
-    obj = bpy.data.objects.new(name=elem_name_utf8, object_data=object_data)
-
-    fbx_props = (elem_find_first(fbx_obj, b'Properties70'),
-                 elem_find_first(fbx_tmpl, b'Properties70', fbx_elem_nil))
-    assert(fbx_props[0] is not None)
-
-    # ----
-    # Misc Attributes
-
-    obj.color[0:3] = elem_props_get_color_rgb(fbx_props, b'Color', (0.8, 0.8, 0.8))
-
-    # ----
-    # Transformation
-
-    # This is quite involved, 'fbxRNode.cpp' from openscenegraph used as a reference
-
-    loc = elem_props_get_vector_3d(fbx_props, b'Lcl Translation', const_vector_zero_3d)
-    rot = elem_props_get_vector_3d(fbx_props, b'Lcl Rotation', const_vector_zero_3d)
-    sca = elem_props_get_vector_3d(fbx_props, b'Lcl Scaling', const_vector_one_3d)
-
-    rot_ofs = elem_props_get_vector_3d(fbx_props, b'RotationOffset', const_vector_zero_3d)
-    rot_piv = elem_props_get_vector_3d(fbx_props, b'RotationPivot', const_vector_zero_3d)
-    sca_ofs = elem_props_get_vector_3d(fbx_props, b'ScalingOffset', const_vector_zero_3d)
-    sca_piv = elem_props_get_vector_3d(fbx_props, b'ScalingPivot', const_vector_zero_3d)
-
-    is_rot_act = elem_props_get_bool(fbx_props, b'RotationActive', False)
-
-    if is_rot_act:
-        pre_rot = elem_props_get_vector_3d(fbx_props, b'PreRotation', const_vector_zero_3d)
-        pst_rot = elem_props_get_vector_3d(fbx_props, b'PostRotation', const_vector_zero_3d)
-        rot_ord = {
-            0: 'XYZ',
-            1: 'XYZ',
-            2: 'XZY',
-            3: 'YZX',
-            4: 'YXZ',
-            5: 'ZXY',
-            6: 'ZYX',
-            }.get(elem_props_get_enum(fbx_props, b'RotationOrder', 0))
-    else:
-        pre_rot = const_vector_zero_3d
-        pst_rot = const_vector_zero_3d
-        rot_ord = 'XYZ'
+def blen_read_object_matrix(fbx_transform, obj_type):
+    """
+    Return the Blender matrix_basis of a FBX transform.
+    """
+    rot_ord = fbx_transform.rot_ord
 
     from mathutils import Matrix, Euler
     from math import pi
 
     # translation
-    lcl_translation = Matrix.Translation(loc)
+    lcl_translation = Matrix.Translation(fbx_transform.loc)
 
     # rotation
-    if obj.type == 'CAMERA':
+    if obj_type == 'CAMERA':
         rot_alt_mat = Matrix.Rotation(pi / -2.0, 4, 'Y')
-    elif obj.type == 'LAMP':
+    elif obj_type == 'LAMP':
         rot_alt_mat = Matrix.Rotation(pi / -2.0, 4, 'X')
     else:
         rot_alt_mat = Matrix()
 
     # rotation
-    lcl_rot = Euler(tuple_deg_to_rad(rot), rot_ord).to_matrix().to_4x4() * rot_alt_mat
-    pre_rot = Euler(tuple_deg_to_rad(pre_rot), rot_ord).to_matrix().to_4x4()
-    pst_rot = Euler(tuple_deg_to_rad(pst_rot), rot_ord).to_matrix().to_4x4()
+    lcl_rot = Euler(tuple_deg_to_rad(fbx_transform.rot), rot_ord).to_matrix().to_4x4() * rot_alt_mat
+    pre_rot = Euler(tuple_deg_to_rad(fbx_transform.pre_rot), rot_ord).to_matrix().to_4x4()
+    pst_rot = Euler(tuple_deg_to_rad(fbx_transform.pst_rot), rot_ord).to_matrix().to_4x4()
 
-    rot_ofs = Matrix.Translation(rot_ofs)
-    rot_piv = Matrix.Translation(rot_piv)
-    sca_ofs = Matrix.Translation(sca_ofs)
-    sca_piv = Matrix.Translation(sca_piv)
+    rot_ofs = Matrix.Translation(fbx_transform.rot_ofs)
+    rot_piv = Matrix.Translation(fbx_transform.rot_piv)
+    sca_ofs = Matrix.Translation(fbx_transform.sca_ofs)
+    sca_piv = Matrix.Translation(fbx_transform.sca_piv)
 
     # scale
     lcl_scale = Matrix()
-    lcl_scale[0][0], lcl_scale[1][1], lcl_scale[2][2] = sca
+    lcl_scale[0][0], lcl_scale[1][1], lcl_scale[2][2] = fbx_transform.sca
 
-    obj.matrix_basis = (
+    return (
         lcl_translation *
         rot_ofs *
         rot_piv *
@@ -309,421 +99,110 @@ def blen_read_object(fbx_tmpl, fbx_obj, object_data):
         sca_piv.inverted()
         )
 
-    return obj
-
-
-# ----
-# Mesh
-
-def blen_read_geom_layerinfo(fbx_layer):
-    return (
-        elem_find_first_string(fbx_layer, b'Name'),
-        elem_find_first_bytes(fbx_layer, b'MappingInformationType'),
-        elem_find_first_bytes(fbx_layer, b'ReferenceInformationType'),
-        )
-
-
-def blen_read_geom_array_mapped_vert(
-    mesh, blen_data, blend_attr,
-    fbx_layer_data, fbx_layer_index,
-    fbx_layer_mapping, fbx_layer_ref,
-    stride, item_size, descr,
-    ):
-    # TODO, generic mapping apply function
-    if fbx_layer_mapping == b'ByVertice':
-        if fbx_layer_ref == b'Direct':
-            assert(fbx_layer_index is None)
-            # TODO, more generic support for mapping types
-            for i, blen_data_item in enumerate(blen_data):
-                setattr(blen_data_item, blend_attr,
-                        fbx_layer_data[(i * stride): (i * stride) + item_size])
-            return True
-        else:
-            print("warning layer %r ref type unsupported: %r" % (descr, fbx_layer_ref))
-    else:
-        print("warning layer %r mapping type unsupported: %r" % (descr, fbx_layer_mapping))
-
-    return False
-
-
-def blen_read_geom_array_mapped_edge(
-    mesh, blen_data, blend_attr,
-    fbx_layer_data, fbx_layer_index,
-    fbx_layer_mapping, fbx_layer_ref,
-    stride, item_size, descr,
-    xform=None,
-    ):
-
-    if fbx_layer_mapping == b'ByEdge':
-        if fbx_layer_ref == b'Direct':
-            if stride == 1:
-                if xform is None:
-                    for i, blen_data_item in enumerate(blen_data):
-                        setattr(blen_data_item, blend_attr,
-                                fbx_layer_data[i])
-                else:
-                    for i, blen_data_item in enumerate(blen_data):
-                        setattr(blen_data_item, blend_attr,
-                                xform(fbx_layer_data[i]))
-            else:
-                if xform is None:
-                    for i, blen_data_item in enumerate(blen_data):
-                        setattr(blen_data_item, blend_attr,
-                                fbx_layer_data[(i * stride): (i * stride) + item_size])
-                else:
-                    for i, blen_data_item in enumerate(blen_data):
-                        setattr(blen_data_item, blend_attr,
-                                xform(fbx_layer_data[(i * stride): (i * stride) + item_size]))
-            return True
-        else:
-            print("warning layer %r ref type unsupported: %r" % (descr, fbx_layer_ref))
-    else:
-        print("warning layer %r mapping type unsupported: %r" % (descr, fbx_layer_mapping))
-
-    return False
-
-
-def blen_read_geom_array_mapped_polygon(
-    mesh, blen_data, blend_attr,
-    fbx_layer_data, fbx_layer_index,
-    fbx_layer_mapping, fbx_layer_ref,
-    stride, item_size, descr,
-    xform=None,
-    ):
-
-    if fbx_layer_mapping == b'ByPolygon':
-        if fbx_layer_ref == b'IndexToDirect':
-            if stride == 1:
-                for i, blen_data_item in enumerate(blen_data):
-                    setattr(blen_data_item, blend_attr,
-                            fbx_layer_data[i])
-            else:
-                for i, blen_data_item in enumerate(blen_data):
-                    setattr(blen_data_item, blend_attr,
-                            fbx_layer_data[(i * stride): (i * stride) + item_size])
-            return True
-        elif fbx_layer_ref == b'Direct':
-            # looks like direct may have different meanings!
-            assert(stride == 1)
-            if xform is None:
-                for i in range(len(fbx_layer_data)):
-                    setattr(blen_data[i], blend_attr, fbx_layer_data[i])
-            else:
-                for i in range(len(fbx_layer_data)):
-                    setattr(blen_data[i], blend_attr, xform(fbx_layer_data[i]))
-            return True
-        else:
-            print("warning layer %r ref type unsupported: %r" % (descr, fbx_layer_ref))
-    else:
-        print("warning layer %r mapping type unsupported: %r" % (descr, fbx_layer_mapping))
-
-    return False
-
-
-def blen_read_geom_array_mapped_polyloop(
-    mesh, blen_data, blend_attr,
-    fbx_layer_data, fbx_layer_index,
-    fbx_layer_mapping, fbx_layer_ref,
-    stride, item_size, descr,
-    ):
-
-    if fbx_layer_mapping == b'ByPolygonVertex':
-        if fbx_layer_ref == b'IndexToDirect':
-            assert(fbx_layer_index is not None)
-            for i, j in enumerate(fbx_layer_index):
-                if j != -1:
-                    setattr(blen_data[i], blend_attr,
-                            fbx_layer_data[(j * stride): (j * stride) + item_size])
-            return True
-        else:
-            print("warning layer %r ref type unsupported: %r" % (descr, fbx_layer_ref))
-    elif fbx_layer_mapping == b'ByVertice':
-        if fbx_layer_ref == b'Direct':
-            assert(fbx_layer_index is None)
-            loops = mesh.loops
-            polygons = mesh.polygons
-            for p in polygons:
-                for i in p.loop_indices:
-                    j = loops[i].vertex_index
-                    setattr(blen_data[i], blend_attr,
-                            fbx_layer_data[(j * stride): (j * stride) + item_size])
-        else:
-            print("warning layer %r ref type unsupported: %r" % (descr, fbx_layer_ref))
-    else:
-        print("warning layer %r mapping type unsupported: %r" % (descr, fbx_layer_mapping))
-
-    return False
-
-
-def blen_read_geom_layer_material(fbx_obj, mesh):
-    fbx_layer = elem_find_first(fbx_obj, b'LayerElementMaterial')
 
-    if fbx_layer is None:
-        return
-
-    (fbx_layer_name,
-     fbx_layer_mapping,
-     fbx_layer_ref,
-     ) = blen_read_geom_layerinfo(fbx_layer)
+def blen_read_object(fbx_obj_data, object_data):
+    # Object data must be created already
+    obj = bpy.data.objects.new(name=fbx_obj_data.name, object_data=object_data)
 
-    if fbx_layer_mapping == b'AllSame':
-        # only to quiet warning
-        return
+    # ----
+    # Misc Attributes
 
-    layer_id = b'Materials'
-    fbx_layer_data = elem_prop_first(elem_find_first(fbx_layer, layer_id))
+    obj.color[0:3] = fbx_obj_data.color
 
-    blen_data = mesh.polygons
-    blen_read_geom_array_mapped_polygon(
-        mesh, blen_data, "material_index",
-        fbx_layer_data, None,
-        fbx_layer_mapping, fbx_layer_ref,
-        1, 1, layer_id,
-        )
+    # ----
+    # Transformation
 
+    obj.matrix_basis = blen_read_object_matrix(fbx_obj_data.transform, obj.type)
 
-def blen_read_geom_layer_uv(fbx_obj, mesh):
-    for layer_id in (b'LayerElementUV',):
-        for fbx_layer in elem_find_iter(fbx_obj, layer_id):
-            # all should be valid
-            (fbx_layer_name,
-             fbx_layer_mapping,
-             fbx_layer_ref,
-             ) = blen_read_geom_layerinfo(fbx_layer)
+    return obj
 
-            fbx_layer_data = elem_prop_first(elem_find_first(fbx_layer, b'UV'))
-            fbx_layer_index = elem_prop_first(elem_find_first(fbx_layer, b'UVIndex'))
 
-            uv_tex = mesh.uv_textures.new(name=fbx_layer_name)
-            uv_lay = mesh.uv_layers[-1]
-            blen_data = uv_lay.data[:]
+# ----
+# Mesh
 
-            # some valid files omit this data
-            if fbx_layer_data is None:
-                print("%r %r missing data" % (layer_id, fbx_layer_name))
-                continue
+def blen_read_geom(fbx_mesh):
+    mesh = bpy.data.meshes.new(name=fbx_mesh.name)
+    mesh.vertices.add(len(fbx_mesh.vertices) // 3)
+    mesh.vertices.foreach_set("co", fbx_mesh.vertices)
 
-            blen_read_geom_array_mapped_polyloop(
-                mesh, blen_data, "uv",
-                fbx_layer_data, fbx_layer_index,
-                fbx_layer_mapping, fbx_layer_ref,
-                2, 2, layer_id,
-                )
+    if fbx_mesh.loops:
+        mesh.loops.add(len(fbx_mesh.loops))
+        mesh.loops.foreach_set("vertex_index", fbx_mesh.loops)
 
+        mesh.polygons.add(len(fbx_mesh.loop_start))
+        mesh.polygons.foreach_set("loop_start", fbx_mesh.loop_start)
+        mesh.polygons.foreach_set("loop_total", fbx_mesh.loop_total)
 
-def blen_read_geom_layer_color(fbx_obj, mesh):
-    # almost same as UV's
-    for layer_id in (b'LayerElementColor',):
-        for fbx_layer in elem_find_iter(fbx_obj, layer_id):
-            # all should be valid
-            (fbx_layer_name,
-             fbx_layer_mapping,
-             fbx_layer_ref,
-             ) = blen_read_geom_layerinfo(fbx_layer)
+        if fbx_mesh.material_index is not None:
+            mesh.polygons.foreach_set("material_index", fbx_mesh.material_index)
 
-            fbx_layer_data = elem_prop_first(elem_find_first(fbx_layer, b'Colors'))
-            fbx_layer_index = elem_prop_first(elem_find_first(fbx_layer, b'ColorIndex'))
+        for fbx_layer_name, fbx_layer_data in fbx_mesh.uv_layers:
+            mesh.uv_textures.new(name=fbx_layer_name)
+            if fbx_layer_data is not None:
+                mesh.uv_layers[-1].data.foreach_set("uv", fbx_layer_data)
 
+        for fbx_layer_name, fbx_layer_data in fbx_mesh.color_layers:
             color_lay = mesh.vertex_colors.new(name=fbx_layer_name)
-            blen_data = color_lay.data[:]
-
-            # some valid files omit this data
-            if fbx_layer_data is None:
-                print("%r %r missing data" % (layer_id, fbx_layer_name))
-                continue
-
-            # ignore alpha layer (read 4 items into 3)
-            blen_read_geom_array_mapped_polyloop(
-                mesh, blen_data, "color",
-                fbx_layer_data, fbx_layer_index,
-                fbx_layer_mapping, fbx_layer_ref,
-                4, 3, layer_id,
-                )
-
-def blen_read_geom_layer_smooth(fbx_obj, mesh):
-    fbx_layer = elem_find_first(fbx_obj, b'LayerElementSmoothing')
-
-    if fbx_layer is None:
-        return False
-
-    # all should be valid
-    (fbx_layer_name,
-     fbx_layer_mapping,
-     fbx_layer_ref,
-     ) = blen_read_geom_layerinfo(fbx_layer)
-
-    layer_id = b'Smoothing'
-    fbx_layer_data = elem_prop_first(elem_find_first(fbx_layer, layer_id))
-
-    # udk has 'Direct' mapped, with no Smoothing, not sure why, but ignore these
-    if fbx_layer_data is None:
-        return False
-
-    if fbx_layer_mapping == b'ByEdge':
-        # some models have bad edge data, we cant use this info...
-        if not mesh.edges:
-            return False
-
-        blen_data = mesh.edges
-        ok_smooth = blen_read_geom_array_mapped_edge(
-            mesh, blen_data, "use_edge_sharp",
-            fbx_layer_data, None,
-            fbx_layer_mapping, fbx_layer_ref,
-            1, 1, layer_id,
-            xform=lambda s: not s,
-            )
-        return ok_smooth
-    elif fbx_layer_mapping == b'ByPolygon':
-        blen_data = mesh.polygons
-        return blen_read_geom_array_mapped_polygon(
-            mesh, blen_data, "use_smooth",
-            fbx_layer_data, None,
-            fbx_layer_mapping, fbx_layer_ref,
-            1, 1, layer_id,
-            xform=lambda s: (s != 0),  # smoothgroup bitflags, treat as booleans for now
-            )
-    else:
-        print("warning layer %r mapping type unsupported: %r" % (fbx_layer.id, fbx_layer_mapping))
-        return False
-
-
-def blen_read_geom_layer_normal(fbx_obj, mesh):
-    fbx_layer = elem_find_first(fbx_obj, b'LayerElementNormal')
-
-    if fbx_layer is None:
-        return False
-
-    (fbx_layer_name,
-     fbx_layer_mapping,
-     fbx_layer_ref,
-     ) = blen_read_geom_layerinfo(fbx_layer)
-
-    layer_id = b'Normals'
-    fbx_layer_data = elem_prop_first(elem_find_first(fbx_layer, layer_id))
-
-    blen_data = mesh.vertices
-
-    return blen_read_geom_array_mapped_vert(
-        mesh, blen_data, "normal",
-        fbx_layer_data, None,
-        fbx_layer_mapping, fbx_layer_ref,
-        3, 3, layer_id,
-        )
-
-
-def blen_read_geom(fbx_tmpl, fbx_obj):
-    # TODO, use 'fbx_tmpl'
-    elem_name, elem_class = elem_split_name_class(fbx_obj)
-    assert(elem_class == b'Geometry')
-    elem_name_utf8 = elem_name.decode('utf-8')
-
-    fbx_verts = elem_prop_first(elem_find_first(fbx_obj, b'Vertices'))
-    fbx_polys = elem_prop_first(elem_find_first(fbx_obj, b'PolygonVertexIndex'))
-    fbx_edges = elem_prop_first(elem_find_first(fbx_obj, b'Edges'))
-
-    if fbx_verts is None:
-        fbx_verts = ()
-    if fbx_polys is None:
-        fbx_polys = ()
-
-    mesh = bpy.data.meshes.new(name=elem_name_utf8)
-    mesh.vertices.add(len(fbx_verts) // 3)
-    mesh.vertices.foreach_set("co", fbx_verts)
-
-    if fbx_polys:
-        mesh.loops.add(len(fbx_polys))
-        poly_loop_starts = []
-        poly_loop_totals = []
-        poly_loop_prev = 0
-        for i, l in enumerate(mesh.loops):
-            index = fbx_polys[i]
-            if index < 0:
-                poly_loop_starts.append(poly_loop_prev)
-                poly_loop_totals.append((i - poly_loop_prev) + 1)
-                poly_loop_prev = i + 1
-                index ^= -1
-            l.vertex_index = index
-
-        mesh.polygons.add(len(poly_loop_starts))
-        mesh.polygons.foreach_set("loop_start", poly_loop_starts)
-        mesh.polygons.foreach_set("loop_total", poly_loop_totals)
-
-        blen_read_geom_layer_material(fbx_obj, mesh)
-        blen_read_geom_layer_uv(fbx_obj, mesh)
-        blen_read_geom_layer_color(fbx_obj, mesh)
-
-    if fbx_edges:
-        # edges in fact index the polygons (NOT the vertices)
-        import array
-        tot_edges = len(fbx_edges)
-        edges_conv = array.array('i', [0]) * (tot_edges * 2)
-
-        edge_index = 0
-        for i in fbx_edges:
-            e_a = fbx_polys[i]
-            if e_a >= 0:
-                e_b = fbx_polys[i + 1]
-                if e_b < 0:
-                    e_b ^= -1
-            else:
-                # Last index of polygon, wrap back to the start.
-
-                # ideally we wouldn't have to search back,
-                # but it should only be 2-3 iterations.
-                j = i - 1
-                while j >= 0 and fbx_polys[j] >= 0:
-                    j -= 1
-                e_a ^= -1
-                e_b = fbx_polys[j + 1]
+            if fbx_layer_data is not None:
+                color_lay.data.foreach_set("color", fbx_layer_data)
 
-            edges_conv[edge_index] = e_a
-            edges_conv[edge_index + 1] = e_b
-            edge_index += 2
-
-        mesh.edges.add(tot_edges)
-        mesh.edges.foreach_set("vertices", edges_conv)
+    if fbx_mesh.edges:
+        mesh.edges.add(len(fbx_mesh.edges) // 2)
+        mesh.edges.foreach_set("vertices", fbx_mesh.edges)
 
     # must be after edge, face loading.
-    ok_smooth = blen_read_geom_layer_smooth(fbx_obj, mesh)
+    if fbx_mesh.edge_sharp is not None:
+        mesh.edges.foreach_set("use_edge_sharp", fbx_mesh.edge_sharp)
+    if fbx_mesh.poly_smooth is not None:
+        mesh.polygons.foreach_set("use_smooth", fbx_mesh.poly_smooth)
 
-    ok_normals = blen_read_geom_layer_normal(fbx_obj, mesh)
+    if fbx_mesh.vertex_normals is not None:
+        mesh.vertices.foreach_set("normal", fbx_mesh.vertex_normals)
 
     mesh.validate()
 
-    if not ok_normals:
+    if fbx_mesh.vertex_normals is None:
         mesh.calc_normals()
 
-    if not ok_smooth:
-        for p in mesh.polygons:
-            p.use_smooth = True
+    if fbx_mesh.edge_sharp is None and fbx_mesh.poly_smooth is None:
+        mesh.polygons.foreach_set("use_smooth", [True] * len(mesh.polygons))
 
     return mesh
 
 
-# --------
-# Material
+def blen_read_shape_keys(obj, fbx_shapes):
+    """
+    Add a shape key to obj for each (FBXShapeData, value) pair of fbx_shapes.
+    """
+    from . import import_fbx_prepare
+    import array
 
-def blen_read_material(fbx_tmpl, fbx_obj,
-                       cycles_material_wrap_map, use_cycles):
-    elem_name, elem_class = elem_split_name_class(fbx_obj)
-    assert(elem_class == b'Material')
-    elem_name_utf8 = elem_name.decode('utf-8')
+    mesh = obj.data
+    co_base = array.array('f', (0.0,)) * (len(mesh.vertices) * 3)
+    mesh.vertices.foreach_get("co", co_base)
 
-    ma = bpy.data.materials.new(name=elem_name_utf8)
+    if mesh.shape_keys is None:
+        obj.shape_key_add(name="Basis", from_mix=False)
 
-    const_color_white = 1.0, 1.0, 1.0
+    for fbx_shape, value in fbx_shapes:
+        key = obj.shape_key_add(name=fbx_shape.name, from_mix=False)
+        key.data.foreach_set("co", import_fbx_prepare.prepare_shape_co(co_base, fbx_shape))
+        key.value = value
+
+
+# --------
+# Material
 
-    fbx_props = (elem_find_first(fbx_obj, b'Properties70'),
-                 elem_find_first(fbx_tmpl, b'Properties70', fbx_elem_nil))
-    assert(fbx_props[0] is not None)
+def blen_read_material(fbx_material, cycles_material_wrap_map, use_cycles):
+    ma = bpy.data.materials.new(name=fbx_material.name)
 
-    ma_diff = elem_props_get_color_rgb(fbx_props, b'DiffuseColor', const_color_white)
-    ma_spec = elem_props_get_color_rgb(fbx_props, b'SpecularColor', const_color_white)
-    ma_alpha = elem_props_get_number(fbx_props, b'Opacity', 1.0)
-    ma_spec_intensity = ma.specular_intensity = elem_props_get_number(fbx_props, b'SpecularFactor', 0.25) * 2.0
-    ma_spec_hardness = elem_props_get_number(fbx_props, b'Shininess', 9.6)
-    ma_refl_factor = elem_props_get_number(fbx_props, b'ReflectionFactor', 0.0)
-    ma_refl_color = elem_props_get_color_rgb(fbx_props, b'ReflectionColor', const_color_white)
+    ma_diff = fbx_material.diffuse_color
+    ma_spec = fbx_material.specular_color
+    ma_alpha = fbx_material.alpha
+    ma_spec_intensity = ma.specular_intensity = fbx_material.specular_intensity
+    ma_spec_hardness = fbx_material.specular_hardness
+    ma_refl_factor = fbx_material.reflect_factor
+    ma_refl_color = fbx_material.reflect_color
 
     if use_cycles:
         from . import cycles_shader_compat
@@ -791,76 +270,174 @@ def blen_read_texture(fbx_tmpl, fbx_obj, basedir, image_cache,
     return image
 
 
-def blen_read_camera(fbx_tmpl, fbx_obj, global_scale):
-    # meters to inches
-    M2I = 0.0393700787
+def blen_read_camera(fbx_camera):
+    camera = bpy.data.cameras.new(name=fbx_camera.name)
 
-    elem_name, elem_class = elem_split_name_class_nodeattr(fbx_obj)
-    assert(elem_class == b'Camera')
-    elem_name_utf8 = elem_name.decode('utf-8')
-
-    fbx_props = (elem_find_first(fbx_obj, b'Properties70'),
-                 elem_find_first(fbx_tmpl, b'Properties70', fbx_elem_nil))
-    assert(fbx_props[0] is not None)
-
-    camera = bpy.data.cameras.new(name=elem_name_utf8)
-
-    camera.lens = elem_props_get_number(fbx_props, b'FocalLength', 35.0)
-    camera.sensor_width = elem_props_get_number(fbx_props, b'FilmWidth', 32.0 * M2I) / M2I
-    camera.sensor_height = elem_props_get_number(fbx_props, b'FilmHeight', 32.0 * M2I) / M2I
+    camera.lens = fbx_camera.lens
+    camera.sensor_width = fbx_camera.sensor_width
+    camera.sensor_height = fbx_camera.sensor_height
 
-    filmaspect = camera.sensor_width / camera.sensor_height
-    # film offset
-    camera.shift_x = elem_props_get_number(fbx_props, b'FilmOffsetX', 0.0) / (M2I * camera.sensor_width)
-    camera.shift_y = elem_props_get_number(fbx_props, b'FilmOffsetY', 0.0) / (M2I * camera.sensor_height * filmaspect)
+    camera.shift_x = fbx_camera.shift_x
+    camera.shift_y = fbx_camera.shift_y
 
-    camera.clip_start = elem_props_get_number(fbx_props, b'NearPlane', 0.01) * global_scale
-    camera.clip_end = elem_props_get_number(fbx_props, b'FarPlane', 100.0) * global_scale
+    camera.clip_start = fbx_camera.clip_start
+    camera.clip_end = fbx_camera.clip_end
 
     return camera
 
 
-def blen_read_light(fbx_tmpl, fbx_obj, global_scale):
-    import math
-    elem_name, elem_class = elem_split_name_class_nodeattr(fbx_obj)
-    assert(elem_class == b'Light')
-    elem_name_utf8 = elem_name.decode('utf-8')
+def blen_read_light(fbx_light):
+    lamp = bpy.data.lamps.new(name=fbx_light.name, type=fbx_light.type)
 
-    fbx_props = (elem_find_first(fbx_obj, b'Properties70'),
-                 elem_find_first(fbx_tmpl, b'Properties70', fbx_elem_nil))
-    # rare
-    if fbx_props[0] is None:
-        lamp = bpy.data.lamps.new(name=elem_name_utf8, type='POINT')
+    # rare, no properties
+    if fbx_light.color is None:
         return lamp
 
-    light_type = {
-        0: 'POINT',
-        1: 'SUN',
-        2: 'SPOT'}.get(elem_props_get_enum(fbx_props, b'LightType', 0), 'POINT')
+    if fbx_light.type == 'SPOT':
+        lamp.spot_size = fbx_light.spot_size
+        lamp.spot_blend = fbx_light.spot_blend
 
-    lamp = bpy.data.lamps.new(name=elem_name_utf8, type=light_type)
+    # TODO, cycles
+    lamp.color = fbx_light.color
+    lamp.energy = fbx_light.energy
+    lamp.distance = fbx_light.distance
+    lamp.shadow_method = ('RAY_SHADOW' if fbx_light.use_shadow else 'NOSHADOW')
+    lamp.shadow_color = fbx_light.shadow_color
 
-    if light_type == 'SPOT':
-        spot_size = elem_props_get_number(fbx_props, b'OuterAngle', None)
-        if spot_size is None:
-            # Deprecated.
-            spot_size = elem_props_get_number(fbx_props, b'Cone angle', 45.0)
-        lamp.spot_size = math.radians(spot_size)
+    return lamp
 
-        spot_blend = elem_props_get_number(fbx_props, b'InnerAngle', None)
-        if spot_blend is None:
-            # Deprecated.
-            spot_blend = elem_props_get_number(fbx_props, b'HotSpot', 45.0)
-        lamp.spot_blend = 1.0 - (spot_blend / spot_size)
 
-    # TODO, cycles
-    lamp.color = elem_props_get_color_rgb(fbx_props, b'Color', (1.0, 1.0, 1.0))
-    lamp.energy = elem_props_get_number(fbx_props, b'Intensity', 100.0) / 100.0
-    lamp.distance = elem_props_get_number(fbx_props, b'DecayStart', 25.0) * global_scale
-    lamp.shadow_method = ('RAY_SHADOW' if elem_props_get_bool(fbx_props, b'CastShadow', True) else 'NOSHADOW')
-    lamp.shadow_color = elem_props_get_color_rgb(fbx_props, b'ShadowColor', (0.0, 0.0, 0.0))
+# ---------
+# Animation
+
+# FBX animated property -> Blender data path.
+FBX_ANIM_PROPS = {
+    b'Lcl Translation': "location",
+    b'Lcl Rotation': "rotation_euler",
+    b'Lcl Scaling': "scale",
+    }
+
+# AnimationCurve connection property -> array index.
+FBX_ANIM_CHANNELS = {
+    b'd|X': 0,
+    b'd|Y': 1,
+    b'd|Z': 2,
+    }
+
+
+def blen_read_animation_curve(action, data_path, index, frames, values, interpolation=None,
+                              group="Object Transforms"):
+    from . import import_fbx_prepare
+
+    fcurve = action.fcurves.new(data_path, index, group)
+    keyframe_points = fcurve.keyframe_points
+    keyframe_points.add(len(frames))
+    keyframe_points.foreach_set("co", import_fbx_prepare.prepare_anim_keyframes_co(frames, values))
+    if interpolation is not None:
+        keyframe_points.foreach_set("interpolation", interpolation)
+    # sort keys and compute handles
+    fcurve.update()
+    return fcurve
+
+
+def blen_read_animation_action(obj):
+    """
+    Return the action of obj, created on first use (bones share the action of their armature).
+    """
+    anim_data = obj.animation_data
+    if anim_data is None:
+        anim_data = obj.animation_data_create()
+    if anim_data.action is None:
+        anim_data.action = bpy.data.actions.new(name=obj.name)
+    return anim_data.action
+
+
+def blen_read_animation_transforms(action, data_path_prefix, group, rot_ord, frames, matrices):
+    """
+    Add location, rotation_euler and scale curves to action, keyed at frames from the matching matrices.
+    """
+    import array
+
+    tot_frames = len(frames)
+    values = [array.array('f', (0.0,)) * tot_frames for i in range(9)]
+
+    euler_prev = None
+    for j, mat in enumerate(matrices):
+        loc, quat, sca = mat.decompose()
+        # keep eulers compatible with the previous sample, to avoid flipping.
+        euler = quat.to_euler(rot_ord) if euler_prev is None else quat.to_euler(rot_ord, euler_prev)
+        euler_prev = euler
+        for i, value in enumerate(tuple(loc) + tuple(euler) + tuple(sca)):
+            values[i][j] = value
+
+    for i, data_path in enumerate(("location", "rotation_euler", "scale")):
+        for index in range(3):
+            blen_read_animation_curve(action, data_path_prefix + data_path, index, frames, values[i * 3 + index],
+                                      group=group)
+
+
+def blen_read_animation(obj, fbx_transform, fbx_curves, global_matrix):
+    """
+    Create the action of obj, fbx_curves is a dict ((FBX property, index) -> FBXCurveData).
+    global_matrix is applied to all keys, None for child objects.
+    """
+    from . import import_fbx_prepare
+    from math import pi
 
-    return lamp
+    action = blen_read_animation_action(obj)
+    obj.rotation_mode = fbx_transform.rot_ord
+
+    is_direct = (global_matrix is None and
+                 obj.type not in {'CAMERA', 'LAMP'} and
+                 not any(any(vec) for vec in (fbx_transform.rot_ofs, fbx_transform.rot_piv,
+                                              fbx_transform.sca_ofs, fbx_transform.sca_piv,
+                                              fbx_transform.pre_rot, fbx_transform.pst_rot)))
+
+    if is_direct:
+        # FBX properties map to Blender ones, keys are copied as is.
+        for (fbx_prop, index), fbx_curve in sorted(fbx_curves.items()):
+            values = fbx_curve.values
+            if fbx_prop == b'Lcl Rotation':
+                values = values * (pi / 180.0)
+            blen_read_animation_curve(action, FBX_ANIM_PROPS[fbx_prop], index,
+                                      fbx_curve.frames, values, fbx_curve.interpolation)
+        return
+
+    # Pivots, pre/post rotations and the global matrix don't map to Blender channels,
+    # all channels are sampled at every key, and each sample converted to a Blender transform.
+    frames = import_fbx_prepare.prepare_anim_frames(fbx_curves.values())
+    matrices = (blen_read_object_matrix(fbx_transform._replace(loc=sample[0:3], rot=sample[3:6], sca=sample[6:9]),
+                                        obj.type)
+                for sample in import_fbx_prepare.prepare_anim_samples(fbx_transform, fbx_curves, frames))
+    if global_matrix is not None:
+        matrices = (global_matrix * mat for mat in matrices)
+    blen_read_animation_transforms(action, "", "Object Transforms", fbx_transform.rot_ord, frames, matrices)
+
+
+def blen_read_animation_bone(arm_obj, bone_name, fbx_transform, fbx_curves):
+    """
+    Add the curves of the pose bone bone_name to the action of arm_obj, fbx_curves is a dict
+    ((FBX property, index) -> FBXCurveData) of the bone Model, whose transform is relative to its parent bone.
+    """
+    from . import import_fbx_prepare
+
+    # Pose transforms are relative to the rest pose of the bone (itself relative to its parent one).
+    bone = arm_obj.data.bones[bone_name]
+    matrix_rest = bone.matrix_local
+    if bone.parent is not None:
+        matrix_rest = bone.parent.matrix_local.inverted() * matrix_rest
+    matrix_rest_inv = matrix_rest.inverted()
+
+    action = blen_read_animation_action(arm_obj)
+    arm_obj.pose.bones[bone_name].rotation_mode = fbx_transform.rot_ord
+
+    frames = import_fbx_prepare.prepare_anim_frames(fbx_curves.values())
+    matrices = (matrix_rest_inv *
+                blen_read_object_matrix(fbx_transform._replace(loc=sample[0:3], rot=sample[3:6], sca=sample[6:9]),
+                                        None)
+                for sample in import_fbx_prepare.prepare_anim_samples(fbx_transform, fbx_curves, frames))
+    data_path_prefix = 'pose.bones["%s"].' % bone_name.replace('\\', '\\\\').replace('"', '\\"')
+    blen_read_animation_transforms(action, data_path_prefix, bone_name, fbx_transform.rot_ord, frames, matrices)
 
 
 def is_ascii(filepath, size):
@@ -879,15 +456,23 @@ def load(operator, context, filepath="",
          use_cycles=True,
          use_image_search=False,
          use_alpha_decals=False,
-         decal_offset=0.0):
-
-    global fbx_elem_nil
-    fbx_elem_nil = FBXElem('', (), (), ())
+         decal_offset=0.0,
+         use_mesh_dedup=False,
+         object_names=(),
+         object_types=None,
+         object_uids=(),
+         use_profile=False,
+         use_profile_memory=False,
+         profile_filepath=""):
 
     global_scale = (sum(global_matrix.to_scale()) / 3.0) if global_matrix else 1.0
 
     import os
     from . import parse_fbx
+    from . import import_fbx_prepare
+    from .fbx_profile import Profiler
+
+    fbx_profile = Profiler(use_memory=use_profile and use_profile_memory)
 
     # detect ascii files
     if is_ascii(filepath, 24):
@@ -895,7 +480,10 @@ def load(operator, context, filepath="",
         return {'CANCELLED'}
 
     try:
-        elem_root, version = parse_fbx.parse(filepath)
+        # Arrays are only decompressed when read (see elem_prop_first_array),
+        # so objects skipped by filters cost no more than reading the file.
+        with fbx_profile.phase("parse"):
+            elem_root, version = parse_fbx.parse(filepath, use_raw_arrays=True)
     except:
         import traceback
         traceback.print_exc()
@@ -923,6 +511,10 @@ def load(operator, context, filepath="",
 
     # Tables: (FBX_byte_id -> [FBX_data, None or Blender_datablock])
     fbx_table_nodes = {}
+    # Same items, bucketed by (element id, subclass), eg: (b'Geometry', b'Mesh'),
+    # and by element id only, so each phase only iterates the nodes it handles (see fbx_table_nodes_iter).
+    fbx_table_nodes_by_type = {}
+    fbx_table_nodes_by_id = {}
 
     if use_alpha_decals:
         material_decals = set()
@@ -948,6 +540,7 @@ def load(operator, context, filepath="",
     # Key is a tuple, (ObjectType, FBXNodeType)
     # eg, (b'Texture', b'KFbxFileTexture')
     #     (b'Geometry', b'KFbxMesh')
+    # Values are dicts (property name -> P element), merged under objects properties by fbx_props_get.
     fbx_templates = {}
 
     def _():
@@ -960,52 +553,166 @@ def load(operator, context, filepath="",
                             assert(fbx_subdef.props_type == b'S')
                             # (b'Texture', b'KFbxFileTexture') - eg.
                             key = fbx_def.props[0], fbx_subdef.props[0]
-                            fbx_templates[key] = fbx_subdef
-    _(); del _
+                            fbx_templates[key] = elem_props_index(elem_find_first(fbx_subdef, b'Properties70'))
+        return len(fbx_templates)
+    fbx_profile.run("templates", _); del _
 
     def fbx_template_get(key):
-        return fbx_templates.get(key, fbx_elem_nil)
+        # Missing templates are stored too, so each key always gets the same dict (see fbx_props_get).
+        return fbx_templates.setdefault(key, {})
+
+    # (id(fbx_obj), id(fbx_tmpl)) -> resolved properties, see fbx_props_get.
+    # Both are kept alive by the parsed file and fbx_templates until the import is done, so ids are never reused.
+    fbx_props_cache = {}
+
+    def fbx_props_get(fbx_obj, fbx_tmpl):
+        """
+        Return the properties of fbx_obj merged over its template ones (a dict, see elem_props_resolve),
+        or None when it has no Properties70. Resolved once per object, for the duration of the import.
+        """
+        key = id(fbx_obj), id(fbx_tmpl)
+        fbx_props = fbx_props_cache.get(key)
+        if fbx_props is None:
+            fbx_props_elem = elem_find_first(fbx_obj, b'Properties70')
+            if fbx_props_elem is None:
+                return None
+            fbx_props = fbx_props_cache[key] = elem_props_resolve(fbx_props_elem, fbx_tmpl)
+        return fbx_props
 
     # ----
     # Build FBX node-table
     def _():
+        # Filtered import: only the selected Models and the objects they depend on are added to the node-table,
+        # everything else is skipped by all following phases.
+        use_filter = (object_names or object_uids or
+                      (object_types is not None and
+                       not object_types.issuperset(import_fbx_prepare.FBX_MODEL_OBJECT_TYPES.values())))
+        if use_filter:
+            fbx_uuids_filter = import_fbx_prepare.prepare_filter(fbx_nodes, fbx_connections,
+                                                                 object_names, object_types, object_uids)
+        else:
+            fbx_uuids_filter = None
+
         for fbx_obj in fbx_nodes.elems:
             # TODO, investigate what other items after first 3 may be
             assert(fbx_obj.props_type[:3] == b'LSS')
             fbx_uuid = elem_uuid(fbx_obj)
-            fbx_table_nodes[fbx_uuid] = [fbx_obj, None]
-    _(); del _
+            if fbx_uuids_filter is not None and fbx_uuid not in fbx_uuids_filter:
+                continue
+            fbx_item = fbx_table_nodes[fbx_uuid] = [fbx_obj, None]
+            fbx_table_nodes_by_type.setdefault((fbx_obj.id, fbx_obj.props[-1]), []).append((fbx_uuid, fbx_item))
+            fbx_table_nodes_by_id.setdefault(fbx_obj.id, []).append((fbx_uuid, fbx_item))
+        return len(fbx_table_nodes)
+    fbx_profile.run("node table", _); del _
+
+    def fbx_table_nodes_iter(fbx_id, fbx_subclass=None):
+        """
+        Return the (FBX_byte_id, item) pairs of fbx_table_nodes of this element id (and subclass), in file order.
+        """
+        if fbx_subclass is None:
+            return fbx_table_nodes_by_id.get(fbx_id, ())
+        return fbx_table_nodes_by_type.get((fbx_id, fbx_subclass), ())
 
     # ----
     # Load in the data
     # http://download.autodesk.com/us/fbx/20112/FBX_SDK_HELP/index.html?url=WS73099cc142f487551fea285e1221e4f9ff8-7fda.htm,topicNumber=d0e6388
 
-    fbx_connection_map = {}
-    fbx_connection_map_reverse = {}
+    # Connections are compiled once into adjacency lists of fbx_table_nodes items,
+    # partitioned by the element id of the connected node and by link type (None matching any):
+    # (FBX_byte_id, element id, link type) -> [(item, FBX_link), ...]
+    # eg: (model_uuid, b'Material', None) for materials connected to a model.
+    fbx_connection_map = {}  # source -> destinations
+    fbx_connection_map_reverse = {}  # destination -> sources
 
     def _():
+        def connection_add(dct, fbx_uuid, c_item, fbx_link):
+            c_id = c_item[0].id
+            c_type = fbx_link.props[0]
+            for key in ((fbx_uuid, None, None), (fbx_uuid, c_id, None),
+                        (fbx_uuid, None, c_type), (fbx_uuid, c_id, c_type)):
+                dct.setdefault(key, []).append((c_item, fbx_link))
+
         for fbx_link in fbx_connections.elems:
             # print(fbx_link)
-            c_type = fbx_link.props[0]
             if fbx_link.props_type[1:3] == b'LL':
                 c_src, c_dst = fbx_link.props[1:3]
-                fbx_connection_map.setdefault(c_src, []).append((c_dst, fbx_link))
-                fbx_connection_map_reverse.setdefault(c_dst, []).append((c_src, fbx_link))
-    _(); del _
+                # 0 is used for the root node, which isnt in fbx_table_nodes
+                c_item_src = fbx_table_nodes.get(c_src)
+                c_item_dst = fbx_table_nodes.get(c_dst)
+                if c_item_dst is not None:
+                    connection_add(fbx_connection_map, c_src, c_item_dst, fbx_link)
+                if c_item_src is not None:
+                    connection_add(fbx_connection_map_reverse, c_dst, c_item_src, fbx_link)
+        return len(fbx_connections.elems)
+    fbx_profile.run("connections", _); del _
+
+    # ----
+    # Connections
+    def connection_filter_ex(fbx_uuid, fbx_id, dct, c_type=None):
+        # Blender data is read from the items when iterating, it may have been created since the link was indexed.
+        return ((c_item[0], c_item[1], fbx_link)
+                for c_item, fbx_link in dct.get((fbx_uuid, fbx_id, c_type), ()))
+
+    def connection_filter_forward(fbx_uuid, fbx_id, c_type=None):
+        return connection_filter_ex(fbx_uuid, fbx_id, fbx_connection_map, c_type)
+
+    def connection_filter_reverse(fbx_uuid, fbx_id, c_type=None):
+        return connection_filter_ex(fbx_uuid, fbx_id, fbx_connection_map_reverse, c_type)
 
     # ----
     # Load mesh data
+
+    # Geometry using the mesh of an identical one (see use_mesh_dedup).
+    fbx_uuids_geom_shared = set()
+
     def _():
         fbx_tmpl = fbx_template_get((b'Geometry', b'KFbxMesh'))
 
-        for fbx_uuid, fbx_item in fbx_table_nodes.items():
+        fbx_items = fbx_table_nodes_iter(b'Geometry', b'Mesh')
+
+        if use_mesh_dedup:
+            # Identical geometry (whose models also use the same materials) is only created once,
+            # comparing digests of the stored arrays, so duplicates are never decompressed.
+            fbx_items_unique = []
+            fbx_items_shared = []
+            fbx_geom_keys = {}
+            for fbx_uuid, fbx_item in fbx_items:
+                fbx_material_uuids = []
+                for (fbx_lnk,
+                     fbx_lnk_item,
+                     fbx_lnk_type) in connection_filter_forward(fbx_uuid, b'Model'):
+                    fbx_material_uuids.extend(
+                            elem_uuid(fbx_lnk_material) for (fbx_lnk_material,
+                                                             material,
+                                                             fbx_lnk_material_type)
+                            in connection_filter_reverse(elem_uuid(fbx_lnk), b'Material'))
+                if any(connection_filter_reverse(fbx_uuid, b'Deformer')):
+                    # skinned meshes get their own vertex groups.
+                    key = fbx_uuid
+                else:
+                    key = import_fbx_prepare.prepare_geom_digest(fbx_item[0]), tuple(fbx_material_uuids)
+                fbx_item_unique = fbx_geom_keys.setdefault(key, fbx_item)
+                if fbx_item_unique is fbx_item:
+                    fbx_items_unique.append((fbx_uuid, fbx_item))
+                else:
+                    fbx_items_shared.append((fbx_item, fbx_item_unique))
+                    fbx_uuids_geom_shared.add(fbx_uuid)
+            fbx_items = fbx_items_unique
+        else:
+            fbx_items_shared = ()
+
+        # bpy-free stage for all meshes first, then only bulk Blender calls.
+        fbx_meshes = [import_fbx_prepare.prepare_geom(fbx_tmpl, fbx_item[0]) for fbx_uuid, fbx_item in fbx_items]
+
+        for (fbx_uuid, fbx_item), fbx_mesh in zip(fbx_items, fbx_meshes):
             fbx_obj, blen_data = fbx_item
-            if fbx_obj.id != b'Geometry':
-                continue
-            if fbx_obj.props[-1] == b'Mesh':
-                assert(blen_data is None)
-                fbx_item[1] = blen_read_geom(fbx_tmpl, fbx_obj)
-    _(); del _
+            assert(blen_data is None)
+            fbx_item[1] = blen_read_geom(fbx_mesh)
+
+        for fbx_item, fbx_item_unique in fbx_items_shared:
+            fbx_item[1] = fbx_item_unique[1]
+        return len(fbx_meshes)
+    fbx_profile.run("meshes", _); del _
 
     # ----
     # Load material data
@@ -1013,93 +720,82 @@ def load(operator, context, filepath="",
         fbx_tmpl = fbx_template_get((b'Material', b'KFbxSurfacePhong'))
         # b'KFbxSurfaceLambert'
 
-        for fbx_uuid, fbx_item in fbx_table_nodes.items():
+        for fbx_uuid, fbx_item in fbx_table_nodes_iter(b'Material'):
             fbx_obj, blen_data = fbx_item
-            if fbx_obj.id != b'Material':
-                continue
             assert(blen_data is None)
-            fbx_item[1] = blen_read_material(fbx_tmpl, fbx_obj,
+            fbx_props = fbx_props_get(fbx_obj, fbx_tmpl)
+            assert(fbx_props is not None)
+            fbx_item[1] = blen_read_material(import_fbx_prepare.prepare_material(fbx_obj, fbx_props),
                                              cycles_material_wrap_map, use_cycles)
-    _(); del _
+        return len(fbx_table_nodes_iter(b'Material'))
+    fbx_profile.run("materials", _); del _
 
     # ----
     # Load image data
     def _():
         fbx_tmpl = fbx_template_get((b'Texture', b'KFbxFileTexture'))
 
-        for fbx_uuid, fbx_item in fbx_table_nodes.items():
+        for fbx_uuid, fbx_item in fbx_table_nodes_iter(b'Texture'):
             fbx_obj, blen_data = fbx_item
-            if fbx_obj.id != b'Texture':
-                continue
             fbx_item[1] = blen_read_texture(fbx_tmpl, fbx_obj, basedir, image_cache,
                                             use_image_search)
-    _(); del _
+        return len(fbx_table_nodes_iter(b'Texture'))
+    fbx_profile.run("textures", _); del _
 
     # ----
     # Load camera data
     def _():
         fbx_tmpl = fbx_template_get((b'NodeAttribute', b'KFbxCamera'))
 
-        for fbx_uuid, fbx_item in fbx_table_nodes.items():
+        for fbx_uuid, fbx_item in fbx_table_nodes_iter(b'NodeAttribute', b'Camera'):
             fbx_obj, blen_data = fbx_item
-            if fbx_obj.id != b'NodeAttribute':
-                continue
-            if fbx_obj.props[-1] == b'Camera':
-                assert(blen_data is None)
-                fbx_item[1] = blen_read_camera(fbx_tmpl, fbx_obj, global_scale)
-    _(); del _
+            assert(blen_data is None)
+            fbx_props = fbx_props_get(fbx_obj, fbx_tmpl)
+            assert(fbx_props is not None)
+            fbx_item[1] = blen_read_camera(import_fbx_prepare.prepare_camera(fbx_obj, fbx_props, global_scale))
+        return len(fbx_table_nodes_iter(b'NodeAttribute', b'Camera'))
+    fbx_profile.run("cameras", _); del _
 
     # ----
     # Load lamp data
     def _():
         fbx_tmpl = fbx_template_get((b'NodeAttribute', b'KFbxLight'))
 
-        for fbx_uuid, fbx_item in fbx_table_nodes.items():
+        for fbx_uuid, fbx_item in fbx_table_nodes_iter(b'NodeAttribute', b'Light'):
             fbx_obj, blen_data = fbx_item
-            if fbx_obj.id != b'NodeAttribute':
-                continue
-            if fbx_obj.props[-1] == b'Light':
-                assert(blen_data is None)
-                fbx_item[1] = blen_read_light(fbx_tmpl, fbx_obj, global_scale)
-    _(); del _
-
-    # ----
-    # Connections
-    def connection_filter_ex(fbx_uuid, fbx_id, dct):
-        return [(c_found[0], c_found[1], c_type)
-                for (c_uuid, c_type) in dct.get(fbx_uuid, ())
-                # 0 is used for the root node, which isnt in fbx_table_nodes
-                for c_found in (() if c_uuid is 0 else (fbx_table_nodes[c_uuid],))
-                if (fbx_id is None) or (c_found[0].id == fbx_id)]
-
-    def connection_filter_forward(fbx_uuid, fbx_id):
-        return connection_filter_ex(fbx_uuid, fbx_id, fbx_connection_map)
-
-    def connection_filter_reverse(fbx_uuid, fbx_id):
-        return connection_filter_ex(fbx_uuid, fbx_id, fbx_connection_map_reverse)
+            assert(blen_data is None)
+            fbx_item[1] = blen_read_light(import_fbx_prepare.prepare_light(fbx_obj, fbx_props_get(fbx_obj, fbx_tmpl),
+                                                                           global_scale))
+        return len(fbx_table_nodes_iter(b'NodeAttribute', b'Light'))
+    fbx_profile.run("lights", _); del _
 
     def _():
         fbx_tmpl = fbx_template_get((b'Model', b'KFbxNode'))
 
         # Link objects, keep first, this also creates objects
         objects = []
-        for fbx_uuid, fbx_item in fbx_table_nodes.items():
+        for fbx_uuid, fbx_item in fbx_table_nodes_iter(b'Model'):
             fbx_obj, blen_data = fbx_item
-            if fbx_obj.id != b'Model':
-                continue
 
             # Create empty object or search for object data
             if fbx_obj.props[2] == b'Null':
                 fbx_lnk_item = None
                 ok = True
+            elif fbx_obj.props[2] == b'LimbNode':
+                # Skeletons become armatures, created for their root bone (other bones are added to it later).
+                fbx_lnk_item = None
+                ok = not any(fbx_lnk.props[2] == b'LimbNode'
+                             for (fbx_lnk,
+                                  fbx_lnk_item,
+                                  fbx_lnk_type) in connection_filter_forward(fbx_uuid, b'Model'))
+                if ok:
+                    fbx_lnk_item = bpy.data.armatures.new(name=elem_split_name_class(fbx_obj)[0].decode('utf-8'))
             else:
                 ok = False
                 for (fbx_lnk,
                      fbx_lnk_item,
-                     fbx_lnk_type) in connection_filter_reverse(fbx_uuid, None):
+                     fbx_lnk_type) in connection_filter_reverse(fbx_uuid, None, b'OO'):
 
-                    if fbx_lnk_type.props[0] != b'OO':
-                        continue
                     if not isinstance(fbx_lnk_item, bpy.types.ID):
                         continue
                     if isinstance(fbx_lnk_item, (bpy.types.Material, bpy.types.Image)):
@@ -1112,7 +808,9 @@ def load(operator, context, filepath="",
             if ok:
                 # print(fbx_lnk_type)
                 # create when linking since we need object data
-                obj = blen_read_object(fbx_tmpl, fbx_obj, fbx_lnk_item)
+                fbx_props = fbx_props_get(fbx_obj, fbx_tmpl)
+                assert(fbx_props is not None)
+                obj = blen_read_object(import_fbx_prepare.prepare_object(fbx_obj, fbx_props), fbx_lnk_item)
                 assert(fbx_item[1] is None)
                 fbx_item[1] = obj
 
@@ -1122,14 +820,14 @@ def load(operator, context, filepath="",
 
                 objects.append(obj)
 
-    _(); del _
+        return len(objects)
+    fbx_profile.run("objects", _); del _
 
     def _():
         # Parent objects, after we created them...
-        for fbx_uuid, fbx_item in fbx_table_nodes.items():
+        count = 0
+        for fbx_uuid, fbx_item in fbx_table_nodes_iter(b'Model'):
             fbx_obj, blen_data = fbx_item
-            if fbx_obj.id != b'Model':
-                continue
             if fbx_item[1] is None:
                 continue  # no object loaded.. ignore
 
@@ -1138,34 +836,320 @@ def load(operator, context, filepath="",
                  fbx_lnk_type) in connection_filter_forward(fbx_uuid, b'Model'):
 
                 fbx_item[1].parent = fbx_lnk_item
-    _(); del _
+                count += 1
+        return count
+    fbx_profile.run("parenting", _); del _
 
     def _():
+        count = 0
         if global_matrix is not None:
             # Apply global matrix last (after parenting)
-            for fbx_uuid, fbx_item in fbx_table_nodes.items():
+            for fbx_uuid, fbx_item in fbx_table_nodes_iter(b'Model'):
                 fbx_obj, blen_data = fbx_item
-                if fbx_obj.id != b'Model':
-                    continue
                 if fbx_item[1] is None:
                     continue  # no object loaded.. ignore
 
                 if fbx_item[1].parent is None:
                     fbx_item[1].matrix_basis = global_matrix * fbx_item[1].matrix_basis
-    _(); del _
+                    count += 1
+        return count
+    fbx_profile.run("global matrix", _); del _
+
+    # ----
+    # Build armatures
+    # Bones of skeletons (LimbNode Models) are added to the armature object of their root bone.
+    # FBX_byte_id of bone Models -> (armature object, bone name)
+    fbx_bones = {}
+
+    def _():
+        from mathutils import Matrix
+
+        fbx_tmpl = fbx_template_get((b'Model', b'KFbxNode'))
+
+        def model_matrix_local(fbx_obj):
+            fbx_props = fbx_props_get(fbx_obj, fbx_tmpl)
+            assert(fbx_props is not None)
+            return blen_read_object_matrix(import_fbx_prepare.prepare_object(fbx_obj, fbx_props).transform, None)
+
+        # Pose elements aren't connected to anything, they are read from all nodes.
+        fbx_bind_pose = import_fbx_prepare.prepare_bind_pose(fbx_nodes)
+
+        def bone_matrix_bind(fbx_uuid):
+            # The cluster 'TransformLink' is the global matrix of its bone when the mesh was bound,
+            # bones without cluster (eg: end bones) may still be in a BindPose.
+            for (fbx_lnk,
+                 fbx_lnk_item,
+                 fbx_lnk_type) in connection_filter_forward(fbx_uuid, b'Deformer'):
+                if fbx_lnk.props[2] == b'Cluster':
+                    matrix = import_fbx_prepare.prepare_matrix(elem_find_first(fbx_lnk, b'TransformLink'))
+                    if matrix is not None:
+                        return Matrix(matrix)
+            matrix = fbx_bind_pose.get(fbx_uuid)
+            return None if matrix is None else Matrix(matrix)
+
+        def bone_children(fbx_uuid):
+            return [(elem_uuid(fbx_lnk), fbx_lnk)
+                    for (fbx_lnk,
+                         fbx_lnk_item,
+                         fbx_lnk_type) in connection_filter_reverse(fbx_uuid, b'Model')
+                    if fbx_lnk.props[2] == b'LimbNode']
+
+        count = 0
+        for fbx_uuid, fbx_item in fbx_table_nodes_iter(b'Model', b'LimbNode'):
+            arm_obj = fbx_item[1]
+            if arm_obj is None:
+                continue  # not a root bone
+
+            # (extended while iterating, so parents always come before their children)
+            bones = [(fbx_uuid, fbx_item[0], None)]
+            for fbx_bone_uuid, fbx_bone_obj, fbx_parent_uuid in bones:
+                bones.extend((fbx_child_uuid, fbx_child_obj, fbx_bone_uuid)
+                             for fbx_child_uuid, fbx_child_obj in bone_children(fbx_bone_uuid))
+
+            # Bones in armature space (relative to the root bone), all in the same space:
+            # bind matrices when the file has them for every bone, else the current transforms.
+            matrices_bind = [bone_matrix_bind(fbx_bone_uuid)
+                             for fbx_bone_uuid, fbx_bone_obj, fbx_parent_uuid in bones]
+            if None not in matrices_bind:
+                matrix_root_inv = matrices_bind[0].inverted()
+                matrices = [matrix_root_inv * matrix for matrix in matrices_bind]
+            else:
+                if any(matrix is not None for matrix in matrices_bind):
+                    print("warning, skeleton %r has bones without bind matrix, its current pose is used as rest pose" %
+                          arm_obj.name)
+                matrices = {fbx_uuid: Matrix()}
+                for fbx_bone_uuid, fbx_bone_obj, fbx_parent_uuid in bones[1:]:
+                    matrices[fbx_bone_uuid] = matrices[fbx_parent_uuid] * model_matrix_local(fbx_bone_obj)
+                matrices = [matrices[fbx_bone_uuid] for fbx_bone_uuid, fbx_bone_obj, fbx_parent_uuid in bones]
+            bones = [bone + (matrix,) for bone, matrix in zip(bones, matrices)]
+
+            heads = {fbx_bone_uuid: matrix.to_translation()
+                     for fbx_bone_uuid, fbx_bone_obj, fbx_parent_uuid, matrix in bones}
+
+            arm = arm_obj.data
+            scene.objects.active = arm_obj
+            bpy.ops.object.mode_set(mode='EDIT')
+
+            edit_bones = {}
+            for fbx_bone_uuid, fbx_bone_obj, fbx_parent_uuid, matrix in bones:
+                # Bones reach their nearest child, leaves have the length of their parent.
+                lengths = [(heads[fbx_child_uuid] - heads[fbx_bone_uuid]).length
+                           for fbx_child_uuid, fbx_child_obj in bone_children(fbx_bone_uuid)]
+                lengths = [length for length in lengths if length > 1e-4]
+                if lengths:
+                    length = min(lengths)
+                elif fbx_parent_uuid is not None:
+                    length = edit_bones[fbx_parent_uuid].length
+                else:
+                    length = 1.0
+
+                ebone = arm.edit_bones.new(name=elem_split_name_class(fbx_bone_obj)[0].decode('utf-8'))
+                ebone.head = heads[fbx_bone_uuid]
+                ebone.tail = ebone.head + matrix.to_3x3().col[1].normalized() * length
+                ebone.align_roll(matrix.to_3x3().col[2])
+                if fbx_parent_uuid is not None:
+                    ebone.parent = edit_bones[fbx_parent_uuid]
+                edit_bones[fbx_bone_uuid] = ebone
+                fbx_bones[fbx_bone_uuid] = (arm_obj, ebone.name)
+
+            bpy.ops.object.mode_set(mode='OBJECT')
+            count += len(bones)
+        return count
+    fbx_profile.run("armatures", _); del _
+
+    # ----
+    # Skinning
+    # Each Skin deformer binds its Geometry to Clusters, a vertex group for each of the cluster bone.
+    def _():
+        count = 0
+        for fbx_uuid, fbx_item in fbx_table_nodes_iter(b'Deformer', b'Skin'):
+            fbx_clusters = [fbx_lnk for (fbx_lnk,
+                                         fbx_lnk_item,
+                                         fbx_lnk_type) in connection_filter_reverse(fbx_uuid, b'Deformer')
+                            if fbx_lnk.props[2] == b'Cluster']
+
+            for (fbx_geom,
+                 mesh,
+                 fbx_geom_type) in connection_filter_forward(fbx_uuid, b'Geometry'):
+                if mesh is None:
+                    continue
+                objects = [obj for (fbx_lnk,
+                                    obj,
+                                    fbx_lnk_type) in connection_filter_forward(elem_uuid(fbx_geom), b'Model')
+                           if obj is not None]
+                if not objects:
+                    continue
+
+                tot_verts = len(mesh.vertices)
+                for fbx_cluster in fbx_clusters:
+                    for (fbx_lnk,
+                         fbx_lnk_item,
+                         fbx_lnk_type) in connection_filter_reverse(elem_uuid(fbx_cluster), b'Model'):
+                        bone = fbx_bones.get(elem_uuid(fbx_lnk))
+                        if bone is not None:
+                            break
+                    else:
+                        continue
+                    arm_obj, bone_name = bone
+
+                    groups = import_fbx_prepare.prepare_skin_cluster_groups(fbx_cluster, tot_verts)
+                    for obj in objects:
+                        vgroup = obj.vertex_groups.get(bone_name)
+                        if vgroup is None:
+                            vgroup = obj.vertex_groups.new(name=bone_name)
+                        for weight, indices in groups:
+                            vgroup.add(indices, weight, 'REPLACE')
+
+                        if not any(mod.type == 'ARMATURE' and mod.object == arm_obj for mod in obj.modifiers):
+                            mod = obj.modifiers.new(name=arm_obj.name, type='ARMATURE')
+                            mod.object = arm_obj
+                    count += 1
+        return count
+    fbx_profile.run("skinning", _); del _
+
+    # ----
+    # Shape keys
+    # Each BlendShape deformer of a Geometry has channels, each using a Shape (in-between shapes are ignored).
+    def _():
+        fbx_tmpl = fbx_template_get((b'Deformer', b'FbxBlendShapeChannel'))
+
+        count = 0
+        for fbx_uuid, fbx_item in fbx_table_nodes_iter(b'Deformer', b'BlendShape'):
+            for (fbx_geom,
+                 mesh,
+                 fbx_geom_type) in connection_filter_forward(fbx_uuid, b'Geometry'):
+                if mesh is None:
+                    continue
+                # shape keys belong to the mesh, any object using it will do.
+                for (fbx_lnk,
+                     obj,
+                     fbx_lnk_type) in connection_filter_forward(elem_uuid(fbx_geom), b'Model'):
+                    if obj is not None:
+                        break
+                else:
+                    continue
+
+                tot_verts = len(mesh.vertices)
+                fbx_shapes = []
+                for (fbx_channel,
+                     fbx_channel_item,
+                     fbx_channel_type) in connection_filter_reverse(fbx_uuid, b'Deformer'):
+                    if fbx_channel.props[2] != b'BlendShapeChannel':
+                        continue
+                    # also written as a sub-element by some exporters.
+                    value = elem_prop_first(elem_find_first(fbx_channel, b'DeformPercent')) or 0.0
+                    fbx_props = fbx_props_get(fbx_channel, fbx_tmpl)
+                    if fbx_props is not None:
+                        value = elem_props_get_number(fbx_props, b'DeformPercent', value)
+
+                    for (fbx_shape,
+                         fbx_shape_item,
+                         fbx_shape_type) in connection_filter_reverse(elem_uuid(fbx_channel), b'Geometry'):
+                        if fbx_shape.props[2] == b'Shape':
+                            fbx_shapes.append((import_fbx_prepare.prepare_shape(fbx_shape, tot_verts),
+                                               value / 100.0))
+                            break
+
+                if fbx_shapes:
+                    blen_read_shape_keys(obj, fbx_shapes)
+                    count += len(fbx_shapes)
+        return count
+    fbx_profile.run("shape keys", _); del _
+
+    # ----
+    # Load animation
+    # Only the first layer of the first stack is imported, as an action for each animated object.
+    def _():
+        fbx_stacks = fbx_table_nodes_iter(b'AnimationStack')
+        if not fbx_stacks:
+            return 0
+        fbx_layers = tuple(connection_filter_reverse(fbx_stacks[0][0], b'AnimationLayer'))
+        if not fbx_layers:
+            return 0
+        if len(fbx_stacks) > 1 or len(fbx_layers) > 1:
+            print("warning, only the first layer of the first animation stack is imported")
+
+        fbx_tmpl = fbx_template_get((b'Model', b'KFbxNode'))
+        fps = scene.render.fps / scene.render.fps_base
+
+        # Model UID -> (Model, object, bone name, {(FBX property, index): FBXCurveData}),
+        # bones (but the root ones, which are their armature object) are animated as pose bones of their armature.
+        fbx_anims = {}
+        for (fbx_curve_node,
+             fbx_curve_node_item,
+             fbx_curve_node_type) in connection_filter_reverse(elem_uuid(fbx_layers[0][0]), b'AnimationCurveNode'):
+
+            fbx_curve_node_uuid = elem_uuid(fbx_curve_node)
+            for (fbx_lnk,
+                 fbx_lnk_item,
+                 fbx_lnk_type) in connection_filter_forward(fbx_curve_node_uuid, b'Model', b'OP'):
+
+                fbx_prop = fbx_lnk_type.props[3]
+                if fbx_prop not in FBX_ANIM_PROPS:
+                    continue
+
+                fbx_lnk_uuid = elem_uuid(fbx_lnk)
+                bone_name = None
+                if fbx_lnk_item is None:
+                    bone = fbx_bones.get(fbx_lnk_uuid)
+                    if bone is None:
+                        continue
+                    fbx_lnk_item, bone_name = bone
+
+                fbx_curves = fbx_anims.setdefault(fbx_lnk_uuid, (fbx_lnk, fbx_lnk_item, bone_name, {}))[3]
+                for (fbx_curve,
+                     fbx_curve_item,
+                     fbx_curve_type) in connection_filter_reverse(fbx_curve_node_uuid, b'AnimationCurve', b'OP'):
+
+                    index = FBX_ANIM_CHANNELS.get(fbx_curve_type.props[3])
+                    if index is None:
+                        continue
+                    fbx_curve_data = import_fbx_prepare.prepare_anim_curve(fbx_curve, fps)
+                    if fbx_curve_data is not None:
+                        fbx_curves[(fbx_prop, index)] = fbx_curve_data
+
+        frame_min = frame_max = None
+        for fbx_obj, obj, bone_name, fbx_curves in fbx_anims.values():
+            if not fbx_curves:
+                continue
+            fbx_props = fbx_props_get(fbx_obj, fbx_tmpl)
+            assert(fbx_props is not None)
+            fbx_transform = import_fbx_prepare.prepare_object(fbx_obj, fbx_props).transform
+            if bone_name is not None:
+                blen_read_animation_bone(obj, bone_name, fbx_transform, fbx_curves)
+            else:
+                blen_read_animation(obj, fbx_transform, fbx_curves,
+                                    global_matrix if obj.parent is None else None)
+
+            for fbx_curve in fbx_curves.values():
+                if frame_min is None:
+                    frame_min, frame_max = fbx_curve.frames[0], fbx_curve.frames[-1]
+                else:
+                    frame_min = min(frame_min, fbx_curve.frames[0])
+                    frame_max = max(frame_max, fbx_curve.frames[-1])
+
+        if frame_min is not None:
+            import math
+            scene.frame_start = math.floor(frame_min)
+            scene.frame_end = math.ceil(frame_max)
+
+        return len(fbx_anims)
+    fbx_profile.run("animation", _); del _
 
     def _():
         # link Material's to Geometry (via Model's)
-        for fbx_uuid, fbx_item in fbx_table_nodes.items():
+        count = 0
+        for fbx_uuid, fbx_item in fbx_table_nodes_iter(b'Geometry'):
             fbx_obj, blen_data = fbx_item
-            if fbx_obj.id != b'Geometry':
-                continue
 
-            mesh = fbx_table_nodes[fbx_uuid][1]
+            mesh = fbx_item[1]
 
             # can happen in rare cases
             if mesh is None:
                 continue
+            # materials are already linked to the mesh this geometry shares.
+            if fbx_uuid in fbx_uuids_geom_shared:
+                continue
 
             for (fbx_lnk,
                  fbx_lnk_item,
@@ -1178,7 +1162,9 @@ def load(operator, context, filepath="",
                      fbx_lnk_material_type) in connection_filter_reverse(fbx_lnk_uuid, b'Material'):
 
                     mesh.materials.append(material)
-    _(); del _
+                    count += 1
+        return count
+    fbx_profile.run("material linking", _); del _
 
     def _():
         material_images = {}
@@ -1189,18 +1175,16 @@ def load(operator, context, filepath="",
         # textures that use this material
         def texture_bumpfac_get(fbx_obj):
             assert(fbx_obj.id == b'Material')
-            fbx_props = (elem_find_first(fbx_obj, b'Properties70'),
-                         elem_find_first(fbx_tmpl, b'Properties70', fbx_elem_nil))
-            assert(fbx_props[0] is not None)
+            fbx_props = fbx_props_get(fbx_obj, fbx_tmpl)
+            assert(fbx_props is not None)
             # (x / 7.142) is only a guess, cycles usable range is (0.0 -> 0.5)
             return elem_props_get_number(fbx_props, b'BumpFactor', 2.5) / 7.142
 
         def texture_mapping_get(fbx_obj):
             assert(fbx_obj.id == b'Texture')
 
-            fbx_props = (elem_find_first(fbx_obj, b'Properties70'),
-                         elem_find_first(fbx_tmpl, b'Properties70', fbx_elem_nil))
-            assert(fbx_props[0] is not None)
+            fbx_props = fbx_props_get(fbx_obj, fbx_tmpl)
+            assert(fbx_props is not None)
             return (elem_props_get_vector_3d(fbx_props, b'Translation', (0.0, 0.0, 0.0)),
                     elem_props_get_vector_3d(fbx_props, b'Rotation', (0.0, 0.0, 0.0)),
                     elem_props_get_vector_3d(fbx_props, b'Scaling', (1.0, 1.0, 1.0)),
@@ -1222,12 +1206,10 @@ def load(operator, context, filepath="",
                 mtex.use_map_color_diffuse = False
                 return mtex
 
-        for fbx_uuid, fbx_item in fbx_table_nodes.items():
+        for fbx_uuid, fbx_item in fbx_table_nodes_iter(b'Material'):
             fbx_obj, blen_data = fbx_item
-            if fbx_obj.id != b'Material':
-                continue
 
-            material = fbx_table_nodes[fbx_uuid][1]
+            material = fbx_item[1]
             for (fbx_lnk,
                  image,
                  fbx_lnk_type) in connection_filter_reverse(fbx_uuid, b'Texture'):
@@ -1339,11 +1321,9 @@ def load(operator, context, filepath="",
         # if so, use the alpha channel.
 
         # Note: this could be made optional since images may have alpha but be entirely opaque
-        for fbx_uuid, fbx_item in fbx_table_nodes.items():
+        for fbx_uuid, fbx_item in fbx_table_nodes_iter(b'Material'):
             fbx_obj, blen_data = fbx_item
-            if fbx_obj.id != b'Material':
-                continue
-            material = fbx_table_nodes[fbx_uuid][1]
+            material = fbx_item[1]
             image = material_images.get(material, {}).get(b'DiffuseColor')
             # do we have alpha?
             if image and image.depth == 32:
@@ -1369,34 +1349,42 @@ def load(operator, context, filepath="",
                 ma_wrap = cycles_material_wrap_map[material]
                 ma_wrap.mapping_set_from_diffuse()
 
-    _(); del _
+        return len(fbx_table_nodes_iter(b'Material'))
+    fbx_profile.run("material textures", _); del _
 
     def _():
         # Annoying workaround for cycles having no z-offset
         if material_decals and use_alpha_decals:
-            for fbx_uuid, fbx_item in fbx_table_nodes.items():
+            for fbx_uuid, fbx_item in fbx_table_nodes_iter(b'Geometry', b'Mesh'):
                 fbx_obj, blen_data = fbx_item
-                if fbx_obj.id != b'Geometry':
+                mesh = fbx_item[1]
+
+                # handled with the geometry whose mesh is shared.
+                if fbx_uuid in fbx_uuids_geom_shared:
                     continue
-                if fbx_obj.props[-1] == b'Mesh':
-                    mesh = fbx_item[1]
-
-                    if decal_offset != 0.0:
-                        for material in mesh.materials:
-                            if material in material_decals:
-                                for v in mesh.vertices:
-                                    v.co += v.normal * decal_offset
-                                break
-
-                    if use_cycles:
-                        for obj in (obj for obj in bpy.data.objects if obj.data == mesh):
-                            obj.cycles_visibility.shadow = False
-                    else:
-                        for material in mesh.materials:
-                            if material in material_decals:
-                                # recieve but dont cast shadows
-                                material.use_raytrace = False
-    _(); del _
+
+                if decal_offset != 0.0:
+                    for material in mesh.materials:
+                        if material in material_decals:
+                            for v in mesh.vertices:
+                                v.co += v.normal * decal_offset
+                            break
+
+                if use_cycles:
+                    for obj in (obj for obj in bpy.data.objects if obj.data == mesh):
+                        obj.cycles_visibility.shadow = False
+                else:
+                    for material in mesh.materials:
+                        if material in material_decals:
+                            # recieve but dont cast shadows
+                            material.use_raytrace = False
+        return len(material_decals) if material_decals else 0
+    fbx_profile.run("decals", _); del _
+
+    if use_profile:
+        operator.report({'INFO'}, "FBX import profile of %r:\n%s" % (filepath, fbx_profile.report()))
+        if profile_filepath:
+            fbx_profile.write_json(profile_filepath, filepath=filepath, version=version)
 
     # print(list(sorted(locals().keys())))
     return {'FINISHED'}
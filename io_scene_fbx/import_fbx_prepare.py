@@ -0,0 +1,836 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+# Script copyright (C) Blender Foundation
+
+# FBX importer, first stage: turn FBX elements into plain records and typed buffers (no bpy dependency),
+# import_fbx then creates Blender data from those with bulk calls only.
+# Everything here only depends on the parsed file, so it can run in a thread or process pool, or be tested
+# and benchmarked without Blender.
+
+try:
+    from .parse_fbx import data_types, FBXArrayRaw
+    from .fbx_utils import (
+        elem_find_first,
+        elem_find_iter,
+        elem_find_first_string,
+        elem_find_first_bytes,
+        elem_split_name_class,
+        elem_split_name_class_nodeattr,
+        elem_uuid,
+        elem_prop_first,
+        elem_prop_first_array,
+        elem_props_get_color_rgb,
+        elem_props_get_vector_3d,
+        elem_props_get_number,
+        elem_props_get_bool,
+        elem_props_get_enum,
+        )
+except:
+    from parse_fbx import data_types, FBXArrayRaw
+    from fbx_utils import (
+        elem_find_first,
+        elem_find_iter,
+        elem_find_first_string,
+        elem_find_first_bytes,
+        elem_split_name_class,
+        elem_split_name_class_nodeattr,
+        elem_uuid,
+        elem_prop_first,
+        elem_prop_first_array,
+        elem_props_get_color_rgb,
+        elem_props_get_vector_3d,
+        elem_props_get_number,
+        elem_props_get_bool,
+        elem_props_get_enum,
+        )
+
+import array
+from collections import namedtuple
+
+import numpy as np
+
+FBXMeshData = namedtuple("FBXMeshData", (
+    "name",
+    "vertices",  # array of coordinates, 3 per vertex.
+    "loops",  # array of vertex indices, 1 per loop.
+    "loop_start",  # arrays of first loop and number of loops, 1 per polygon.
+    "loop_total",
+    "edges",  # array of vertex indices, 2 per edge, or None.
+    "material_index",  # array, 1 per polygon, or None.
+    "uv_layers",  # list of (name, array of 2 per loop, or None when missing).
+    "color_layers",  # list of (name, array of 3 per loop, or None when missing).
+    "edge_sharp",  # array, 1 per edge, or None.
+    "poly_smooth",  # array, 1 per polygon, or None (when neither is defined, all polygons are smooth).
+    "vertex_normals",  # array, 3 per vertex, or None (to be computed).
+    ))
+
+FBXTransformData = namedtuple("FBXTransformData", (
+    "loc", "rot", "sca",
+    "rot_ofs", "rot_piv", "sca_ofs", "sca_piv",
+    "pre_rot", "pst_rot", "rot_ord",
+    ))
+
+FBXObjectData = namedtuple("FBXObjectData", ("name", "color", "transform"))
+
+FBXMaterialData = namedtuple("FBXMaterialData", (
+    "name",
+    "diffuse_color", "specular_color", "alpha",
+    "specular_intensity", "specular_hardness",
+    "reflect_factor", "reflect_color",
+    ))
+
+FBXCameraData = namedtuple("FBXCameraData", (
+    "name",
+    "lens", "sensor_width", "sensor_height", "shift_x", "shift_y",
+    "clip_start", "clip_end",
+    ))
+
+FBXLightData = namedtuple("FBXLightData", (
+    "name", "type",
+    "spot_size", "spot_blend",  # None unless type is 'SPOT'.
+    "color", "energy", "distance",
+    "use_shadow", "shadow_color",
+    ))
+
+
+def array_float(data):
+    """
+    Return data as a float64 array (arrays slices can only be assigned from arrays of the same type).
+    """
+    if type(data) is array.array and data.typecode == 'd':
+        return data
+    return array.array('d', data)
+
+
+def array_pad(data, size, value=0):
+    """
+    Return data truncated or padded with value to size items.
+    """
+    if len(data) >= size:
+        return data[:size]
+    return data + array.array(data.typecode, (value,)) * (size - len(data))
+
+
+# ------
+# Filter
+
+# Model subclass -> Blender object type, for filtered imports.
+FBX_MODEL_OBJECT_TYPES = {
+    b'Null': 'EMPTY',
+    b'Camera': 'CAMERA',
+    b'Light': 'LAMP',
+    b'Mesh': 'MESH',
+    b'LimbNode': 'ARMATURE',
+    }
+
+
+def prepare_filter(fbx_nodes, fbx_connections, object_names=(), object_types=None, object_uids=()):
+    """
+    Return the set of UIDs of the objects to import: the Models matching all given filters
+    (fnmatch name patterns, Blender object types, UIDs), and everything connected to them as a source,
+    recursively (object data, materials, textures, child Models, animation curves...),
+    and the parent bones of selected bones.
+    """
+    import fnmatch
+
+    seeds = []
+    fbx_model_uuids = set()
+    fbx_limb_uuids = set()
+    for fbx_obj in fbx_nodes.elems:
+        if fbx_obj.id != b'Model':
+            continue
+        fbx_uuid = elem_uuid(fbx_obj)
+        fbx_model_uuids.add(fbx_uuid)
+        if fbx_obj.props[-1] == b'LimbNode':
+            fbx_limb_uuids.add(fbx_uuid)
+        if object_uids and fbx_uuid not in object_uids:
+            continue
+        if object_types is not None and FBX_MODEL_OBJECT_TYPES.get(fbx_obj.props[-1]) not in object_types:
+            continue
+        if object_names:
+            elem_name = elem_split_name_class(fbx_obj)[0].decode('utf-8', 'replace')
+            if not any(fnmatch.fnmatchcase(elem_name, pattern) for pattern in object_names):
+                continue
+        seeds.append(fbx_uuid)
+
+    connection_map = {}  # source -> destinations
+    connection_map_reverse = {}  # destination -> sources
+    for fbx_link in fbx_connections.elems:
+        if fbx_link.props_type[1:3] == b'LL':
+            c_src, c_dst = fbx_link.props[1:3]
+            connection_map.setdefault(c_src, []).append(c_dst)
+            connection_map_reverse.setdefault(c_dst, []).append(c_src)
+
+    uuids = set()
+    stack = seeds
+    while stack:
+        fbx_uuid = stack.pop()
+        if fbx_uuid not in uuids:
+            uuids.add(fbx_uuid)
+            stack.extend(connection_map_reverse.get(fbx_uuid, ()))
+
+    # Bones also need their parent bones up to the skeleton root, to rebuild the armature
+    # (along with their node attributes and animation, but not their other child Models).
+    stack = [c_dst for fbx_uuid in uuids & fbx_limb_uuids
+             for c_dst in connection_map.get(fbx_uuid, ()) if c_dst in fbx_limb_uuids]
+    while stack:
+        fbx_uuid = stack.pop()
+        if fbx_uuid not in uuids:
+            uuids.add(fbx_uuid)
+            stack.extend(c_dst for c_dst in connection_map.get(fbx_uuid, ()) if c_dst in fbx_limb_uuids)
+            stack.extend(c_src for c_src in connection_map_reverse.get(fbx_uuid, ()) if c_src not in fbx_model_uuids)
+
+    # Animation curve nodes also need their layer and stack (but not the other curve nodes of those).
+    fbx_owner_uuids = {elem_uuid(fbx_obj) for fbx_obj in fbx_nodes.elems
+                       if fbx_obj.id in {b'AnimationLayer', b'AnimationStack'}}
+    stack = list(uuids)
+    while stack:
+        for c_dst in connection_map.get(stack.pop(), ()):
+            if c_dst in fbx_owner_uuids and c_dst not in uuids:
+                uuids.add(c_dst)
+                stack.append(c_dst)
+    return uuids
+
+
+# ------
+# Object
+
+def prepare_object(fbx_obj, fbx_props):
+    elem_name, elem_class = elem_split_name_class(fbx_obj)
+
+    const_vector_zero_3d = 0.0, 0.0, 0.0
+    const_vector_one_3d = 1.0, 1.0, 1.0
+
+    # ----
+    # Transformation
+
+    # This is quite involved, 'fbxRNode.cpp' from openscenegraph used as a reference
+
+    loc = elem_props_get_vector_3d(fbx_props, b'Lcl Translation', const_vector_zero_3d)
+    rot = elem_props_get_vector_3d(fbx_props, b'Lcl Rotation', const_vector_zero_3d)
+    sca = elem_props_get_vector_3d(fbx_props, b'Lcl Scaling', const_vector_one_3d)
+
+    rot_ofs = elem_props_get_vector_3d(fbx_props, b'RotationOffset', const_vector_zero_3d)
+    rot_piv = elem_props_get_vector_3d(fbx_props, b'RotationPivot', const_vector_zero_3d)
+    sca_ofs = elem_props_get_vector_3d(fbx_props, b'ScalingOffset', const_vector_zero_3d)
+    sca_piv = elem_props_get_vector_3d(fbx_props, b'ScalingPivot', const_vector_zero_3d)
+
+    is_rot_act = elem_props_get_bool(fbx_props, b'RotationActive', False)
+
+    if is_rot_act:
+        pre_rot = elem_props_get_vector_3d(fbx_props, b'PreRotation', const_vector_zero_3d)
+        pst_rot = elem_props_get_vector_3d(fbx_props, b'PostRotation', const_vector_zero_3d)
+        rot_ord = {
+            0: 'XYZ',
+            1: 'XYZ',
+            2: 'XZY',
+            3: 'YZX',
+            4: 'YXZ',
+            5: 'ZXY',
+            6: 'ZYX',
+            }.get(elem_props_get_enum(fbx_props, b'RotationOrder', 0))
+    else:
+        pre_rot = const_vector_zero_3d
+        pst_rot = const_vector_zero_3d
+        rot_ord = 'XYZ'
+
+    return FBXObjectData(
+        elem_name.decode('utf-8'),
+        elem_props_get_color_rgb(fbx_props, b'Color', (0.8, 0.8, 0.8)),
+        FBXTransformData(loc, rot, sca, rot_ofs, rot_piv, sca_ofs, sca_piv, pre_rot, pst_rot, rot_ord),
+        )
+
+
+# ----
+# Mesh
+
+def prepare_geom_layerinfo(fbx_layer):
+    return (
+        elem_find_first_string(fbx_layer, b'Name'),
+        elem_find_first_bytes(fbx_layer, b'MappingInformationType'),
+        elem_find_first_bytes(fbx_layer, b'ReferenceInformationType'),
+        )
+
+
+def prepare_geom_array_mapped_polyloop(
+    loops, default,
+    fbx_layer_data, fbx_layer_index,
+    fbx_layer_mapping, fbx_layer_ref,
+    stride, item_size, descr,
+    ):
+    """
+    Return an array of item_size values per loop, loops not set by the layer get default values.
+    """
+    tot_loops = len(loops)
+    fbx_layer_data = array_float(fbx_layer_data)
+    data = array.array('d', (default,)) * (tot_loops * item_size)
+    # Out of range indices would give short slices, shrinking data (loops using them keep default values).
+    tot_items = len(fbx_layer_data) // stride
+
+    if fbx_layer_mapping == b'ByPolygonVertex':
+        if fbx_layer_ref == b'IndexToDirect':
+            assert(fbx_layer_index is not None)
+            tot_invalid = 0
+            for i, j in enumerate(fbx_layer_index[:tot_loops]):
+                if 0 <= j < tot_items:
+                    data[(i * item_size): (i * item_size) + item_size] = \
+                        fbx_layer_data[(j * stride): (j * stride) + item_size]
+                elif j != -1:
+                    tot_invalid += 1
+            if tot_invalid:
+                print("warning layer %r has %d invalid indices" % (descr, tot_invalid))
+            return data
+        elif fbx_layer_ref == b'Direct':
+            assert(fbx_layer_index is None or len(fbx_layer_index) == 0)
+            for i in range(min(tot_loops, tot_items)):
+                data[(i * item_size): (i * item_size) + item_size] = \
+                    fbx_layer_data[(i * stride): (i * stride) + item_size]
+            return data
+        else:
+            print("warning layer %r ref type unsupported: %r" % (descr, fbx_layer_ref))
+    elif fbx_layer_mapping == b'ByVertice':
+        if fbx_layer_ref == b'Direct':
+            assert(fbx_layer_index is None)
+            tot_invalid = 0
+            for i, j in enumerate(loops):
+                if j < tot_items:
+                    data[(i * item_size): (i * item_size) + item_size] = \
+                        fbx_layer_data[(j * stride): (j * stride) + item_size]
+                else:
+                    tot_invalid += 1
+            if tot_invalid:
+                print("warning layer %r has no data for %d vertices" % (descr, tot_invalid))
+            return data
+        else:
+            print("warning layer %r ref type unsupported: %r" % (descr, fbx_layer_ref))
+    else:
+        print("warning layer %r mapping type unsupported: %r" % (descr, fbx_layer_mapping))
+
+    return data
+
+
+def prepare_geom_layer_material(fbx_obj, tot_polys):
+    fbx_layer = elem_find_first(fbx_obj, b'LayerElementMaterial')
+
+    if fbx_layer is None:
+        return None
+
+    (fbx_layer_name,
+     fbx_layer_mapping,
+     fbx_layer_ref,
+     ) = prepare_geom_layerinfo(fbx_layer)
+
+    if fbx_layer_mapping == b'AllSame':
+        # only to quiet warning
+        return None
+
+    layer_id = b'Materials'
+    fbx_layer_data = elem_prop_first_array(elem_find_first(fbx_layer, layer_id))
+
+    if fbx_layer_mapping == b'ByPolygon':
+        if fbx_layer_ref in {b'IndexToDirect', b'Direct'}:
+            return array_pad(array.array(data_types.ARRAY_INT32, fbx_layer_data), tot_polys)
+        print("warning layer %r ref type unsupported: %r" % (layer_id, fbx_layer_ref))
+    else:
+        print("warning layer %r mapping type unsupported: %r" % (layer_id, fbx_layer_mapping))
+    return None
+
+
+def prepare_geom_layer_polyloop(fbx_obj, loops, layer_elem_id, layer_id, layer_index_id, stride, item_size, default):
+    layers = []
+    for fbx_layer in elem_find_iter(fbx_obj, layer_elem_id):
+        # all should be valid
+        (fbx_layer_name,
+         fbx_layer_mapping,
+         fbx_layer_ref,
+         ) = prepare_geom_layerinfo(fbx_layer)
+
+        fbx_layer_data = elem_prop_first_array(elem_find_first(fbx_layer, layer_id))
+        fbx_layer_index = elem_prop_first_array(elem_find_first(fbx_layer, layer_index_id))
+
+        # some valid files omit this data
+        if fbx_layer_data is None:
+            print("%r %r missing data" % (layer_elem_id, fbx_layer_name))
+            layers.append((fbx_layer_name, None))
+            continue
+
+        layers.append((fbx_layer_name, prepare_geom_array_mapped_polyloop(
+            loops, default,
+            fbx_layer_data, fbx_layer_index,
+            fbx_layer_mapping, fbx_layer_ref,
+            stride, item_size, layer_elem_id,
+            )))
+    return layers
+
+
+def prepare_geom_layer_smooth(fbx_obj, tot_edges, tot_polys):
+    """
+    Return (edge_sharp, poly_smooth), either or both being None.
+    """
+    fbx_layer = elem_find_first(fbx_obj, b'LayerElementSmoothing')
+
+    if fbx_layer is None:
+        return None, None
+
+    # all should be valid
+    (fbx_layer_name,
+     fbx_layer_mapping,
+     fbx_layer_ref,
+     ) = prepare_geom_layerinfo(fbx_layer)
+
+    layer_id = b'Smoothing'
+    fbx_layer_data = elem_prop_first_array(elem_find_first(fbx_layer, layer_id))
+
+    # udk has 'Direct' mapped, with no Smoothing, not sure why, but ignore these
+    if fbx_layer_data is None:
+        return None, None
+
+    if fbx_layer_mapping == b'ByEdge':
+        # some models have bad edge data, we cant use this info...
+        if not tot_edges:
+            return None, None
+
+        if fbx_layer_ref == b'Direct':
+            return array_pad(array.array('b', (not s for s in fbx_layer_data[:tot_edges])), tot_edges), None
+        print("warning layer %r ref type unsupported: %r" % (layer_id, fbx_layer_ref))
+    elif fbx_layer_mapping == b'ByPolygon':
+        if fbx_layer_ref in {b'IndexToDirect', b'Direct'}:
+            # smoothgroup bitflags, treat as booleans for now
+            return None, array_pad(array.array('b', (s != 0 for s in fbx_layer_data[:tot_polys])), tot_polys)
+        print("warning layer %r ref type unsupported: %r" % (layer_id, fbx_layer_ref))
+    else:
+        print("warning layer %r mapping type unsupported: %r" % (fbx_layer.id, fbx_layer_mapping))
+    return None, None
+
+
+def prepare_geom_layer_normal(fbx_obj, tot_verts):
+    fbx_layer = elem_find_first(fbx_obj, b'LayerElementNormal')
+
+    if fbx_layer is None:
+        return None
+
+    (fbx_layer_name,
+     fbx_layer_mapping,
+     fbx_layer_ref,
+     ) = prepare_geom_layerinfo(fbx_layer)
+
+    layer_id = b'Normals'
+    fbx_layer_data = elem_prop_first_array(elem_find_first(fbx_layer, layer_id))
+
+    if fbx_layer_mapping == b'ByVertice':
+        if fbx_layer_ref == b'Direct':
+            return array_pad(array_float(fbx_layer_data), tot_verts * 3)
+        else:
+            print("warning layer %r ref type unsupported: %r" % (layer_id, fbx_layer_ref))
+    else:
+        print("warning layer %r mapping type unsupported: %r" % (layer_id, fbx_layer_mapping))
+    return None
+
+
+def prepare_geom_edges(fbx_edges, fbx_polys):
+    # edges in fact index the polygons (NOT the vertices)
+    tot_edges = len(fbx_edges)
+    edges_conv = array.array(data_types.ARRAY_INT32, [0]) * (tot_edges * 2)
+
+    edge_index = 0
+    for i in fbx_edges:
+        e_a = fbx_polys[i]
+        if e_a >= 0:
+            e_b = fbx_polys[i + 1]
+            if e_b < 0:
+                e_b ^= -1
+        else:
+            # Last index of polygon, wrap back to the start.
+
+            # ideally we wouldn't have to search back,
+            # but it should only be 2-3 iterations.
+            j = i - 1
+            while j >= 0 and fbx_polys[j] >= 0:
+                j -= 1
+            e_a ^= -1
+            e_b = fbx_polys[j + 1]
+
+        edges_conv[edge_index] = e_a
+        edges_conv[edge_index + 1] = e_b
+        edge_index += 2
+
+    return edges_conv
+
+
+def prepare_geom_digest(fbx_obj):
+    """
+    Return a digest of the geometry content (all sub-elements, so not its UID and name),
+    equal digests mean identical meshes. Raw arrays are hashed as stored, without decompressing them.
+    """
+    import hashlib
+
+    fbx_hash = hashlib.sha1()
+    update = fbx_hash.update
+
+    def elem_hash(elem):
+        update(elem.id)
+        update(bytes(elem.props_type))
+        for data in elem.props:
+            if isinstance(data, FBXArrayRaw):
+                update(("%d:%d:" % (data.encoding, data.length)).encode())
+                update(data.payload)
+            elif isinstance(data, array.array):
+                update(("%s:%d:" % (data.typecode, len(data))).encode())
+                update(data.tobytes())
+            elif isinstance(data, bytes):
+                update(("%d:" % len(data)).encode())
+                update(data)
+            else:
+                update(repr(data).encode())
+        update(("%d;" % len(elem.elems)).encode())
+        for elem_sub in elem.elems:
+            elem_hash(elem_sub)
+
+    for elem_sub in fbx_obj.elems:
+        elem_hash(elem_sub)
+    return fbx_hash.digest()
+
+
+def prepare_geom(fbx_tmpl, fbx_obj):
+    # TODO, use 'fbx_tmpl'
+    elem_name, elem_class = elem_split_name_class(fbx_obj)
+    assert(elem_class == b'Geometry')
+
+    fbx_verts = elem_prop_first_array(elem_find_first(fbx_obj, b'Vertices'))
+    fbx_polys = elem_prop_first_array(elem_find_first(fbx_obj, b'PolygonVertexIndex'))
+    fbx_edges = elem_prop_first_array(elem_find_first(fbx_obj, b'Edges'))
+
+    vertices = array_float(() if fbx_verts is None else fbx_verts)
+    tot_verts = len(vertices) // 3
+
+    loops = array.array(data_types.ARRAY_INT32, () if fbx_polys is None else fbx_polys)
+    loop_start = array.array(data_types.ARRAY_INT32)
+    loop_total = array.array(data_types.ARRAY_INT32)
+    material_index = None
+    uv_layers = []
+    color_layers = []
+
+    if loops:
+        poly_loop_prev = 0
+        for i, index in enumerate(loops):
+            if index < 0:
+                loop_start.append(poly_loop_prev)
+                loop_total.append((i - poly_loop_prev) + 1)
+                poly_loop_prev = i + 1
+                loops[i] = index ^ -1
+
+        material_index = prepare_geom_layer_material(fbx_obj, len(loop_start))
+        uv_layers = prepare_geom_layer_polyloop(fbx_obj, loops, b'LayerElementUV', b'UV', b'UVIndex', 2, 2, 0.0)
+        # ignore alpha layer (read 4 items into 3), unset colors are white
+        color_layers = prepare_geom_layer_polyloop(fbx_obj, loops, b'LayerElementColor', b'Colors', b'ColorIndex',
+                                                   4, 3, 1.0)
+
+    edges = prepare_geom_edges(fbx_edges, fbx_polys) if fbx_edges else None
+
+    edge_sharp, poly_smooth = prepare_geom_layer_smooth(fbx_obj, len(edges) // 2 if edges else 0, len(loop_start))
+
+    return FBXMeshData(
+        elem_name.decode('utf-8'),
+        vertices,
+        loops,
+        loop_start,
+        loop_total,
+        edges,
+        material_index,
+        uv_layers,
+        color_layers,
+        edge_sharp,
+        poly_smooth,
+        prepare_geom_layer_normal(fbx_obj, tot_verts),
+        )
+
+
+# --------
+# Material
+
+def prepare_material(fbx_obj, fbx_props):
+    elem_name, elem_class = elem_split_name_class(fbx_obj)
+    assert(elem_class == b'Material')
+
+    const_color_white = 1.0, 1.0, 1.0
+
+    return FBXMaterialData(
+        elem_name.decode('utf-8'),
+        elem_props_get_color_rgb(fbx_props, b'DiffuseColor', const_color_white),
+        elem_props_get_color_rgb(fbx_props, b'SpecularColor', const_color_white),
+        elem_props_get_number(fbx_props, b'Opacity', 1.0),
+        elem_props_get_number(fbx_props, b'SpecularFactor', 0.25) * 2.0,
+        elem_props_get_number(fbx_props, b'Shininess', 9.6),
+        elem_props_get_number(fbx_props, b'ReflectionFactor', 0.0),
+        elem_props_get_color_rgb(fbx_props, b'ReflectionColor', const_color_white),
+        )
+
+
+# ------
+# Camera
+
+def prepare_camera(fbx_obj, fbx_props, global_scale):
+    # meters to inches
+    M2I = 0.0393700787
+
+    elem_name, elem_class = elem_split_name_class_nodeattr(fbx_obj)
+    assert(elem_class == b'Camera')
+
+    sensor_width = elem_props_get_number(fbx_props, b'FilmWidth', 32.0 * M2I) / M2I
+    sensor_height = elem_props_get_number(fbx_props, b'FilmHeight', 32.0 * M2I) / M2I
+    filmaspect = sensor_width / sensor_height
+
+    return FBXCameraData(
+        elem_name.decode('utf-8'),
+        elem_props_get_number(fbx_props, b'FocalLength', 35.0),
+        sensor_width,
+        sensor_height,
+        # film offset
+        elem_props_get_number(fbx_props, b'FilmOffsetX', 0.0) / (M2I * sensor_width),
+        elem_props_get_number(fbx_props, b'FilmOffsetY', 0.0) / (M2I * sensor_height * filmaspect),
+        elem_props_get_number(fbx_props, b'NearPlane', 0.01) * global_scale,
+        elem_props_get_number(fbx_props, b'FarPlane', 100.0) * global_scale,
+        )
+
+
+# -----
+# Light
+
+def prepare_light(fbx_obj, fbx_props, global_scale):
+    """
+    fbx_props may be None (rare), the light then only has a name and type.
+    """
+    import math
+
+    elem_name, elem_class = elem_split_name_class_nodeattr(fbx_obj)
+    assert(elem_class == b'Light')
+    elem_name_utf8 = elem_name.decode('utf-8')
+
+    if fbx_props is None:
+        return FBXLightData(elem_name_utf8, 'POINT', None, None, None, None, None, None, None)
+
+    light_type = {
+        0: 'POINT',
+        1: 'SUN',
+        2: 'SPOT'}.get(elem_props_get_enum(fbx_props, b'LightType', 0), 'POINT')
+
+    spot_size = spot_blend = None
+    if light_type == 'SPOT':
+        spot_size = elem_props_get_number(fbx_props, b'OuterAngle', None)
+        if spot_size is None:
+            # Deprecated.
+            spot_size = elem_props_get_number(fbx_props, b'Cone angle', 45.0)
+
+        spot_blend = elem_props_get_number(fbx_props, b'InnerAngle', None)
+        if spot_blend is None:
+            # Deprecated.
+            spot_blend = elem_props_get_number(fbx_props, b'HotSpot', 45.0)
+        spot_blend = 1.0 - (spot_blend / spot_size)
+        spot_size = math.radians(spot_size)
+
+    return FBXLightData(
+        elem_name_utf8,
+        light_type,
+        spot_size,
+        spot_blend,
+        elem_props_get_color_rgb(fbx_props, b'Color', (1.0, 1.0, 1.0)),
+        elem_props_get_number(fbx_props, b'Intensity', 100.0) / 100.0,
+        elem_props_get_number(fbx_props, b'DecayStart', 25.0) * global_scale,
+        elem_props_get_bool(fbx_props, b'CastShadow', True),
+        elem_props_get_color_rgb(fbx_props, b'ShadowColor', (0.0, 0.0, 0.0)),
+        )
+
+
+# ------
+# Shapes
+
+# Sparse vertex offsets of a blend shape, indexes (int32 array) and deltas (float64 array of 3 floats rows)
+# are in the same order.
+FBXShapeData = namedtuple("FBXShapeData", ("name", "indexes", "deltas"))
+
+
+def prepare_shape(fbx_obj, tot_verts):
+    elem_name, elem_class = elem_split_name_class(fbx_obj)
+    assert(elem_class == b'Geometry')
+
+    fbx_indexes = elem_prop_first_array(elem_find_first(fbx_obj, b'Indexes'))
+    fbx_deltas = elem_prop_first_array(elem_find_first(fbx_obj, b'Vertices'))
+
+    indexes = np.array(() if fbx_indexes is None else fbx_indexes, dtype=np.int32)
+    deltas = np.array(() if fbx_deltas is None else fbx_deltas, dtype=np.float64)
+    tot_shape_verts = min(len(indexes), len(deltas) // 3)
+    indexes = indexes[:tot_shape_verts]
+    deltas = deltas[:tot_shape_verts * 3].reshape(-1, 3)
+    valid = (indexes >= 0) & (indexes < tot_verts)
+    if not valid.all():
+        print("warning shape %r has invalid vertex indices" % elem_name)
+        indexes = indexes[valid]
+        deltas = deltas[valid]
+
+    return FBXShapeData(elem_name.decode('utf-8'), indexes, deltas)
+
+
+def prepare_shape_co(co_base, fbx_shape):
+    """
+    Return the flat vertex coordinates co_base (3 float32 per vertex) with the offsets of fbx_shape added,
+    as a float32 array (co_base is left unchanged).
+    """
+    co = np.array(co_base, dtype=np.float64).reshape(-1, 3)
+    # (unbuffered, so vertices listed more than once get all their offsets)
+    np.add.at(co, fbx_shape.indexes, fbx_shape.deltas)
+    return co.astype(np.float32).ravel()
+
+
+# --------
+# Skinning
+
+def prepare_matrix(fbx_elem):
+    """
+    Return the rows of a FBX matrix element (16 floats, stored column by column), None when missing.
+    """
+    data = elem_prop_first_array(fbx_elem)
+    if data is None or len(data) != 16:
+        return None
+    return tuple(tuple(data[i + j * 4] for j in range(4)) for i in range(4))
+
+
+def prepare_bind_pose(fbx_nodes):
+    """
+    Return the global matrices of the nodes of all BindPose elements (UID -> rows, see prepare_matrix),
+    the first one found is used for nodes in several poses.
+    """
+    matrices = {}
+    for fbx_obj in fbx_nodes.elems:
+        if fbx_obj.id != b'Pose' or fbx_obj.props[2] != b'BindPose':
+            continue
+        for fbx_pose_node in elem_find_iter(fbx_obj, b'PoseNode'):
+            fbx_uuid = elem_prop_first(elem_find_first(fbx_pose_node, b'Node'))
+            matrix = prepare_matrix(elem_find_first(fbx_pose_node, b'Matrix'))
+            if fbx_uuid is not None and matrix is not None:
+                matrices.setdefault(fbx_uuid, matrix)
+    return matrices
+
+
+def prepare_skin_cluster_groups(fbx_obj, tot_verts):
+    """
+    Return the (weight, [vertex index, ...]) pairs of a skin Cluster, vertices of identical weights
+    (as float32, like Blender stores them) are grouped so each group is assigned with a single call.
+    """
+    fbx_indexes = elem_prop_first_array(elem_find_first(fbx_obj, b'Indexes'))
+    fbx_weights = elem_prop_first_array(elem_find_first(fbx_obj, b'Weights'))
+    if not fbx_indexes or not fbx_weights:
+        return []
+
+    groups = {}
+    for index, weight in zip(fbx_indexes, array.array('f', fbx_weights)):
+        if 0 <= index < tot_verts:
+            groups.setdefault(weight, []).append(index)
+    return sorted(groups.items())
+
+
+# ---------
+# Animation
+
+# Number of "ktimes" in one second.
+FBX_KTIME = 46186158000
+
+# Key times are converted to scene frames, stored as float32 like Blender keyframes.
+FBXCurveData = namedtuple("FBXCurveData", ("frames", "values", "interpolation"))
+
+
+def prepare_anim_curve(fbx_obj, fps):
+    """
+    Return the keys of an AnimationCurve: frames and values as float32 arrays,
+    and the interpolation of each key (Blender enum values: 0 constant, 1 linear, 2 bezier, as an int32 array),
+    or None when the curve has no keys.
+    """
+    fbx_times = elem_prop_first_array(elem_find_first(fbx_obj, b'KeyTime'))
+    fbx_values = elem_prop_first_array(elem_find_first(fbx_obj, b'KeyValueFloat'))
+    if not fbx_times or not fbx_values:
+        return None
+
+    # Whole arrays are converted at once, there can be many thousands of keys per curve with mocap.
+    tot_keys = min(len(fbx_times), len(fbx_values))
+    frames = (np.asarray(fbx_times, dtype=np.int64)[:tot_keys] / FBX_KTIME * fps).astype(np.float32)
+    values = np.array(fbx_values, dtype=np.float32)[:tot_keys]
+
+    # Each flag is shared by a run of 'KeyAttrRefCount' keys.
+    interpolation = None
+    fbx_flags = elem_prop_first_array(elem_find_first(fbx_obj, b'KeyAttrFlags'))
+    fbx_counts = elem_prop_first_array(elem_find_first(fbx_obj, b'KeyAttrRefCount'))
+    if fbx_flags and fbx_counts:
+        tot_runs = min(len(fbx_flags), len(fbx_counts))
+        fbx_flags = np.asarray(fbx_flags, dtype=np.int32)[:tot_runs]
+        fbx_counts = np.asarray(fbx_counts, dtype=np.int32)[:tot_runs]
+        interpolation = np.where(fbx_flags & 0x00000002, 0, np.where(fbx_flags & 0x00000004, 1, 2))
+        interpolation = np.repeat(interpolation.astype(np.int32), np.maximum(fbx_counts, 0))[:tot_keys]
+        if len(interpolation) < tot_keys:
+            interpolation = np.concatenate((interpolation,
+                                            np.full(tot_keys - len(interpolation), 2, dtype=np.int32)))
+
+    return FBXCurveData(frames, values, interpolation)
+
+
+def prepare_anim_curve_resample(fbx_curve, frames, default):
+    """
+    Return the values of fbx_curve (linearly interpolated) at sorted frames,
+    default for all frames when fbx_curve is None.
+    """
+    if fbx_curve is None:
+        return np.full(len(frames), default, dtype=np.float32)
+    return np.interp(frames, fbx_curve.frames, fbx_curve.values).astype(np.float32)
+
+
+def prepare_anim_frames(fbx_curves):
+    """
+    Return the sorted frames of all keys of fbx_curves.
+    """
+    return np.unique(np.concatenate([fbx_curve.frames for fbx_curve in fbx_curves]))
+
+
+# Animated FBX property -> attribute of FBXTransformData.
+FBX_ANIM_TRANSFORM_ATTRS = (
+    (b'Lcl Translation', "loc"),
+    (b'Lcl Rotation', "rot"),
+    (b'Lcl Scaling', "sca"),
+    )
+
+
+def prepare_anim_samples(fbx_transform, fbx_curves, frames):
+    """
+    Return the translation, rotation and scale (9 floats) of an animated transform at each of frames,
+    fbx_curves is a dict ((FBX property, index) -> FBXCurveData), channels without curve keep their fbx_transform value.
+    """
+    channels = [prepare_anim_curve_resample(fbx_curves.get((fbx_prop, index)), frames,
+                                            getattr(fbx_transform, attr)[index])
+                for fbx_prop, attr in FBX_ANIM_TRANSFORM_ATTRS
+                for index in range(3)]
+    return np.stack(channels, axis=1).tolist()
+
+
+def prepare_anim_keyframes_co(frames, values):
+    """
+    Return interleaved (frame, value) pairs, as expected by keyframe_points.foreach_set("co", ...).
+    """
+    co = np.empty(len(frames) * 2, dtype=np.float32)
+    co[0::2] = frames
+    co[1::2] = values
+    return co
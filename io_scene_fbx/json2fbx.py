@@ -25,10 +25,17 @@
 Usage
 =====
 
-   json2fbx [FILES]...
+   json2fbx [--jobs N] [--force] [--stream] [FILES]...
 
 This script will write a binary FBX file for each JSON argument given.
 
+FBX files newer than their JSON file are skipped, unless ``--force`` is given.
+With ``--jobs N``, files are converted by N processes in parallel,
+a failing file does not prevent others from being converted.
+A summary of timings and failures is printed at the end.
+With ``--stream``, JSON files are read and FBX files written incrementally,
+memory usage only depends on the nesting depth and the biggest array.
+
 
 Input
 ======
@@ -62,11 +69,62 @@ The types are as follows:
 
 Note that key:value pairs aren't used since the id's are not
 ensured to be unique.
+
+
+Schema Version 2
+----------------
+
+The root may also be an object giving the schema version:
+
+   ``{"schema": 2, "elems": [...]}``
+
+Where ``elems`` is the list of nested lists described above.
+
+In this version, any array or bytes ('R') data may be given as a buffer object instead:
+
+   ``{"dtype": "d", "base64": "..."}``
+
+Where dtype is the same as the matching data_types item,
+and the base64-encoded buffer holds the little-endian items of the array (or the raw bytes).
+Such buffers are decoded straight into arrays, without any per-item work.
 """
 
 
 import encode_bin
 
+import array
+import base64
+import codecs
+
+data_types = encode_bin.data_types
+
+JSON_SCHEMA_VERSION = 2
+
+_IS_BIG_ENDIAN = (__import__("sys").byteorder != 'little')
+
+# data_types item -> (array type, FBXElem method).
+_array_types = {
+    "f": (data_types.ARRAY_FLOAT32, "add_float32_array"),
+    "i": (data_types.ARRAY_INT32, "add_int32_array"),
+    "d": (data_types.ARRAY_FLOAT64, "add_float64_array"),
+    "l": (data_types.ARRAY_INT64, "add_int64_array"),
+    "b": (data_types.ARRAY_BOOL, "add_bool_array"),
+    "c": (data_types.ARRAY_BYTE, "add_byte_array"),
+    }
+
+
+def buffer_decode(d, dt):
+    if d.get("dtype") != dt:
+        raise ValueError("Buffer dtype %r does not match data type %r" % (d.get("dtype"), dt))
+    data = base64.b64decode(d["base64"])
+    if dt == "R":
+        return data
+
+    data_array = array.array(_array_types[dt][0], data)
+    if _IS_BIG_ENDIAN and data_array.itemsize > 1:
+        data_array.byteswap()
+    return data_array
+
 
 def elem_empty(elem, name):
     sub_elem = encode_bin.FBXElem(name)
@@ -75,13 +133,9 @@ def elem_empty(elem, name):
     return sub_elem
 
 
-def parse_json_rec(fbx_root, json_node):
-    name, data, data_types, children = json_node
-    ver = 0
-
+def parse_json_props(e, data, data_types):
     assert(len(data_types) == len(data))
 
-    e = elem_empty(fbx_root, name.encode())
     for d, dt in zip(data, data_types):
         if dt == "C":
             e.add_bool(d)
@@ -96,24 +150,30 @@ def parse_json_rec(fbx_root, json_node):
         elif dt == "D":
             e.add_float64(d)
         elif dt == "R":
-            d = eval('b"""' + d + '"""')
+            if isinstance(d, dict):
+                d = buffer_decode(d, dt)
+            else:
+                # Body of a Python bytes literal.
+                d = codecs.escape_decode(d.encode('latin-1'))[0]
             e.add_bytes(d)
         elif dt == "S":
-            d = d.encode()
-            d.replace(b"::", b"\x00\x01")
+            d = d.encode('utf-8', 'surrogateescape')
             e.add_string(d)
-        elif dt == "i":
-            e.add_int32_array(d)
-        elif dt == "l":
-            e.add_int64_array(d)
-        elif dt == "f":
-            e.add_float32_array(d)
-        elif dt == "d":
-            e.add_float64_array(d)
-        elif dt == "b":
-            e.add_byte_array(d)
-        elif dt == "c":
-            e.add_bool_array(d)
+        elif dt in _array_types:
+            array_type, func_name = _array_types[dt]
+            if isinstance(d, dict):
+                d = buffer_decode(d, dt)
+            else:
+                d = array.array(array_type, d)
+            getattr(e, func_name)(d)
+
+
+def parse_json_rec(fbx_root, json_node):
+    name, data, data_types, children = json_node
+    ver = 0
+
+    e = elem_empty(fbx_root, name.encode('utf-8', 'surrogateescape'))
+    parse_json_props(e, data, data_types)
 
     if name == "FBXVersion":
         assert(data_types == "I")
@@ -131,6 +191,11 @@ def parse_json(json_root):
     root = elem_empty(None, b"")
     ver = 0
 
+    if isinstance(json_root, dict):
+        if json_root.get("schema", 0) > JSON_SCHEMA_VERSION:
+            raise ValueError("Unsupported JSON schema version %r" % json_root.get("schema"))
+        json_root = json_root["elems"]
+
     for n in json_root:
         _ver = parse_json_rec(root, n)
         if _ver:
@@ -139,11 +204,169 @@ def parse_json(json_root):
     return root, ver
 
 
-def json2fbx(fn):
-    import os, json
+# ----------------------------------------------------------------------------
+# Streaming
+#
+# Memory is only bounded by the nesting depth and the biggest single element (i.e. array),
+# instead of the whole JSON document and FBX tree.
+
+class JSONStream:
+    """
+    Minimal incremental reader, only parsing the structure of nodes,
+    each node's data list being decoded at once.
+    """
+    __slots__ = (
+        "_file",
+        "_buf",
+        "_pos",
+        "_is_eof",
+        "_chunk_size",
+        "_decoder",
+        )
+
+    def __init__(self, f, chunk_size=1024 * 1024):
+        import json
+        self._file = f
+        self._buf = ""
+        self._pos = 0
+        self._is_eof = False
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self, size):
+        data = self._file.read(size)
+        if not data:
+            self._is_eof = True
+            return False
+        self._buf = self._buf[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """
+        Return next non-whitespace char (without consuming it), empty string when the end is reached.
+        """
+        while True:
+            buf = self._buf
+            pos = self._pos
+            while pos < len(buf) and buf[pos] in " \t\n\r":
+                pos += 1
+            self._pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._fill(self._chunk_size):
+                return ""
+
+    def expect(self, c):
+        if self.peek() != c:
+            raise ValueError("Expected %r, found %r at %d" % (c, self.peek(), self._pos))
+        self._pos += 1
+
+    def value(self):
+        """
+        Return next JSON value, read as a whole.
+        """
+        import json
+
+        self.peek()
+        size = self._chunk_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # A number could go on after the end of our buffer.
+                if end < len(self._buf) or self._is_eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._is_eof:
+                    raise
+            # Incomplete value, read more (twice as much each time, to avoid re-parsing big arrays too often).
+            self._fill(size)
+            size *= 2
+
+
+def parse_json_stream_nodes(stream, writer):
+    ver = 0
+
+    stream.expect("[")
+    if stream.peek() == "]":
+        stream.expect("]")
+        return ver
+
+    while True:
+        stream.expect("[")
+        name = stream.value()
+        stream.expect(",")
+        data = stream.value()
+        stream.expect(",")
+        data_types = stream.value()
+        stream.expect(",")
+
+        if name == "FBXVersion":
+            assert(data_types == "I")
+            ver = int(data[0])
+
+        e = elem_empty(None, name.encode('utf-8', 'surrogateescape'))
+        parse_json_props(e, data, data_types)
+        del data
+
+        writer.elem_begin(e)
+        del e
+        _ver = parse_json_stream_nodes(stream, writer)
+        if _ver:
+            ver = _ver
+        writer.elem_end()
+        stream.expect("]")
+
+        if stream.peek() == ",":
+            stream.expect(",")
+        else:
+            stream.expect("]")
+            return ver
+
+
+def parse_json_stream(stream, writer):
+    """
+    Write all JSON nodes read from stream with writer (an encode_bin.StreamWriter), return the FBX version.
+    """
+    if stream.peek() != "{":
+        return parse_json_stream_nodes(stream, writer)
+
+    ver = 0
+    stream.expect("{")
+    while stream.peek() != "}":
+        key = stream.value()
+        stream.expect(":")
+        if key == "elems":
+            ver = parse_json_stream_nodes(stream, writer)
+        else:
+            value = stream.value()
+            if key == "schema" and value > JSON_SCHEMA_VERSION:
+                raise ValueError("Unsupported JSON schema version %r" % value)
+        if stream.peek() == ",":
+            stream.expect(",")
+    stream.expect("}")
+    return ver
+
+
+def fbx_filepath(fn):
+    import os
+    return "%s.fbx" % os.path.splitext(fn)[0]
 
-    fn_fbx = "%s.fbx" % os.path.splitext(fn)[0]
+
+def json2fbx(fn, use_stream=False):
+    import json
+
+    fn_fbx = fbx_filepath(fn)
     print("Writing: %r " % fn_fbx, end="")
+    if use_stream:
+        with open(fn) as f_json, open(fn_fbx, 'wb') as f_fbx:
+            writer = encode_bin.StreamWriter(f_fbx)
+            fbx_version = parse_json_stream(JSONStream(f_json), writer)
+            writer.finish(fbx_version)
+        print("(Version %d) ..." % fbx_version)
+        return
+
     json_root = []
     with open(fn) as f_json:
         json_root = json.load(f_json)
@@ -152,25 +375,69 @@ def json2fbx(fn):
     encode_bin.write(fn_fbx, fbx_root, fbx_version)
 
 
+def json2fbx_job(fn, use_force=False, use_stream=False):
+    """
+    Convert a single file, never raising.
+    Return (fn, status, time, error), status being one of 'DONE', 'SKIPPED', 'FAILED'.
+    """
+    import os
+    import time
+
+    start_time = time.time()
+    try:
+        fn_fbx = fbx_filepath(fn)
+        if (not use_force and os.path.exists(fn_fbx) and
+            os.path.getmtime(fn_fbx) >= os.path.getmtime(fn)):
+            return fn, 'SKIPPED', 0.0, None
+        json2fbx(fn, use_stream)
+        return fn, 'DONE', time.time() - start_time, None
+    except:
+        import traceback
+        error = traceback.format_exc()
+        # Do not leave a partially written file, it would be skipped next time.
+        try:
+            if os.path.getmtime(fn_fbx) >= start_time:
+                os.remove(fn_fbx)
+        except OSError:
+            pass
+        return fn, 'FAILED', time.time() - start_time, error
+
+
 # ----------------------------------------------------------------------------
 # Command Line
 
 def main():
-    import sys
+    import argparse
+    import time
+    from fbx_jobs import jobs_run
 
-    if "--help" in sys.argv:
-        print(__doc__)
-        return
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="Number of files converted in parallel")
+    parser.add_argument("--force", action="store_true", help="Convert files even if FBX file is newer")
+    parser.add_argument("--stream", action="store_true",
+                        help="Convert incrementally, without loading the whole JSON file in memory")
+    parser.add_argument("files", nargs="*")
+    args = parser.parse_args()
 
-    for arg in sys.argv[1:]:
-        try:
-            json2fbx(arg)
-        except:
-            print("Failed to convert %r, error:" % arg)
+    start_time = time.time()
+    results = jobs_run(json2fbx_job, [(fn, (args.force, args.stream)) for fn in args.files], args.jobs)
 
-            import traceback
-            traceback.print_exc()
+    failed = [(fn, error) for fn, status, _time, error in results if status == 'FAILED']
+    for fn, error in failed:
+        print("Failed to convert %r, error:" % fn)
+        print(error)
+
+    done = [r for r in results if r[1] == 'DONE']
+    print("%d converted, %d skipped, %d failed, in %.3f sec." % (
+          len(done), sum(1 for r in results if r[1] == 'SKIPPED'), len(failed), time.time() - start_time))
+    if done:
+        fn, _status, slowest_time, _error = max(done, key=lambda r: r[2])
+        print("Conversion time: %.3f sec in total, slowest file %r (%.3f sec)." % (
+              sum(r[2] for r in done), fn, slowest_time))
+
+    return 1 if failed else 0
 
 
 if __name__ == "__main__":
-    main()
+    import sys
+    sys.exit(main())
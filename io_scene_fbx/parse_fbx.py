@@ -23,17 +23,22 @@
 
 __all__ = (
     "parse",
+    "parse_iter",
     "data_types",
     "parse_version",
     "FBXElem",
+    "FBXArrayRaw",
     )
 
+try:
+    from . import data_types
+except:
+    import data_types
+
 from struct import unpack
 import array
 import zlib
 
-from . import data_types
-
 # at the end of each nested block, there is a NUL record to indicate
 # that the sub-scope exists (i.e. to distinguish between P: and P : {})
 # this NUL record is 13 bytes long.
@@ -60,6 +65,77 @@ def read_string_ubyte(read):
     return data
 
 
+class FBXArrayRaw:
+    """
+    An array property kept as stored in the file (see parse(use_raw_arrays=True)),
+    so that it can be written back verbatim, and is only decompressed when actually needed.
+    """
+    __slots__ = (
+        "prop_type",
+        "length",
+        "encoding",
+        "payload",  # the (maybe compressed) array bytes, as in the file.
+
+        "_array",  # decoded array, once decode() has been called.
+        "_crc",  # crc32 of the decoded bytes, to detect modifications.
+        )
+
+    def __init__(self, prop_type, length, encoding, payload):
+        self.prop_type = prop_type
+        self.length = length
+        self.encoding = encoding
+        self.payload = payload
+        self._array = None
+        self._crc = None
+
+    def __len__(self):
+        return self.length
+
+    def decode(self):
+        """
+        Return the array.array, decoding it on first access (the same array is returned afterwards,
+        it may be modified in place).
+        """
+        if self._array is None:
+            array_type, array_stride, array_byteswap = array_raw_types[self.prop_type]
+            data = self.payload
+            if self.encoding == 0:
+                pass
+            elif self.encoding == 1:
+                data = zlib.decompress(data)
+
+            assert(self.length * array_stride == len(data))
+
+            self._crc = zlib.crc32(data)
+            data_array = array.array(array_type, data)
+            if array_byteswap and _IS_BIG_ENDIAN:
+                data_array.byteswap()
+            self._array = data_array
+        return self._array
+
+    def is_modified(self):
+        """
+        Return True when the decoded array no longer matches the payload.
+        """
+        if self._array is None:
+            return False
+        data_array = self._array
+        if len(data_array) != self.length:
+            return True
+        if array_raw_types[self.prop_type][2] and _IS_BIG_ENDIAN:
+            data_array = data_array[:]
+            data_array.byteswap()
+        return zlib.crc32(data_array.tobytes()) != self._crc
+
+
+def unpack_array_raw(read, prop_type):
+    length = read_uint(read)
+    encoding = read_uint(read)
+    comp_len = read_uint(read)
+
+    return FBXArrayRaw(prop_type, length, encoding, read(comp_len))
+
+
 def unpack_array(read, array_type, array_stride, array_byteswap):
     length = read_uint(read)
     encoding = read_uint(read)
@@ -97,31 +173,57 @@ read_data_dict = {
     b'c'[0]: lambda read: unpack_array(read, data_types.ARRAY_BYTE, 1, False),  # array (ubyte)
     }
 
+# prop_type -> (array_type, array_stride, array_byteswap), same as above.
+array_raw_types = {
+    b'f'[0]: (data_types.ARRAY_FLOAT32, 4, False),
+    b'i'[0]: (data_types.ARRAY_INT32, 4, True),
+    b'd'[0]: (data_types.ARRAY_FLOAT64, 8, False),
+    b'l'[0]: (data_types.ARRAY_INT64, 8, True),
+    b'b'[0]: (data_types.ARRAY_BOOL, 1, False),
+    b'c'[0]: (data_types.ARRAY_BYTE, 1, False),
+    }
 
-def read_elem(read, tell, use_namedtuple):
-    # [0] the offset at which this block ends
+# same as read_data_dict, but arrays are kept in their encoded form.
+read_data_dict_raw = read_data_dict.copy()
+read_data_dict_raw.update({
+    prop_type: (lambda read, prop_type=prop_type: unpack_array_raw(read, prop_type))
+    for prop_type in array_raw_types.keys()
+    })
+
+
+def read_elem_head(read, read_data):
+    """
+    Read the scope header (after its end offset), return (elem_id, elem_props_data, elem_props_type).
+    """
     # [1] the number of properties in the scope
     # [2] the length of the property list
-    end_offset = read_uint(read)
-    if end_offset == 0:
-        return None
-
     prop_count = read_uint(read)
     prop_length = read_uint(read)
 
     elem_id = read_string_ubyte(read)        # elem name of the scope/key
     elem_props_type = bytearray(prop_count)  # elem property types
     elem_props_data = [None] * prop_count    # elem properties (if any)
-    elem_subtree = []                        # elem children (if any)
 
     for i in range(prop_count):
         data_type = read(1)[0]
-        elem_props_data[i] = read_data_dict[data_type](read)
+        elem_props_data[i] = read_data[data_type](read)
         elem_props_type[i] = data_type
 
+    return elem_id, elem_props_data, elem_props_type
+
+
+def read_elem(read, tell, use_namedtuple, read_data=read_data_dict):
+    # [0] the offset at which this block ends
+    end_offset = read_uint(read)
+    if end_offset == 0:
+        return None
+
+    elem_id, elem_props_data, elem_props_type = read_elem_head(read, read_data)
+    elem_subtree = []                        # elem children (if any)
+
     if tell() < end_offset:
         while tell() < (end_offset - _BLOCK_SENTINEL_LENGTH):
-            elem_subtree.append(read_elem(read, tell, use_namedtuple))
+            elem_subtree.append(read_elem(read, tell, use_namedtuple, read_data))
 
         if read(_BLOCK_SENTINEL_LENGTH) != _BLOCK_SENTINEL_DATA:
             raise IOError("failed to read nested block sentinel, "
@@ -134,6 +236,27 @@ def read_elem(read, tell, use_namedtuple):
     return FBXElem(*args) if use_namedtuple else args
 
 
+def read_elem_iter(read, tell, read_data, end_offset):
+    """
+    Same as read_elem, but yield the elements as they are read (see parse_iter).
+    """
+    elem_id, elem_props_data, elem_props_type = read_elem_head(read, read_data)
+    yield FBXElem(elem_id, elem_props_data, elem_props_type, None)
+
+    if tell() < end_offset:
+        while tell() < (end_offset - _BLOCK_SENTINEL_LENGTH):
+            yield from read_elem_iter(read, tell, read_data, read_uint(read))
+
+        if read(_BLOCK_SENTINEL_LENGTH) != _BLOCK_SENTINEL_DATA:
+            raise IOError("failed to read nested block sentinel, "
+                          "expected all bytes to be 0")
+
+    if tell() != end_offset:
+        raise IOError("scope length not reached, something is wrong")
+
+    yield None
+
+
 def parse_version(fn):
     """
     Return the FBX version,
@@ -148,8 +271,15 @@ def parse_version(fn):
         return read_uint(read)
 
 
-def parse(fn, use_namedtuple=True):
+def parse(fn, use_namedtuple=True, use_raw_arrays=False):
+    """
+    Return the root element and the FBX version.
+
+    With use_raw_arrays, array properties are FBXArrayRaw instances instead of array.array
+    (useful when they are not needed, or to write them back without re-compressing them).
+    """
     root_elems = []
+    read_data = read_data_dict_raw if use_raw_arrays else read_data_dict
 
     with open(fn, 'rb') as f:
         read = f.read
@@ -161,10 +291,35 @@ def parse(fn, use_namedtuple=True):
         fbx_version = read_uint(read)
 
         while True:
-            elem = read_elem(read, tell, use_namedtuple)
+            elem = read_elem(read, tell, use_namedtuple, read_data)
             if elem is None:
                 break
             root_elems.append(elem)
 
     args = (b'', [], bytearray(0), root_elems)
     return FBXElem(*args) if use_namedtuple else args, fbx_version
+
+
+def parse_iter(fn, use_raw_arrays=False):
+    """
+    Read the file without building the whole tree in memory.
+
+    Yield an FBXElem for each element as it is read (its 'elems' being None),
+    followed by its sub-elements, and then by None once its scope ends.
+    """
+    read_data = read_data_dict_raw if use_raw_arrays else read_data_dict
+
+    with open(fn, 'rb') as f:
+        read = f.read
+        tell = f.tell
+
+        if read(len(_HEAD_MAGIC)) != _HEAD_MAGIC:
+            raise IOError("Invalid header")
+
+        read_uint(read)  # FBX version, see parse_version().
+
+        while True:
+            end_offset = read_uint(read)
+            if end_offset == 0:
+                break
+            yield from read_elem_iter(read, tell, read_data, end_offset)
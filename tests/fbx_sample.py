@@ -0,0 +1,150 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+# Script copyright (C) Blender Foundation
+
+# Sample FBX scene for the tests of the command line tools (no bpy dependency),
+# built with encode_bin like the exporter does.
+
+import os
+import sys
+
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "io_scene_fbx")
+if TOOLS_DIR not in sys.path:
+    # Tools are imported as top-level modules, as when run from the command line.
+    sys.path.insert(0, TOOLS_DIR)
+
+import array
+
+import encode_bin
+
+FBX_VERSION = 7400
+
+# Properties70 'P' definitions, see encode_bin.elem_props_record.
+_PTYPE_VECTOR = (b"Lcl Translation", b"", b"A", "add_float64", "add_float64", "add_float64")
+_PTYPE_COLOR = (b"Color", b"", b"A", "add_float64", "add_float64", "add_float64")
+_PTYPE_INT = (b"int", b"Integer", b"", "add_int32")
+
+
+def elem_data_single(elem, name, func, value):
+    sub_elem = encode_bin.FBXElem(name)
+    getattr(sub_elem, func)(value)
+    elem.elems.append(sub_elem)
+    return sub_elem
+
+
+def elem_object(elem, fbx_uuid, name, cls, sub_cls):
+    fbx_obj = encode_bin.FBXElem(cls)
+    fbx_obj.add_int64(fbx_uuid)
+    fbx_obj.add_string(name + b"\x00\x01" + cls)
+    fbx_obj.add_string(sub_cls)
+    elem.elems.append(fbx_obj)
+    return fbx_obj
+
+
+def elem_properties(elem):
+    fbx_props = encode_bin.FBXElem(b"Properties70")
+    elem.elems.append(fbx_props)
+    return fbx_props
+
+
+# (source, destination) of the 'OO' connections of the sample scene.
+SAMPLE_CONNECTIONS = (
+    (10, 0),  # Cube Model -> root.
+    (11, 10),  # Cube Geometry -> Cube Model.
+    (12, 10),  # Material -> Cube Model.
+    (20, 0),  # Empty Model -> root.
+    (21, 20),  # Child Model -> Empty Model.
+    )
+
+
+def sample_root(translation=(1.0, 2.0, 3.0)):
+    """
+    Return the root element of a small scene: a mesh Model with its Geometry and Material,
+    and an empty Model with a child, translation being the one of the mesh Model.
+    """
+    root = encode_bin.FBXElem(b"")
+
+    fbx_header = encode_bin.FBXElem(b"FBXHeaderExtension")
+    elem_data_single(fbx_header, b"FBXHeaderVersion", "add_int32", 1003)
+    elem_data_single(fbx_header, b"FBXVersion", "add_int32", FBX_VERSION)
+    root.elems.append(fbx_header)
+    elem_data_single(root, b"FileId", "add_bytes", b"\x00" * 16)
+    elem_data_single(root, b"CreationTime", "add_string", b"")
+    elem_data_single(root, b"Creator", "add_string", b"fbx_sample")
+
+    fbx_settings = encode_bin.FBXElem(b"GlobalSettings")
+    elem_data_single(fbx_settings, b"Version", "add_int32", 1000)
+    encode_bin.elem_props_record(elem_properties(fbx_settings), b"UpAxis", _PTYPE_INT, 1)
+    root.elems.append(fbx_settings)
+
+    fbx_defs = encode_bin.FBXElem(b"Definitions")
+    elem_data_single(fbx_defs, b"Version", "add_int32", 100)
+    elem_data_single(fbx_defs, b"Count", "add_int32", 6)
+    for cls, count in ((b"GlobalSettings", 1), (b"Model", 3), (b"Geometry", 1), (b"Material", 1)):
+        fbx_def = elem_data_single(fbx_defs, b"ObjectType", "add_string", cls)
+        elem_data_single(fbx_def, b"Count", "add_int32", count)
+    root.elems.append(fbx_defs)
+
+    fbx_nodes = encode_bin.FBXElem(b"Objects")
+    root.elems.append(fbx_nodes)
+
+    fbx_obj = elem_object(fbx_nodes, 10, b"Cube", b"Model", b"Mesh")
+    elem_data_single(fbx_obj, b"Version", "add_int32", 232)
+    encode_bin.elem_props_record(elem_properties(fbx_obj), b"Lcl Translation", _PTYPE_VECTOR, translation)
+
+    fbx_geom = elem_object(fbx_nodes, 11, b"Cube", b"Geometry", b"Mesh")
+    # big enough to be compressed.
+    elem_data_single(fbx_geom, b"Vertices", "add_float64_array",
+                     array.array('d', (float(i % 7) * 0.5 for i in range(3 * 64))))
+    elem_data_single(fbx_geom, b"PolygonVertexIndex", "add_int32_array",
+                     array.array('i', (i if (i % 4) != 3 else ~i for i in range(64))))
+    elem_data_single(fbx_geom, b"Edges", "add_int32_array", array.array('i', range(4)))
+
+    fbx_mat = elem_object(fbx_nodes, 12, b"Material", b"Material", b"")
+    encode_bin.elem_props_record(elem_properties(fbx_mat), b"DiffuseColor", _PTYPE_COLOR, (0.8, 0.5, 0.25))
+
+    elem_object(fbx_nodes, 20, b"Empty", b"Model", b"Null")
+    elem_object(fbx_nodes, 21, b"Child", b"Model", b"Null")
+
+    fbx_connections = encode_bin.FBXElem(b"Connections")
+    for c_src, c_dst in SAMPLE_CONNECTIONS:
+        fbx_link = encode_bin.FBXElem(b"C")
+        fbx_link.add_string(b"OO")
+        fbx_link.add_int64(c_src)
+        fbx_link.add_int64(c_dst)
+        fbx_connections.elems.append(fbx_link)
+    root.elems.append(fbx_connections)
+
+    fbx_takes = encode_bin.FBXElem(b"Takes")
+    elem_data_single(fbx_takes, b"Current", "add_string", b"")
+    root.elems.append(fbx_takes)
+
+    return root
+
+
+def sample_write(fn, **kwargs):
+    encode_bin.write(fn, sample_root(**kwargs), FBX_VERSION)
+    return fn
+
+
+def file_read(fn):
+    with open(fn, 'rb') as f:
+        return f.read()
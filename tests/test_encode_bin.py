@@ -0,0 +1,95 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+# Script copyright (C) Blender Foundation
+# Alternative writers of encode_bin, which must all give the same bytes as encode_bin.write().
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from fbx_sample import FBX_VERSION, sample_root, file_read
+
+import encode_bin
+
+
+class TestWriters(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.fn_ref = os.path.join(self.tmpdir, "ref.fbx")
+        self.fn = os.path.join(self.tmpdir, "test.fbx")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_ref(self, **kwargs):
+        encode_bin.write(self.fn_ref, sample_root(**kwargs), FBX_VERSION)
+        return file_read(self.fn_ref)
+
+    def test_incremental_new(self):
+        # No previous file.
+        encode_bin.write_incremental(self.fn, sample_root(), FBX_VERSION)
+        self.assertEqual(file_read(self.fn), self.write_ref())
+
+    def test_incremental_unchanged(self):
+        encode_bin.write_incremental(self.fn, sample_root(), FBX_VERSION)
+        nbr_spliced = encode_bin.write_incremental(self.fn, sample_root(), FBX_VERSION)
+        self.assertGreater(nbr_spliced, 0)
+        self.assertEqual(file_read(self.fn), self.write_ref())
+
+    def test_incremental_changed(self):
+        # Moving the Model changes its size too (a float64 more than an int), offsets of all following data change.
+        encode_bin.write_incremental(self.fn, sample_root(), FBX_VERSION)
+        encode_bin.write_incremental(self.fn, sample_root(translation=(4.0, 5.0, 6.0)), FBX_VERSION)
+        self.assertEqual(file_read(self.fn), self.write_ref(translation=(4.0, 5.0, 6.0)))
+
+    def test_mmap(self):
+        encode_bin.write_mmap(self.fn, sample_root(), FBX_VERSION, jobs=2)
+        self.assertEqual(file_read(self.fn), self.write_ref())
+
+    def test_mmap_empty(self):
+        encode_bin.write(self.fn_ref, encode_bin.FBXElem(b""), FBX_VERSION)
+        encode_bin.write_mmap(self.fn, encode_bin.FBXElem(b""), FBX_VERSION)
+        self.assertEqual(file_read(self.fn), file_read(self.fn_ref))
+
+    def test_stream_writer(self):
+        def elems_write(writer, elem):
+            for sub_elem in elem.elems:
+                # (sub-elements are ignored by elem_begin)
+                writer.elem_begin(sub_elem)
+                elems_write(writer, sub_elem)
+                writer.elem_end()
+
+        with open(self.fn, 'wb') as f:
+            writer = encode_bin.StreamWriter(f, FBX_VERSION)
+            elems_write(writer, sample_root())
+            writer.finish()
+        self.assertEqual(file_read(self.fn), self.write_ref())
+
+    def test_fileobj(self):
+        f = io.BytesIO()
+        encode_bin.write_fileobj(f, sample_root(), FBX_VERSION)
+        self.assertEqual(f.getvalue(), self.write_ref())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+# Script copyright (C) Blender Foundation
+
+# fbxdiff, run as a command line tool.
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from fbx_sample import TOOLS_DIR, sample_write
+
+
+class TestDiff(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.fn_a = sample_write(os.path.join(self.tmpdir, "a.fbx"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def fbxdiff(self, *args):
+        """
+        Return the exit status and output lines of fbxdiff.
+        """
+        proc = subprocess.Popen([sys.executable, os.path.join(TOOLS_DIR, "fbxdiff.py")] + list(args),
+                                stdout=subprocess.PIPE, universal_newlines=True)
+        stdout = proc.communicate()[0]
+        return proc.returncode, stdout.splitlines()
+
+    def test_identical(self):
+        fn_b = sample_write(os.path.join(self.tmpdir, "b.fbx"))
+        self.assertEqual(self.fbxdiff(self.fn_a, fn_b), (0, []))
+        self.assertEqual(self.fbxdiff("--decode", self.fn_a, fn_b), (0, []))
+
+    def test_property_changed(self):
+        fn_b = sample_write(os.path.join(self.tmpdir, "b.fbx"), translation=(1.0, 2.0, 4.0))
+        status, lines = self.fbxdiff(self.fn_a, fn_b)
+        self.assertEqual(status, 1)
+        self.assertTrue(lines)
+        self.assertTrue(all(line.startswith("~ ") for line in lines))
+        self.assertTrue(any("Lcl Translation" in line and "4.0" in line for line in lines))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+# Script copyright (C) Blender Foundation
+
+# fbxsplit split & merge.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from fbx_sample import SAMPLE_CONNECTIONS, sample_write
+
+import parse_fbx
+import fbxsplit
+from fbx_utils import elem_find_first, elem_uuid
+
+
+def file_objects_connections(fn):
+    """
+    Return the UIDs of all objects of fn, and its (type, source, destination) connections.
+    """
+    elem_root, version = parse_fbx.parse(fn, use_raw_arrays=True)
+    uuids = {elem_uuid(fbx_obj) for fbx_obj in elem_find_first(elem_root, b'Objects').elems}
+    connections = {tuple(fbx_link.props[:3]) for fbx_link in elem_find_first(elem_root, b'Connections').elems}
+    return uuids, connections
+
+
+class TestSplitMerge(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.fn_fbx = sample_write(os.path.join(self.tmpdir, "sample.fbx"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_split_each(self):
+        fns = fbxsplit.split(self.fn_fbx, use_each=True)
+        self.assertEqual([os.path.basename(fn) for fn in fns], ["sample_Cube.fbx", "sample_Empty.fbx"])
+        self.assertEqual(file_objects_connections(fns[0]),
+                         ({10, 11, 12}, {(b'OO', 10, 0), (b'OO', 11, 10), (b'OO', 12, 10)}))
+
+    def test_split_child(self):
+        # Parent not written, the child becomes a root Model.
+        fns = fbxsplit.split(self.fn_fbx, ["Child"])
+        self.assertEqual(file_objects_connections(fns[0]), ({21}, {(b'OO', 21, 0)}))
+
+    def test_split_merge(self):
+        fn_merged = os.path.join(self.tmpdir, "merged.fbx")
+        fbxsplit.merge(fbxsplit.split(self.fn_fbx, use_each=True), fn_merged)
+        self.assertEqual(file_objects_connections(fn_merged),
+                         ({10, 11, 12, 20, 21}, {(b'OO', c_src, c_dst) for c_src, c_dst in SAMPLE_CONNECTIONS}))
+
+    def test_merge_uuids_remap(self):
+        # Same file twice: UIDs of the second copy are remapped, its connections along with them.
+        fn_merged = os.path.join(self.tmpdir, "merged.fbx")
+        fbxsplit.merge([self.fn_fbx, self.fn_fbx], fn_merged)
+        uuids, connections = file_objects_connections(fn_merged)
+        self.assertEqual(len(uuids), 10)
+        self.assertEqual(len(connections), 2 * len(SAMPLE_CONNECTIONS))
+        for c_type, c_src, c_dst in connections:
+            self.assertIn(c_src, uuids)
+            self.assertTrue(c_dst == 0 or c_dst in uuids)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+# Script copyright (C) Blender Foundation
+# fbx2json -> json2fbx round trips.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from fbx_sample import sample_write, file_read
+
+import fbx2json
+import json2fbx
+
+
+class TestJSONRoundTrip(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.fn_fbx = sample_write(os.path.join(self.tmpdir, "sample.fbx"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def round_trip(self, use_stream, array_limit=None, array_mode='truncate'):
+        """
+        Return the bytes of the sample converted to JSON and back (written in a sub-directory).
+        """
+        fbx2json.fbx2json(self.fn_fbx, array_limit, array_mode)
+        fn_json = os.path.join(self.tmpdir, "out", "sample.json")
+        os.mkdir(os.path.dirname(fn_json))
+        os.rename(os.path.join(self.tmpdir, "sample.json"), fn_json)
+        json2fbx.json2fbx(fn_json, use_stream)
+        return file_read(json2fbx.fbx_filepath(fn_json))
+
+    def test_plain(self):
+        self.assertEqual(self.round_trip(False), file_read(self.fn_fbx))
+
+    def test_stream(self):
+        self.assertEqual(self.round_trip(True), file_read(self.fn_fbx))
+
+    def test_base64(self):
+        self.assertEqual(self.round_trip(False, array_mode='base64'), file_read(self.fn_fbx))
+
+    def test_base64_stream(self):
+        self.assertEqual(self.round_trip(True, array_mode='base64'), file_read(self.fn_fbx))
+
+
+if __name__ == "__main__":
+    unittest.main()